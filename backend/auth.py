@@ -1,27 +1,129 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, EmailStr
 from passlib.context import CryptContext
-from pymongo import MongoClient
-from jose import jwt
+from jose import jwt, JWTError
 from datetime import datetime, timedelta
+from collections import OrderedDict
+import hashlib
+import logging
 import os
+import threading
+import time
 from fastapi import Request
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from db import users
+from execution import BoundedPool, PoolFull, run_io
+from telemetry import span
 load_dotenv()
 
 router = APIRouter()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-MONGO_URL = os.getenv("MONGO_URL")
-client = MongoClient(MONGO_URL)
-db = client["nocode_ml"]     
-users = db["users"]          
-
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+# bcrypt is deliberately slow (~0.2 s per call) and holds a thread the whole
+# time, so it gets its own small pool; past BCRYPT_MAX_PENDING waiting calls
+# logins are turned away with a 503 instead of starving the shared threadpool
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(min(4, os.cpu_count() or 1))))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", "32"))
+BCRYPT_RETRY_AFTER_SECONDS = 1
+
+# verified token payloads, so each request doesn't decode and check the
+# signature again; a token is still honoured until its own exp at most
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "60"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+logger = logging.getLogger(__name__)
+password_pool = BoundedPool("bcrypt", BCRYPT_WORKERS, BCRYPT_MAX_PENDING)
+
+
+class TokenCache:
+    # keyed by a hash of the token, raw tokens aren't kept around
+    def __init__(self, ttl: float = TOKEN_CACHE_TTL_SECONDS, max_entries: int = TOKEN_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> dict | None:
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, token: str, payload: dict):
+        expires = time.time() + self.ttl
+        if isinstance(payload.get("exp"), (int, float)):
+            expires = min(expires, payload["exp"])
+        with self._lock:
+            self._entries[self.key(token)] = (expires, payload)
+            self._entries.move_to_end(self.key(token))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache()
+
+
+def decode_token(token: str) -> dict:
+    # raises JWTError for a bad or expired token, those are never cached
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        token_cache.put(token, payload)
+    return payload
+
+
+def ensure_user_indexes():
+    try:
+        users.create_index("email", unique=True)
+    except (DuplicateKeyError, OperationFailure):
+        # older data can hold the same email twice, still index the lookup
+        logger.warning("duplicate emails in users, creating a non-unique email index")
+        users.create_index("email")
+
+
+def hash_password(password: str) -> str:
+    with span("password_hash"):
+        return pwd_context.hash(password)
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    with span("password_verify"):
+        return pwd_context.verify(password, hashed)
+
+
+async def run_bcrypt(fn, *args):
+    try:
+        return await password_pool.run(fn, *args)
+    except PoolFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many logins in progress, try again shortly",
+            headers={"Retry-After": str(BCRYPT_RETRY_AFTER_SECONDS)},
+        )
+
 class RegisterModel(BaseModel):
     name: str
     email: EmailStr
@@ -35,11 +137,11 @@ def create_access_token(data: dict):
 
 
 @router.post("/register")
-def register_user(data: RegisterModel):
-    if users.find_one({"email": data.email}):
+async def register_user(data: RegisterModel):
+    if await run_io(users.find_one, {"email": data.email}, {"_id": 1}):
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_pw = pwd_context.hash(data.password)
+    hashed_pw = await run_bcrypt(hash_password, data.password)
 
     new_user = {
         "name": data.name,
@@ -47,7 +149,11 @@ def register_user(data: RegisterModel):
         "password": hashed_pw,
     }
 
-    users.insert_one(new_user)
+    try:
+        await run_io(users.insert_one, new_user)
+    except DuplicateKeyError:
+        # registered concurrently, caught by the unique email index
+        raise HTTPException(status_code=400, detail="Email already registered")
 
     return {"message": "User registered successfully"}
 
@@ -56,12 +162,13 @@ class LoginModel(BaseModel):
     password: str
 
 @router.post("/login")
-def login_user(data: LoginModel):
-    user = users.find_one({"email": data.email})
+async def login_user(data: LoginModel):
+    user = await run_io(users.find_one, {"email": data.email})
     if not user:
         raise HTTPException(status_code=400, detail="Invalid email or password")
 
-    if not pwd_context.verify(data.password, user["password"]):
+    verified = await run_bcrypt(verify_password, data.password, user["password"])
+    if not verified:
         raise HTTPException(status_code=400, detail="Invalid email or password")
 
     token = create_access_token({
@@ -97,9 +204,9 @@ def auth_status(request: Request):
         raise HTTPException(status_code=401, detail="Not authenticated")
 
     try:
-        jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        decode_token(token)
         return {"status": "authenticated"}
-    except:
+    except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
 @router.post("/logout")
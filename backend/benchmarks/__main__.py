@@ -0,0 +1,92 @@
+# python -m benchmarks [run|compare] ..., from the backend directory
+import argparse
+import json
+import sys
+from benchmarks.suite import BENCHMARKS, DEFAULT_CLASSIFIER, DEFAULT_REGRESSOR, run_suite, compare_runs
+
+
+def format_bytes(n) -> str:
+    return "-" if n is None else f"{n / 1024 / 1024:.1f} MB"
+
+
+def print_result(result: dict):
+    print(
+        f"{result['function']:<26} {result['rows']:>10} rows  "
+        f"{result['seconds']['min']:>9.4f} s  "
+        f"{result['rows_per_second']:>14,.0f} rows/s  "
+        f"peak {format_bytes(result['peak_memory_bytes'])}",
+        file=sys.stderr,
+    )
+
+
+def run(args):
+    shape = {
+        "numeric": args.numeric,
+        "categorical": args.categorical,
+        "missing": args.missing,
+        "cardinality": args.cardinality,
+        "classes": args.classes,
+        "seed": args.seed,
+    }
+    report = run_suite(
+        args.rows, shape, functions=args.functions, repeat=args.repeat,
+        trace_memory=not args.no_memory, classifier=args.classifier,
+        regressor=args.regressor, mongo_url=args.mongo_url, on_result=print_result,
+    )
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    regressed = False
+    for function, rows, old_s, new_s, ratio, worse in compare_runs(baseline, current, args.threshold):
+        flag = "  REGRESSION" if worse else ""
+        print(f"{function:<26} {rows:>10} rows  {old_s:>9.4f} s -> {new_s:>9.4f} s  x{ratio:.2f}{flag}")
+        regressed = regressed or worse
+
+    return 1 if regressed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("run", help="run the suite and write the results as json")
+    p.add_argument("--rows", type=int, nargs="+", default=[10_000], help="dataset sizes, e.g. 10000 1000000")
+    p.add_argument("--numeric", type=int, default=8)
+    p.add_argument("--categorical", type=int, default=2)
+    p.add_argument("--missing", type=float, default=0.05, help="fraction of missing cells per feature")
+    p.add_argument("--cardinality", type=int, default=20, help="categories per categorical column")
+    p.add_argument("--classes", type=int, default=3)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--functions", nargs="+", choices=list(BENCHMARKS))
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    p.add_argument("--classifier", default=DEFAULT_CLASSIFIER)
+    p.add_argument("--regressor", default=DEFAULT_REGRESSOR)
+    p.add_argument("--mongo-url", help="benchmark storage against this server instead of mongomock")
+    p.add_argument("--output", "-o", help="results file, stdout by default")
+
+    c = commands.add_parser("compare", help="compare two result files")
+    c.add_argument("baseline")
+    c.add_argument("current")
+    c.add_argument("--threshold", type=float, default=0.1, help="slowdown that counts as a regression")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+main()
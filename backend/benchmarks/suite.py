@@ -0,0 +1,222 @@
+# suite.py
+import gc
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import sklearn
+from preprocessing.process_Dataset import process_dataset
+from preprocessing.missing_Values import check_missing_values, handle_missing_values
+from preprocessing.encoding import one_hot_encode_text
+from preprocessing.scale_features import scale_features_from_text
+from training.train_classification import train_classifier_model
+from training.train_regression import train_regression_model
+from training.features import dense_feature_matrix
+from storage.columnar import write_dataframe, load_dataframe
+from benchmarks.synthetic import CLASS_TARGET, REGRESSION_TARGET, make_dataset
+
+DEFAULT_CLASSIFIER = "Logistic Regression"
+DEFAULT_REGRESSOR = "Linear Regression"
+
+
+class Stages:
+    # the frames each benchmark starts from: every stage is the output of the
+    # previous one, built once per dataset size and never timed
+    def __init__(self, raw: pd.DataFrame):
+        self.raw = raw
+        self._frames = {}
+
+    def get(self, name: str) -> pd.DataFrame:
+        if name not in self._frames:
+            self._frames[name] = STAGE_BUILDERS[name](self)
+        return self._frames[name]
+
+
+STAGE_BUILDERS = {
+    "raw": lambda stages: stages.raw,
+    "imputed": lambda stages: handle_missing_values(stages.get("raw"), CLASS_TARGET, "classification")[0],
+    "encoded": lambda stages: one_hot_encode_text(stages.get("imputed"), CLASS_TARGET)[0],
+    "scaled": lambda stages: scale_features_from_text(stages.get("encoded"), "standard", CLASS_TARGET)[0],
+}
+
+
+def run_write_dataframe(df, store):
+    return write_dataframe(store, df, "benchmark")
+
+
+def run_load_dataframe(file_id, store):
+    return load_dataframe(store, file_id)
+
+
+# name -> (input stage, function, extra args built from the options)
+BENCHMARKS = {
+    "process_dataset": ("raw", process_dataset, lambda opts: ()),
+    "check_missing_values": ("raw", check_missing_values, lambda opts: ()),
+    "handle_missing_values": ("raw", handle_missing_values, lambda opts: (CLASS_TARGET, "classification")),
+    "handle_missing_values_knn": (
+        "raw", handle_missing_values, lambda opts: (CLASS_TARGET, "classification", "knn"),
+    ),
+    "one_hot_encode_text": ("imputed", one_hot_encode_text, lambda opts: (CLASS_TARGET,)),
+    "scale_features_from_text": ("encoded", scale_features_from_text, lambda opts: ("standard", CLASS_TARGET)),
+    "dense_feature_matrix": (
+        "imputed",
+        lambda df, *args: dense_feature_matrix(df.drop(columns=[CLASS_TARGET, REGRESSION_TARGET]), *args),
+        lambda opts: (0,),
+    ),
+    "train_classifier_model": (
+        "scaled",
+        lambda df, *args: train_classifier_model(df.drop(columns=[REGRESSION_TARGET]), *args),
+        lambda opts: (opts["classifier"], CLASS_TARGET, 20),
+    ),
+    "train_regression_model": (
+        "scaled",
+        lambda df, *args: train_regression_model(df.drop(columns=[CLASS_TARGET]), *args),
+        lambda opts: (opts["regressor"], REGRESSION_TARGET, 20),
+    ),
+    "write_dataframe": ("scaled", run_write_dataframe, lambda opts: (opts["store"],)),
+    "load_dataframe": ("stored", run_load_dataframe, lambda opts: (opts["store"],)),
+}
+
+STORAGE_BENCHMARKS = ("write_dataframe", "load_dataframe")
+
+
+def local_store(mongo_url: str | None = None):
+    # GridFS on a real server when a url is given, otherwise an in-process
+    # mongomock stand-in so the storage benchmarks need no database
+    from gridfs import GridFS
+    if mongo_url:
+        from pymongo import MongoClient
+        client = MongoClient(mongo_url)
+    else:
+        try:
+            import mongomock
+            import mongomock.gridfs
+        except ImportError:
+            raise RuntimeError(
+                "The storage benchmarks need mongomock (pip install -r benchmarks/requirements.txt) or --mongo-url"
+            )
+        mongomock.gridfs.enable_gridfs_integration()
+        client = mongomock.MongoClient()
+    return GridFS(client["nocode_ml_benchmarks"])
+
+
+def measure(fn, args: tuple, repeat: int, trace_memory: bool = True) -> dict:
+    # wall time over untraced runs, then one run under tracemalloc for the
+    # peak, tracing slows allocation-heavy code down too much to time it
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - started)
+
+    peak = None
+    if trace_memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn(*args)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "seconds": {
+            "min": min(times),
+            "median": statistics.median(times),
+            "mean": statistics.fmean(times),
+        },
+        "peak_memory_bytes": peak,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "git_commit": git_commit(),
+    }
+
+
+def run_suite(sizes: list, shape: dict, functions: list | None = None, repeat: int = 3,
+              trace_memory: bool = True, classifier: str = DEFAULT_CLASSIFIER,
+              regressor: str = DEFAULT_REGRESSOR, mongo_url: str | None = None,
+              on_result=lambda result: None) -> dict:
+    functions = functions or list(BENCHMARKS)
+    unknown = [name for name in functions if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {', '.join(unknown)}")
+
+    opts = {"classifier": classifier, "regressor": regressor, "store": None}
+    if any(name in STORAGE_BENCHMARKS for name in functions):
+        opts["store"] = local_store(mongo_url)
+
+    results = []
+    for rows in sizes:
+        stages = Stages(make_dataset(rows, **shape))
+        for name in functions:
+            stage, fn, extra = BENCHMARKS[name]
+            if stage == "stored":
+                df = stages.get("scaled")
+                inputs = write_dataframe(opts["store"], df, "benchmark")
+            else:
+                inputs = df = stages.get(stage)
+
+            result = {
+                "function": name,
+                "rows": rows,
+                "columns": df.shape[1],
+                **measure(fn, (inputs, *extra(opts)), repeat, trace_memory),
+            }
+            result["rows_per_second"] = rows / result["seconds"]["min"] if result["seconds"]["min"] else None
+            results.append(result)
+            on_result(result)
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "config": {
+            "sizes": sizes,
+            "shape": shape,
+            "repeat": repeat,
+            "trace_memory": trace_memory,
+            "classifier": classifier,
+            "regressor": regressor,
+            "store": None if opts["store"] is None else "mongodb" if mongo_url else "mongomock",
+        },
+        "results": results,
+    }
+
+
+def compare_runs(baseline: dict, current: dict, threshold: float = 0.1) -> list:
+    # [(function, rows, baseline s, current s, ratio, regressed)] for every
+    # case present in both runs, on the min time, the least noisy figure
+    before = {(r["function"], r["rows"]): r for r in baseline["results"]}
+    rows = []
+    for r in current["results"]:
+        old = before.get((r["function"], r["rows"]))
+        if old is None:
+            continue
+        old_s, new_s = old["seconds"]["min"], r["seconds"]["min"]
+        ratio = new_s / old_s if old_s else float("inf")
+        rows.append((r["function"], r["rows"], old_s, new_s, ratio, ratio > 1 + threshold))
+    return rows
@@ -0,0 +1,40 @@
+# synthetic.py
+import numpy as np
+import pandas as pd
+
+CLASS_TARGET = "label"
+REGRESSION_TARGET = "value"
+
+
+def make_dataset(rows: int, numeric: int = 8, categorical: int = 2, missing: float = 0.05,
+                 cardinality: int = 20, classes: int = 3, seed: int = 0) -> pd.DataFrame:
+    # numeric features, skewed string categories and NaNs at the given rate,
+    # plus a string class label and a float target that both depend on the
+    # features, so the models have something to learn
+    rng = np.random.default_rng(seed)
+    data = {}
+
+    X = rng.standard_normal((rows, numeric))
+    for i in range(numeric):
+        data[f"num_{i}"] = X[:, i]
+
+    # zipf-like weights, a few common categories and a long tail
+    weights = 1.0 / np.arange(1, cardinality + 1)
+    weights /= weights.sum()
+    for i in range(categorical):
+        levels = np.array([f"cat{i}_{k}" for k in range(cardinality)], dtype=object)
+        data[f"cat_{i}"] = levels[rng.choice(cardinality, size=rows, p=weights)]
+
+    df = pd.DataFrame(data)
+
+    if missing > 0:
+        for col in df.columns:
+            mask = rng.random(rows) < missing
+            df.loc[mask, col] = np.nan if col.startswith("num_") else None
+
+    signal = X[:, : max(1, min(numeric, 3))].sum(axis=1)
+    edges = np.quantile(signal, np.linspace(0, 1, classes + 1)[1:-1])
+    df[CLASS_TARGET] = np.array([f"class_{k}" for k in range(classes)], dtype=object)[np.digitize(signal, edges)]
+    df[REGRESSION_TARGET] = signal + rng.normal(scale=0.5, size=rows)
+
+    return df
@@ -1,12 +1,18 @@
 from bson import ObjectId
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Response
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Response, BackgroundTasks
 from fastapi.security import OAuth2PasswordBearer
-from pymongo import MongoClient
-from gridfs import GridFS
-from jose import jwt
+from fastapi.concurrency import run_in_threadpool
+from jose import JWTError
+from auth import decode_token
 from datetime import datetime
 import csv, io, os
-from preprocessing.process_Dataset import process_dataset
+from preprocessing.pipeline import version_key, get_summary, current_plan, step_transform_ids
+from storage.schema import file_schema
+from storage.profile import profile_file
+from storage.csv_ingest import ingest_csv, read_csv_preview
+from storage.versions import add_version, version_entry, serialize_version
+from execution import run_io
+from db import fs, datasets, blob_store, async_collection
 from pydantic import BaseModel
 from typing import List, Any
 from fastapi import Cookie,Request
@@ -15,14 +21,7 @@ from fastapi import Cookie,Request
 
 router = APIRouter()
 
-MONGO_URL = os.getenv("MONGO_URL")
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = "HS256"
-
-client = MongoClient(MONGO_URL)
-db = client["nocode_ml"]
-fs = GridFS(db)
-datasets = db["datasets"]
+adatasets = async_collection("datasets")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
@@ -32,9 +31,8 @@ def get_current_user(request: Request):
         raise HTTPException(status_code=401, detail="Not authenticated")
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload["id"]   
-    except:
+        return decode_token(token)["id"]
+    except (JWTError, KeyError):
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
@@ -63,22 +61,34 @@ def restore_dataset(dataset_id: str):
     if not original_id:
         raise HTTPException(status_code=400, detail="Original file missing")
 
-    original_file = fs.get(original_id)
-    original_bytes = original_file.read()
-
-    new_latest_id = fs.put(
-        original_bytes,
-        filename=f"restored_{doc['name']}"
-    )
+    preview = read_csv_preview(fs, original_id)
 
-    csv_text = original_bytes.decode("utf-8")
-    reader = list(csv.reader(io.StringIO(csv_text)))
-    preview = reader[:21]
+    # restoring is a pointer update, the original blob just gains a reference
+    blob_store.retain(original_id)
 
-    datasets.update_one(
-        {"_id": ObjectId(dataset_id)},
-        {"$set": {"latest_version_file_id": new_latest_id, "preview": preview}}
-    )
+    update = {
+        "$set": {"latest_version_file_id": original_id, "preview": preview},
+        "$unset": {"pipeline": ""},
+    }
+    if doc.get("original_summary"):
+        update["$set"]["summary"] = doc["original_summary"]
+    else:
+        update["$unset"]["summary"] = ""
+
+    # the original needs no fitted transforms, pending or stored, and its
+    # target isn't label-encoded
+    update["$unset"]["transform_file_id"] = ""
+    update["$unset"]["label_encoder_file_id"] = ""
+    update["$unset"]["label_encoder_target"] = ""
+
+    datasets.update_one({"_id": ObjectId(dataset_id)}, update)
+    add_version(datasets, blob_store, doc["_id"], original_id, "restore")
+
+    blob_store.release(doc.get("latest_version_file_id"))
+    blob_store.release(doc.get("transform_file_id"))
+    blob_store.release(doc.get("label_encoder_file_id"))
+    for file_id in step_transform_ids(current_plan(doc)):
+        blob_store.release(file_id)
 
     return {
         "dataset_id": dataset_id,
@@ -87,6 +97,25 @@ def restore_dataset(dataset_id: str):
 
 
 
+def store_original_summary(dataset_id, file_id):
+    # runs after the upload response, one chunk of the file in memory at a
+    # time like the upload itself
+    profile = profile_file(fs, file_id)
+
+    if file_schema(fs.get(file_id)) is None:
+        # inferred once per upload, later reads of the csv use these dtypes
+        schema = profile.schema()
+        blob_store.annotate(file_id, schema=schema, memory=profile.memory(schema))
+
+    summary = {"version": version_key({"base_file_id": file_id, "steps": []}), **profile.summary()}
+
+    datasets.update_one({"_id": dataset_id}, {"$set": {"original_summary": summary}})
+    datasets.update_one(
+        {"_id": dataset_id, "summary": {"$exists": False}},
+        {"$set": {"summary": summary}}
+    )
+
+
 def serialize_dataset(document):
     return {
         "id": str(document["_id"]),
@@ -98,38 +127,43 @@ def serialize_dataset(document):
 @router.post("/upload")
 async def upload_dataset(
     request: Request,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...)
 ):
     user_id = get_current_user(request)
 
-    file_bytes = await file.read()
-    csv_text = file_bytes.decode("utf-8")
-
-    file_id = fs.put(io.BytesIO(file_bytes), filename=file.filename)
-
-    latest_version_file_id = fs.put(io.BytesIO(file_bytes), filename=f"latest_{file.filename}")
-
-    reader = list(csv.reader(io.StringIO(csv_text)))
-
-    if not reader:
+    try:
+        file_id, preview, row_count = await run_in_threadpool(
+            ingest_csv, blob_store, file.file, file.filename
+        )
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV must be UTF-8 encoded")
+
+    if row_count == 0:
+        await run_io(blob_store.release, file_id)
         raise HTTPException(status_code=400, detail="Empty CSV")
 
-    header = reader[0]
-    preview = reader[:21]
+    header = preview[0]
+    # one reference for the latest version pointer, one for the history
+    await run_io(blob_store.retain, file_id)
+    await run_io(blob_store.retain, file_id)
 
+    # versions are immutable, so the first latest version is the upload itself
     doc = {
         "user_id": user_id,
         "name": file.filename,
         "original_file_id": file_id,
-        "latest_version_file_id": latest_version_file_id,
-        "rows": len(reader) - 1,
+        "latest_version_file_id": file_id,
+        "rows": row_count - 1,
         "columns": header,
         "preview": preview,
         "uploaded_at": datetime.utcnow(),
         "status": "raw",
+        "versions": [version_entry(file_id, "upload")],
     }
 
-    dataset_id = datasets.insert_one(doc).inserted_id
+    dataset_id = (await adatasets.insert_one(doc)).inserted_id
+    background_tasks.add_task(store_original_summary, dataset_id, file_id)
 
     return {
         "dataset_id": str(dataset_id),
@@ -138,7 +172,7 @@ async def upload_dataset(
 
 
 @router.post("/clone/{sample_id}")
-def clone_sample_dataset(sample_id: str, request: Request):
+def clone_sample_dataset(sample_id: str, request: Request, background_tasks: BackgroundTasks):
 
     user_id = get_current_user(request)
 
@@ -152,10 +186,12 @@ def clone_sample_dataset(sample_id: str, request: Request):
     output = io.StringIO()
     writer = csv.writer(output)
     writer.writerows(rows)
-    csv_text = output.getvalue().encode("utf-8")
+    csv_bytes = output.getvalue().encode("utf-8")
 
-    original_file_id = fs.put(csv_text, filename=f"{doc['name']}_original.csv")
-    latest_version_file_id = fs.put(csv_text, filename=f"{doc['name']}_latest.csv")
+    # every clone of a sample shares one stored copy
+    file_id = blob_store.put(csv_bytes, filename=f"{doc['name']}.csv", metadata={"format": "csv"})
+    blob_store.retain(file_id)
+    blob_store.retain(file_id)
 
     header = rows[0]
     preview = rows[:21]
@@ -163,16 +199,18 @@ def clone_sample_dataset(sample_id: str, request: Request):
     new_doc = {
         "user_id": user_id,
         "name": doc["name"],
-        "original_file_id": original_file_id,
-        "latest_version_file_id": latest_version_file_id,
+        "original_file_id": file_id,
+        "latest_version_file_id": file_id,
         "rows": len(rows) - 1,
         "columns": header,
         "preview": preview,
         "uploaded_at": datetime.utcnow(),
         "status": "raw",
+        "versions": [version_entry(file_id, "clone")],
     }
 
     dataset_id = datasets.insert_one(new_doc).inserted_id
+    background_tasks.add_task(store_original_summary, dataset_id, file_id)
 
     return {
         "dataset_id": str(dataset_id),
@@ -186,19 +224,48 @@ class DatasetProcessRequest(BaseModel):
 
 class ProcessedStatisticsResponse(BaseModel):
     statistics: List[List[Any]]
+    memory: dict | None = None
 
 @router.post("/process", response_model=ProcessedStatisticsResponse)
 async def process_dataset_backend(body: DatasetProcessRequest):
     dataset_id = body.dataset_id
+    doc = await adatasets.find_one({"_id": ObjectId(dataset_id)})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    summary = await run_io(get_summary, datasets, fs, doc)
+    metadata = await run_io(stored_version_metadata, doc)
+
+    return ProcessedStatisticsResponse(statistics=summary["statistics"], memory=metadata.get("memory"))
+
+
+def stored_version_metadata(doc) -> dict:
+    file_id = doc.get("latest_version_file_id") or doc["original_file_id"]
+    return fs.get(file_id).metadata or {}
+
+
+@router.get("/schema/{dataset_id}")
+def get_dataset_schema(dataset_id: str):
     doc = datasets.find_one({"_id": ObjectId(dataset_id)})
     if not doc:
         raise HTTPException(status_code=404, detail="Dataset not found")
 
-    file_id = doc["latest_version_file_id"]
-    grid_out = fs.get(file_id)
-    csv_bytes = grid_out.read()
-    csv_text = csv_bytes.decode("utf-8")
+    metadata = stored_version_metadata(doc)
+
+    return {
+        "dataset_id": dataset_id,
+        "schema": metadata.get("schema"),
+        "memory": metadata.get("memory"),
+    }
 
-    result = process_dataset(csv_text)
 
-    return ProcessedStatisticsResponse(**result)
\ No newline at end of file
+@router.get("/versions/{dataset_id}")
+def get_dataset_versions(dataset_id: str):
+    doc = datasets.find_one({"_id": ObjectId(dataset_id)}, {"versions": 1, "latest_version_file_id": 1})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    return {
+        "dataset_id": dataset_id,
+        "versions": [serialize_version(v, doc.get("latest_version_file_id")) for v in doc.get("versions", [])],
+    }
@@ -0,0 +1,106 @@
+# db.py
+import os
+from pymongo import MongoClient
+from gridfs import GridFS
+from dotenv import load_dotenv
+from execution import run_io, run_cpu
+from storage.blobs import BlobStore
+from storage.columnar import read_dataframe, parse_dataframe, CSV_FORMAT
+from storage.frame_cache import frame_cache
+from telemetry import span
+load_dotenv()
+
+MONGO_URL = os.getenv("MONGO_URL")
+MONGO_DB = os.getenv("MONGO_DB", "nocode_ml")
+
+# one pool per API worker (and per job worker process), shared by every router
+MONGO_OPTIONS = {
+    "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+    "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+    "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000")),
+    "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+    "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "120000")),
+    "readPreference": os.getenv("MONGO_READ_PREFERENCE", "primary"),
+}
+
+# "motor" serves the async endpoints from Motor's event-loop driver,
+# anything else runs pymongo calls on the threadpool
+MONGO_ASYNC_DRIVER = os.getenv("MONGO_ASYNC_DRIVER", "threads")
+
+client = MongoClient(MONGO_URL, **MONGO_OPTIONS)
+db = client[MONGO_DB]
+fs = GridFS(db)
+blob_store = BlobStore(db, fs)
+
+users = db["users"]
+datasets = db["datasets"]
+models_collection = db["models"]
+jobs_collection = db["training_jobs"]
+folds_collection = db["fold_indices"]
+
+
+class ThreadedCollection:
+    # awaitable pymongo collection with the same call shape as Motor's
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return await run_io(method, *args, **kwargs)
+
+        return call
+
+
+_async_db = None
+_async_fs = None
+
+
+def motor_enabled() -> bool:
+    return MONGO_ASYNC_DRIVER == "motor"
+
+
+def get_async_db():
+    global _async_db
+    if _async_db is None:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        _async_db = AsyncIOMotorClient(MONGO_URL, **MONGO_OPTIONS)[MONGO_DB]
+    return _async_db
+
+
+def get_async_fs():
+    global _async_fs
+    if _async_fs is None:
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+        _async_fs = AsyncIOMotorGridFSBucket(get_async_db())
+    return _async_fs
+
+
+def async_collection(name: str):
+    if motor_enabled():
+        return get_async_db()[name]
+    return ThreadedCollection(db[name])
+
+
+async def read_dataframe_async(file_id, columns: list | None = None):
+    if not motor_enabled():
+        return await run_io(read_dataframe, fs, file_id, columns)
+
+    key = (str(file_id), tuple(columns) if columns is not None else None)
+    df = frame_cache.get(key)
+    if df is not None:
+        return df
+    frame_cache.record_miss()
+
+    # chunks stream over Motor without parking a thread on the socket
+    with span("gridfs_read") as s:
+        grid_out = await get_async_fs().open_download_stream(file_id)
+        metadata = grid_out.metadata or {}
+        data = await grid_out.read()
+        s.set(bytes_read=len(data))
+
+    df = await run_cpu(parse_dataframe, data, metadata.get("format", CSV_FORMAT), columns, metadata.get("schema"))
+    frame_cache.put(key, df)
+    return df.copy(deep=False)
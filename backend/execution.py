@@ -0,0 +1,147 @@
+# execution.py
+import asyncio
+import contextvars
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from fastapi.concurrency import run_in_threadpool
+
+# pandas and sklearn release the GIL for most heavy kernels, so threads are
+# the default; "process" isolates transforms completely at the cost of
+# pickling frames in and out of the workers
+CPU_EXECUTOR = os.getenv("CPU_EXECUTOR", "thread")
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 1)))
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+
+_cpu_pool = None
+
+
+def cpu_pool():
+    global _cpu_pool
+    if _cpu_pool is None:
+        if CPU_EXECUTOR == "process":
+            _cpu_pool = ProcessPoolExecutor(
+                max_workers=CPU_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        else:
+            _cpu_pool = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+    return _cpu_pool
+
+
+async def run_cpu(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    if CPU_EXECUTOR == "process":
+        return await loop.run_in_executor(cpu_pool(), partial(fn, *args, **kwargs))
+
+    # run_in_executor doesn't carry contextvars over on its own
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(cpu_pool(), partial(context.run, fn, *args, **kwargs))
+
+
+async def run_io(fn, *args, **kwargs):
+    # blocking pymongo / GridFS calls go to the regular starlette threadpool
+    return await run_in_threadpool(fn, *args, **kwargs)
+
+
+def shutdown_cpu_pool():
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(wait=False, cancel_futures=True)
+
+
+class PoolFull(Exception):
+    pass
+
+
+class BoundedPool:
+    # a dedicated thread pool for one kind of expensive call that turns work
+    # away once max_pending calls are waiting, instead of queueing without
+    # limit and holding everything else up behind it
+    def __init__(self, name: str, workers: int, max_pending: int):
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args, **kwargs):
+        # only ever touched from the event loop, no lock needed
+        if self._in_flight >= self.workers + self.max_pending:
+            self.rejected += 1
+            raise PoolFull()
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+
+        self._in_flight += 1
+        try:
+            context = contextvars.copy_context()
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, partial(context.run, fn, *args, **kwargs)
+            )
+        finally:
+            self._in_flight -= 1
+            self.completed += 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": self._in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+class LoopLagMonitor:
+    # sleeps for a fixed interval and records how late the loop woke it up,
+    # anything blocking the event loop shows up directly as lag
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.samples = deque(maxlen=600)
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        samples = sorted(self.samples)
+        if not samples:
+            return {"samples": 0, "interval": self.interval}
+        return {
+            "samples": len(samples),
+            "interval": self.interval,
+            "last": self.samples[-1],
+            "avg": sum(samples) / len(samples),
+            "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+            "max_recent": samples[-1],
+            "max": self.max_lag,
+        }
+
+
+loop_monitor = LoopLagMonitor()
@@ -1,16 +1,30 @@
-from fastapi import FastAPI
+import os
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from auth import router as auth_router
-from dataset import router as dataset_router
+from auth import router as auth_router, ensure_user_indexes, password_pool, token_cache
+from dataset import router as dataset_router, get_current_user
 from preprocess import router as preprocessing_router
-from train import router as train_router
+from train import router as train_router, job_queue, feature_cache
+from storage.frame_cache import frame_cache
+from execution import loop_monitor, shutdown_cpu_pool
+from db import db, fs, blob_store
+from storage.compactor import Compactor
+from telemetry import PROMETHEUS_CONTENT_TYPE, metrics, start_tracing, timing_middleware
+
+# user ids allowed to delete through /storage/compact, everyone else only
+# gets the dry-run report
+STORAGE_ADMINS = {user_id for user_id in os.getenv("STORAGE_ADMINS", "").split(",") if user_id}
 
 app = FastAPI()
+compactor = Compactor(db, fs, blob_store)
 app.include_router(auth_router)
 app.include_router(dataset_router,prefix="/dataset")
 app.include_router(preprocessing_router,prefix="/preprocessing")
 app.include_router(train_router,prefix="/train")
 
+# per-stage spans and request latency for /metrics and Server-Timing
+app.middleware("http")(timing_middleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000","https://nocode-blue.vercel.app","http://127.0.0.1:3000"],  
@@ -19,6 +33,63 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def create_indexes():
+    blob_store.ensure_indexes()
+    ensure_user_indexes()
+
+@app.on_event("startup")
+def start_job_heartbeat():
+    job_queue.start_heartbeat()
+
+@app.on_event("startup")
+def start_memory_tracing():
+    start_tracing()
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    loop_monitor.start()
+
+@app.on_event("startup")
+async def start_compactor():
+    compactor.start()
+
+@app.on_event("shutdown")
+def stop_workers():
+    loop_monitor.stop()
+    compactor.stop()
+    job_queue.shutdown()
+    password_pool.shutdown()
+    shutdown_cpu_pool()
+
 @app.get("/")
 def health():
-    return {"alive": True}
\ No newline at end of file
+    return {"alive": True}
+
+@app.get("/health/loop")
+def loop_lag():
+    return loop_monitor.stats()
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {"frames": frame_cache.stats()}
+
+metrics.add_collector("frame_cache", frame_cache.stats)
+metrics.add_collector("event_loop_lag", loop_monitor.stats)
+metrics.add_collector("training_queue", job_queue.stats)
+metrics.add_collector("feature_cache", feature_cache.stats)
+metrics.add_collector("compactor", compactor.stats)
+metrics.add_collector("bcrypt_pool", password_pool.stats)
+metrics.add_collector("token_cache", token_cache.stats)
+
+@app.post("/storage/compact")
+def compact_storage(request: Request, dry_run: bool = True):
+    # sweeps every user's files, so only a dry run unless the caller is an admin
+    user_id = get_current_user(request)
+    if not dry_run and user_id not in STORAGE_ADMINS:
+        raise HTTPException(403, "Only storage admins can run compaction")
+    return compactor.run(dry_run=dry_run)
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
\ No newline at end of file
@@ -1,23 +1,34 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, StrictInt
 from typing import List, Any
-from fastapi import APIRouter, HTTPException
-from pymongo import MongoClient
-from gridfs import GridFS
+from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi.responses import StreamingResponse
 from bson import ObjectId
-from preprocessing.missing_Values import check_missing_values, handle_missing_values
-from preprocessing.encoding import one_hot_encode_text
-from preprocessing.scale_features import scale_features_from_text
+from preprocessing.pipeline import (
+    current_plan, resolve_frame, extend_plan, fit_step, cache_plan_output, get_summary,
+    materialize, base_chain
+)
+from preprocessing.transformers import dump_transform, load_transform, chunk_to_csv
+from execution import run_cpu, run_io
+from db import fs, datasets, blob_store, async_collection, read_dataframe_async
+from telemetry import span
 import os
+import shutil
+import tempfile
 import numpy as np
+import pandas as pd
 
 router = APIRouter()
-MONGO_URL = os.getenv("MONGO_URL")
-client = MongoClient(MONGO_URL)
-db = client["nocode_ml"]
-fs = GridFS(db)
-datasets = db["datasets"]
+adatasets = async_collection("datasets")
+
+# rows of new data transformed at a time, the response streams chunk by chunk
+TRANSFORM_CHUNK_ROWS = int(os.getenv("TRANSFORM_CHUNK_ROWS", "50000"))
+TRANSFORM_SPOOL_BYTES = 16 * 1024 * 1024
 
 def clean_preview(preview):
+    with span("clean_preview", rows=len(preview)):
+        return clean_rows(preview)
+
+def clean_rows(preview):
     cleaned = []
     for row in preview:
         cleaned_row = []
@@ -31,6 +42,40 @@ def clean_preview(preview):
         cleaned.append(cleaned_row)
     return cleaned
 
+async def load_plan_frame(plan: dict):
+    if not plan["steps"]:
+        return await read_dataframe_async(plan["base_file_id"])
+    return await run_io(resolve_frame, fs, plan)
+
+async def run_pipeline_step(doc, op: str, params: dict):
+    plan = current_plan(doc)
+    df = await load_plan_frame(plan)
+
+    new_plan = extend_plan(plan, op, params)
+    processed_df, preview, extra, summary = await run_cpu(fit_step, df, new_plan)
+    cache_plan_output(new_plan, processed_df)
+
+    # the fitted step is kept with the plan, materializing chains it onto
+    # the transforms of the base version
+    transform = extra.pop("transform")
+    new_plan["steps"][-1]["transform_file_id"] = await run_io(
+        blob_store.put, dump_transform(transform), filename=f"{doc['name']}_{op}_transform.pkl"
+    )
+
+    return processed_df, clean_preview(preview), extra, new_plan, summary
+
+async def save_pipeline_step(doc, plan: dict, fields: dict, new_file_ids: tuple = ()):
+    # lands only on the pipeline the step was fitted on, like materialize();
+    # a step that lost the race gives back the blobs it wrote
+    result = await adatasets.update_one(
+        {"_id": doc["_id"], "pipeline": doc.get("pipeline")},
+        {"$set": {"pipeline": plan, **fields}}
+    )
+    if not result.matched_count:
+        for file_id in (plan["steps"][-1].get("transform_file_id"), *new_file_ids):
+            await run_io(blob_store.release, file_id)
+        raise HTTPException(409, "The dataset was changed by another step, reload it and try again")
+
 class MissingCheckRequest(BaseModel):
     dataset_id: str
 
@@ -38,6 +83,10 @@ class MissingHandleRequest(BaseModel):
     dataset_id: str
     target_variable: str
     task: str   
+    # "simple" (mean / most frequent), "knn" or "iterative"; the model-based
+    # ones fall back to means for columns they can't get to in time_budget
+    strategy: str = "simple"
+    time_budget: float | None = None
 
 
 class MissingCheckResponse(BaseModel):
@@ -48,63 +97,52 @@ class MissingHandleResponse(BaseModel):
     processed_dataset: List[List[Any]]  
     changes: List[str]
 
-def dataframe_to_csv_bytes(df):
-    from io import StringIO
-    buffer = StringIO()
-    df.to_csv(buffer, index=False)
-    return buffer.getvalue().encode("utf-8")
-
-
 @router.post("/missing/check", response_model=MissingCheckResponse)
 async def check_missing_endpoint(body: MissingCheckRequest):
 
-    doc = datasets.find_one({"_id": ObjectId(body.dataset_id)})
+    doc = await adatasets.find_one({"_id": ObjectId(body.dataset_id)})
     if not doc:
         raise HTTPException(status_code=404, detail="Dataset not found")
 
-    file_id = doc["latest_version_file_id"]
-    csv_text = fs.get(file_id).read().decode("utf-8")
+    summary = await run_io(get_summary, datasets, fs, doc)
 
-    result = check_missing_values(csv_text)
-    return result
+    return {"missing_values": summary["missing_values"]}
 
 
 @router.post("/missing/handle", response_model=MissingHandleResponse)
 async def handle_missing_endpoint(body: MissingHandleRequest):
 
-    doc = datasets.find_one({"_id": ObjectId(body.dataset_id)})
+    doc = await adatasets.find_one({"_id": ObjectId(body.dataset_id)})
     if not doc:
         raise HTTPException(status_code=404, detail="Dataset not found")
 
-    file_id = doc["latest_version_file_id"]
-    csv_text = fs.get(file_id).read().decode("utf-8")
-
-    processed_df, preview, changes = handle_missing_values(
-        csv_text,
-        body.target_variable,
-        body.task
-    )
+    try:
+        params = {"target_variable": body.target_variable, "task": body.task}
+        if body.strategy != "simple":
+            params["strategy"] = body.strategy
+        if body.time_budget is not None:
+            params["time_budget"] = body.time_budget
+        processed_df, preview, extra, plan, summary = await run_pipeline_step(doc, "missing", params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    preview = clean_preview(preview)
-
-    updated_csv_bytes = dataframe_to_csv_bytes(processed_df)
-
-    new_file_id = fs.put(updated_csv_bytes, filename="latest_processed.csv")
-
-    datasets.update_one(
-        {"_id": ObjectId(body.dataset_id)},
-        {"$set": {"latest_version_file_id": new_file_id, "preview": preview}}
-    )
+    await save_pipeline_step(doc, plan, {"preview": preview, "summary": summary})
 
     return {
         "processed_dataset": preview,
-        "changes": changes
+        "changes": extra["changes"]
     }
 
 
 class OneHotRequest(BaseModel):
     dataset_id: str
     target_variable: str
+    # bounds on the encoded width: categories past max_categories or rarer
+    # than min_frequency (a count, or a fraction of rows) are merged, and
+    # hash_features switches to a fixed number of hashed columns
+    max_categories: int | None = None
+    min_frequency: StrictInt | float | None = None
+    hash_features: int | None = None
 
 class OneHotResponse(BaseModel):
     preview: List[List[Any]]
@@ -115,36 +153,40 @@ async def one_hot_encode_endpoint(body: OneHotRequest):
     dataset_id = body.dataset_id
     target_variable = body.target_variable
 
-    doc = datasets.find_one({"_id": ObjectId(dataset_id)})
+    doc = await adatasets.find_one({"_id": ObjectId(dataset_id)})
     if not doc:
         raise HTTPException(status_code=404, detail="Dataset not found")
 
-    file_id = doc["latest_version_file_id"]
-    csv_text = fs.get(file_id).read().decode("utf-8")
-
-    processed_df, preview, encoder_file_bytes = one_hot_encode_text(csv_text, target_variable)
+    params = {"target_variable": target_variable}
+    for key in ("max_categories", "min_frequency", "hash_features"):
+        if getattr(body, key) is not None:
+            params[key] = getattr(body, key)
 
-    new_file_id = fs.put(
-        dataframe_to_csv_bytes(processed_df),
-        filename="one_hot_encoded.csv"
-    )
+    try:
+        processed_df, preview, extra, plan, summary = await run_pipeline_step(doc, "encoding", params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    preview = clean_preview(preview)
+    encoder_file_bytes = extra["encoder_file_bytes"]
 
     update_data = {
-        "latest_version_file_id": new_file_id,
         "preview": preview,
+        "summary": summary,
         "status": "encoded"
     }
 
+    new_file_ids = ()
     if encoder_file_bytes:
-        encoder_file_id = fs.put(encoder_file_bytes, filename=f"{target_variable}_label_encoder.pkl")
+        encoder_file_id = await run_io(
+            blob_store.put, encoder_file_bytes, filename=f"{target_variable}_label_encoder.pkl"
+        )
         update_data["label_encoder_file_id"] = encoder_file_id
+        update_data["label_encoder_target"] = target_variable
+        new_file_ids = (encoder_file_id,)
 
-    datasets.update_one(
-        {"_id": ObjectId(dataset_id)},
-        {"$set": update_data}
-    )
+    await save_pipeline_step(doc, plan, update_data, new_file_ids)
+    if encoder_file_bytes:
+        await run_io(blob_store.release, doc.get("label_encoder_file_id"))
 
     return {
         "preview": preview,
@@ -166,36 +208,108 @@ async def scaling_endpoint(body: ScalingRequest):
     method = body.method
     target_variable = body.target_variable
 
-    doc = datasets.find_one({"_id": ObjectId(dataset_id)})
+    doc = await adatasets.find_one({"_id": ObjectId(dataset_id)})
     if not doc:
         raise HTTPException(404, "Dataset not found")
 
-    file_id = doc["latest_version_file_id"]
-    csv_text = fs.get(file_id).read().decode("utf-8")
+    df_scaled, preview, extra, plan, summary = await run_pipeline_step(doc, "scaling", {
+        "method": method,
+        "target_variable": target_variable,
+    })
 
-    df_scaled, preview, message = scale_features_from_text(
-        csv_text, method, target_variable
-    )
+    await save_pipeline_step(doc, plan, {
+        "preview": preview,
+        "summary": summary,
+        "status": "scaled"
+    })
 
-    new_file_id = fs.put(
-        dataframe_to_csv_bytes(df_scaled),
-        filename="scaled_dataset.csv"
+    return ScalingResponse(
+        message=extra["message"],
+        preview=preview
     )
 
-    preview = clean_preview(preview)
-
-    datasets.update_one(
-        {"_id": ObjectId(dataset_id)},
-        {
-            "$set": {
-                "latest_version_file_id": new_file_id,
-                "preview": preview,
-                "status": "scaled"
-            }
-        }
-    )
 
-    return ScalingResponse(
-        message=message,
-        preview=preview
-    )
\ No newline at end of file
+def stored_chain(dataset_id: str, version_id: str | None, write_pending: bool):
+    doc = datasets.find_one({"_id": ObjectId(dataset_id)})
+    if not doc:
+        raise HTTPException(404, "Dataset not found")
+
+    if version_id is None:
+        # pending steps are written out first, like training does
+        if write_pending and current_plan(doc)["steps"]:
+            materialize(datasets, blob_store, fs, doc)
+            doc = datasets.find_one({"_id": ObjectId(dataset_id)})
+        chain = base_chain(fs, doc, current_plan(doc))
+    else:
+        entry = next((v for v in doc.get("versions", []) if str(v["version_id"]) == version_id), None)
+        if entry is None:
+            raise HTTPException(404, "Version not found")
+        if entry.get("transform_file_id"):
+            chain = load_transform(fs, entry["transform_file_id"])
+        elif entry["file_id"] == doc.get("original_file_id"):
+            chain = base_chain(fs, {"original_file_id": entry["file_id"]}, {"base_file_id": entry["file_id"]})
+        else:
+            chain = None
+
+    if chain is None:
+        raise HTTPException(409, "This version was stored without its fitted transforms, rerun preprocessing")
+    return chain
+
+
+@router.get("/transform/{dataset_id}")
+async def describe_transform_endpoint(dataset_id: str, version_id: str | None = None):
+    # describes the stored version, steps still pending aren't part of it
+    chain = await run_io(stored_chain, dataset_id, version_id, False)
+    return {"dataset_id": dataset_id, **chain.describe()}
+
+
+@router.post("/transform/{dataset_id}")
+async def apply_transform_endpoint(dataset_id: str, version_id: str | None = None, file: UploadFile = File(...)):
+    # new data through the exact transforms the stored version was fitted
+    # with, one chunk in memory at a time
+    chain = await run_io(stored_chain, dataset_id, version_id, True)
+
+    # the upload is closed once the handler returns, before the body has
+    # streamed, so the chunks are read from a spooled copy of our own
+    source = tempfile.SpooledTemporaryFile(max_size=TRANSFORM_SPOOL_BYTES)
+    await run_io(shutil.copyfileobj, file.file, source)
+    source.seek(0)
+
+    def next_chunk(reader):
+        try:
+            df = next(reader, None)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError(f"Could not parse CSV: {e}")
+        if df is None:
+            return None
+        with span("apply_transform", rows=len(df)):
+            try:
+                return chain.transform(df)
+            except (TypeError, KeyError) as e:
+                # values the fitted steps can't take, same as a bad upload
+                raise ValueError(f"Could not transform rows: {e}")
+
+    # the first chunk runs before the response starts, so bad input is
+    # still a 400 rather than a truncated body
+    try:
+        reader = pd.read_csv(source, chunksize=TRANSFORM_CHUNK_ROWS, dtype=chain.csv_dtypes())
+        first = await run_io(next_chunk, reader)
+    except (ValueError, UnicodeDecodeError) as e:
+        source.close()
+        raise HTTPException(400, str(e))
+    if first is None:
+        source.close()
+        raise HTTPException(400, "Empty CSV")
+
+    def stream():
+        try:
+            yield chunk_to_csv(first, header=True)
+            while (df := next_chunk(reader)) is not None:
+                yield chunk_to_csv(df, header=False)
+        finally:
+            source.close()
+
+    return StreamingResponse(
+        stream(), media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="transformed_{dataset_id}.csv"'},
+    )
@@ -1,14 +1,34 @@
 import numpy as np
 from sklearn.preprocessing import OneHotEncoder, LabelEncoder
-from sklearn.compose import ColumnTransformer
+from sklearn.feature_extraction import FeatureHasher
 import joblib
 import io
 import pandas as pd
-from io import StringIO
+from preprocessing.transformers import EncodingTransform
+
+def encode_categorical(X: pd.DataFrame, categorical_cols: list, max_categories=None, min_frequency=None):
+    # sparse output; rare categories past the limits share one
+    # "infrequent" column instead of getting their own
+    encoder = OneHotEncoder(
+        drop="first",
+        sparse_output=True,
+        handle_unknown="infrequent_if_exist" if max_categories or min_frequency else "ignore",
+        max_categories=max_categories,
+        min_frequency=min_frequency,
+    )
+    encoder.fit(X[categorical_cols])
+    return encoder, list(encoder.get_feature_names_out(categorical_cols))
+
 
-def one_hot_encode_text(csv_text: str, target_variable: str | None):
-    df = pd.read_csv(StringIO(csv_text))
+def hash_categorical(n_features: int):
+    # fixed width no matter how many distinct values show up
+    hasher = FeatureHasher(n_features=n_features, input_type="string", alternate_sign=False)
+    return hasher, [f"hash_{i}" for i in range(n_features)]
 
+
+def one_hot_encode_text(df: pd.DataFrame, target_variable: str | None,
+                        max_categories: int | None = None, min_frequency: int | float | None = None,
+                        hash_features: int | None = None, fitted: EncodingTransform | None = None):
     if target_variable and target_variable in df.columns:
         y = df[target_variable]
         X = df.drop(columns=[target_variable])
@@ -16,33 +36,20 @@ def one_hot_encode_text(csv_text: str, target_variable: str | None):
         y = None
         X = df
 
-    categorical_cols = X.select_dtypes(include=["object", "category"]).columns.tolist()
-
-    try:
-        encoder = OneHotEncoder(drop="first", sparse_output=False, handle_unknown="ignore")
-    except TypeError:
-        encoder = OneHotEncoder(drop="first", sparse=False, handle_unknown="ignore")
-
-    ct = ColumnTransformer(
-        transformers=[("onehot", encoder, categorical_cols)],
-        remainder="passthrough"
-    )
-
-    transformed = ct.fit_transform(X)
-
-    try:
-        feature_names = encoder.get_feature_names_out(categorical_cols)
-    except:
-        feature_names = [
-            f"{col}_{i}"
-            for col in categorical_cols
-            for i in range(len(X[col].unique()) - 1)
-        ]
+    X = X.reset_index(drop=True)
+    if fitted is None:
+        categorical_cols = X.select_dtypes(include=["object", "category"]).columns.tolist()
+        numeric_cols = [col for col in X.columns if col not in categorical_cols]
 
-    numeric_cols = [col for col in X.columns if col not in categorical_cols]
-    final_columns = list(feature_names) + numeric_cols
+        encoder, feature_names = None, []
+        if categorical_cols:
+            if hash_features:
+                encoder, feature_names = hash_categorical(hash_features)
+            else:
+                encoder, feature_names = encode_categorical(X, categorical_cols, max_categories, min_frequency)
 
-    df_encoded = pd.DataFrame(transformed, columns=final_columns)
+        fitted = EncodingTransform(categorical_cols, numeric_cols, encoder, feature_names)
+    df_encoded = fitted.transform(X)
 
     encoder_file_bytes = None
     if y is not None:
@@ -55,7 +62,7 @@ def one_hot_encode_text(csv_text: str, target_variable: str | None):
             buf.seek(0)
             encoder_file_bytes = buf.read()
 
-        df_encoded[target_variable] = y
+        df_encoded[target_variable] = np.asarray(y)
 
     preview = []
 
@@ -67,4 +74,4 @@ def one_hot_encode_text(csv_text: str, target_variable: str | None):
             for val in row.values
         ])
 
-    return df_encoded, preview, encoder_file_bytes
+    return df_encoded, preview, encoder_file_bytes, fitted
@@ -0,0 +1,109 @@
+# imputation.py
+import os
+import time
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.experimental import enable_iterative_imputer  # noqa: F401
+from sklearn.impute import IterativeImputer, KNNImputer
+from preprocessing.scale_features import is_continuous_dtype
+
+# Fill values for every column come from two vectorized passes, one over
+# the numeric block and one over the categorical block. The model-based
+# strategies then refit the numeric columns with gaps in blocks of
+# IMPUTE_BLOCK_COLUMNS, in parallel, each worker fitting and imputing its
+# block; blocks that haven't started when the time budget runs out keep
+# their mean fills. Every block also sees up to IMPUTE_PREDICTOR_COLUMNS
+# complete numeric columns, a column with gaps has nothing to go on alone.
+IMPUTE_WORKERS = int(os.getenv("IMPUTE_WORKERS", str(os.cpu_count() or 1)))
+IMPUTE_BLOCK_COLUMNS = int(os.getenv("IMPUTE_BLOCK_COLUMNS", "32"))
+IMPUTE_PREDICTOR_COLUMNS = int(os.getenv("IMPUTE_PREDICTOR_COLUMNS", "32"))
+IMPUTE_TIME_BUDGET_SECONDS = float(os.getenv("IMPUTE_TIME_BUDGET_SECONDS", "60"))
+# KNN transform cost grows with the rows it was fitted on
+IMPUTE_FIT_ROWS = int(os.getenv("IMPUTE_FIT_ROWS", "5000"))
+KNN_NEIGHBORS = 5
+
+STRATEGIES = ("simple", "knn", "iterative")
+
+
+def numeric_fills(X: pd.DataFrame, cols: list) -> dict:
+    # column means in one pass, NaNs skipped like SimpleImputer(mean)
+    if not cols:
+        return {}
+    return X[cols].mean().to_dict()
+
+
+def categorical_fills(X: pd.DataFrame, cols: list) -> dict:
+    # most frequent value, ties go to the smallest like SimpleImputer
+    if not cols:
+        return {}
+    modes = X[cols].mode(dropna=True)
+    return {col: modes[col].iloc[0] for col in cols if len(modes) and pd.notna(modes[col].iloc[0])}
+
+
+def column_blocks(cols: list, size: int) -> list:
+    return [cols[i:i + size] for i in range(0, len(cols), size)]
+
+
+def make_imputer(strategy: str):
+    if strategy == "knn":
+        return KNNImputer(n_neighbors=KNN_NEIGHBORS)
+    return IterativeImputer(max_iter=10, random_state=42)
+
+
+def fit_block(strategy: str, block: pd.DataFrame, imputed: int, deadline: float):
+    # (imputer, the first imputed columns of the block) or None once the
+    # deadline has passed; it's wall-clock time, so it holds in worker
+    # processes too
+    if time.time() >= deadline:
+        return None
+    sample = block if len(block) <= IMPUTE_FIT_ROWS else block.sample(IMPUTE_FIT_ROWS, random_state=42)
+    imputer = make_imputer(strategy).fit(sample)
+    return imputer, imputer.transform(block)[:, :imputed]
+
+
+def fit_model_imputers(X: pd.DataFrame, cols: list, predictors: list, strategy: str, time_budget: float):
+    # [(block columns, fitted imputer)] for the blocks that started in time,
+    # and their columns of X already imputed; the imputers take the block
+    # followed by the predictors (their feature_names_in_)
+    blocks = column_blocks(cols, IMPUTE_BLOCK_COLUMNS)
+    deadline = time.time() + time_budget
+    results = Parallel(n_jobs=min(IMPUTE_WORKERS, len(blocks)))(
+        delayed(fit_block)(strategy, X[block + predictors], len(block), deadline) for block in blocks
+    )
+
+    imputers, parts = [], []
+    for block, result in zip(blocks, results):
+        if result is not None:
+            imputers.append((block, result[0]))
+            parts.append(pd.DataFrame(result[1], columns=block, index=X.index).astype(X[block].dtypes.to_dict()))
+    return imputers, pd.concat(parts, axis=1) if parts else None
+
+
+def fit_imputation(X: pd.DataFrame, missing_cols: list, strategy: str = "simple",
+                   time_budget: float = IMPUTE_TIME_BUDGET_SECONDS):
+    # returns (fills, imputers, imputed): a fill value for every numeric
+    # column and every categorical column with gaps, fitted model imputers,
+    # and the columns those imputers already filled in X (or None)
+    numeric = [col for col in X.columns if is_continuous_dtype(X[col].dtype)]
+    numeric_set = set(numeric)
+    missing_set = set(missing_cols)
+    # sparse and bool columns take the mean too, as before
+    other_numeric = [
+        col for col in missing_cols
+        if col not in numeric_set and pd.api.types.is_numeric_dtype(X[col].dtype)
+    ]
+    categorical = [col for col in missing_cols if col not in numeric_set and col not in other_numeric]
+
+    fills = numeric_fills(X, numeric)
+    for col in other_numeric:
+        fills[col] = X[col].mean()
+    fills.update(categorical_fills(X, categorical))
+
+    imputers, imputed = [], None
+    if strategy != "simple":
+        gaps = [col for col in numeric if col in missing_set]
+        if gaps:
+            predictors = [col for col in numeric if col not in missing_set][:IMPUTE_PREDICTOR_COLUMNS]
+            imputers, imputed = fit_model_imputers(X, gaps, predictors, strategy, time_budget)
+
+    return fills, imputers, imputed
@@ -1,12 +1,31 @@
 # missing_Values.py
 import pandas as pd
+from pandas.api.types import is_numeric_dtype
 from sklearn.impute import SimpleImputer
-from io import StringIO
-
-def check_missing_values(csv_text: str) -> dict:
-    df = pd.read_csv(StringIO(csv_text))
-
-    missing = df.isnull().sum()
+from preprocessing.scale_features import is_continuous_dtype
+from preprocessing.imputation import STRATEGIES, IMPUTE_TIME_BUDGET_SECONDS, fit_imputation
+from preprocessing.transformers import MissingValueTransform
+
+def missing_counts(df: pd.DataFrame) -> pd.Series:
+    # sparse columns only store their non-fill values, count NaNs among those
+    # instead of materializing a full boolean mask per column; dense columns
+    # are counted in one pass
+    sparse = [col for col, dtype in df.dtypes.items() if isinstance(dtype, pd.SparseDtype)]
+    counts = {}
+    for col in sparse:
+        values = df[col].array
+        counts[col] = int(pd.isna(values.sp_values).sum())
+        if pd.isna(values.fill_value):
+            counts[col] += len(values) - values.sp_index.npoints
+
+    if len(sparse) < df.shape[1]:
+        dense = df.drop(columns=sparse) if sparse else df
+        counts.update(dense.isna().sum().items())
+    return pd.Series(counts, dtype="int64").reindex(df.columns)
+
+
+def check_missing_values(df: pd.DataFrame) -> dict:
+    missing = missing_counts(df)
 
     table = []
 
@@ -23,42 +42,52 @@ def check_missing_values(csv_text: str) -> dict:
 
 
 
-def handle_missing_values(csv_text: str, target_variable: str, task: str):
-    df = pd.read_csv(StringIO(csv_text))
-
+def handle_missing_values(df: pd.DataFrame, target_variable: str, task: str,
+                          strategy: str = "simple", time_budget: float = IMPUTE_TIME_BUDGET_SECONDS,
+                          fitted: MissingValueTransform | None = None):
+    # fitted replays an earlier fit instead of fitting again
     if target_variable not in df.columns:
         return {"error": f"Target variable '{target_variable}' not found"}
+    if strategy not in STRATEGIES:
+        return {"error": f"Unknown imputation strategy '{strategy}'"}
 
     changes = []
 
     X = df.drop(columns=[target_variable])
     y = df[target_variable]
 
-    for col in X.columns:
-        missing = X[col].isnull().sum()
-        if missing == 0:
-            continue
+    missing_by_col = missing_counts(X)
+    missing_pct = missing_by_col[missing_by_col > 0] / len(X) * 100
+    dropped = missing_pct.index[missing_pct > 50].tolist()
+    imputed = missing_pct.index[missing_pct <= 50].tolist()
 
-        missing_pct = (missing / len(X)) * 100
+    for col, pct in missing_pct.items():
+        if pct > 50:
+            changes.append(f"Dropped '{col}' (> {pct:.2f}%)")
+        else:
+            changes.append(f"Imputed '{col}' ({pct:.2f}%)")
 
-        if missing_pct > 50:
-            X.drop(columns=[col], inplace=True)
-            changes.append(f"Dropped '{col}' (> {missing_pct:.2f}%)")
-            continue
+    model_imputed = None
+    if fitted is None:
+        fills, imputers, model_imputed = fit_imputation(X.drop(columns=dropped), imputed, strategy, time_budget)
+        fitted = MissingValueTransform(dropped, fills, imputed, imputers, strategy)
 
-        if X[col].dtype in ["int64", "float64"]:
-            imputer = SimpleImputer(strategy="mean")
-        else:
-            imputer = SimpleImputer(strategy="most_frequent")
+        if strategy != "simple":
+            modelled = sum(len(cols) for cols, _ in imputers)
+            numeric_gaps = [col for col in imputed if is_continuous_dtype(X[col].dtype)]
+            if modelled < len(numeric_gaps):
+                changes.append(
+                    f"Used column means for {len(numeric_gaps) - modelled} of {len(numeric_gaps)} "
+                    f"numeric columns, the {strategy} time budget ran out"
+                )
 
-        X[col] = imputer.fit_transform(X[[col]])
-        changes.append(f"Imputed '{col}' ({missing_pct:.2f}%)")
+    X = fitted.transform(X, model_imputed)
 
     y_missing = y.isnull().sum()
 
     if y_missing > 0:
         if task == "regression":
-            if y.dtype in ["int64", "float64"]:
+            if is_numeric_dtype(y.dtype):
                 imputer = SimpleImputer(strategy="mean")
                 y = imputer.fit_transform(y.values.reshape(-1, 1)).flatten()
                 changes.append(f"Imputed numeric target '{target_variable}' ({y_missing})")
@@ -85,4 +114,4 @@ def handle_missing_values(csv_text: str, target_variable: str, task: str):
             for val in row.values
         ])
 
-    return processed_df, preview, changes
+    return processed_df, preview, changes, fitted
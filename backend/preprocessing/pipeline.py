@@ -0,0 +1,234 @@
+# pipeline.py
+import hashlib
+import json
+from preprocessing.missing_Values import handle_missing_values
+from preprocessing.imputation import IMPUTE_TIME_BUDGET_SECONDS
+from preprocessing.encoding import one_hot_encode_text
+from preprocessing.scale_features import scale_features_from_text
+from preprocessing.process_Dataset import summarize_dataset
+from preprocessing.transformers import TransformChain, dump_transform, load_transform
+from storage.columnar import read_dataframe, write_dataframe
+from storage.frame_cache import frame_cache
+from storage.schema import downcast, file_schema, infer_schema
+from storage.versions import version_entry
+from telemetry import span
+
+# A dataset's pending preprocessing is a plan on its document:
+#   {"base_file_id": <last stored version>,
+#    "steps": [{"op": ..., "params": {...}, "transform_file_id": <fitted step>}]}
+# Steps still have to be fitted on the full data, but their outputs stay in
+# the frame cache instead of being written to GridFS. The plan is written
+# out once, in a single pass, when training needs a stored version, together
+# with the chain of fitted transforms that leads from the upload to it.
+
+
+# each step takes the fitted transform of an earlier run when there is one,
+# so a replayed plan reproduces the stored chain even for fits that aren't
+# deterministic (the time budget of the model-based imputers)
+def run_missing(df, params, fitted=None):
+    result = handle_missing_values(
+        df, params["target_variable"], params["task"],
+        strategy=params.get("strategy", "simple"),
+        time_budget=params.get("time_budget", IMPUTE_TIME_BUDGET_SECONDS),
+        fitted=fitted,
+    )
+    if isinstance(result, dict):
+        raise ValueError(result["error"])
+
+    processed_df, preview, changes, fitted = result
+    return processed_df, preview, {"changes": changes, "transform": fitted}
+
+
+def run_encoding(df, params, fitted=None):
+    processed_df, preview, encoder_file_bytes, fitted = one_hot_encode_text(
+        df,
+        params["target_variable"],
+        max_categories=params.get("max_categories"),
+        min_frequency=params.get("min_frequency"),
+        hash_features=params.get("hash_features"),
+        fitted=fitted,
+    )
+    return processed_df, preview, {"encoder_file_bytes": encoder_file_bytes, "transform": fitted}
+
+
+def run_scaling(df, params, fitted=None):
+    df_scaled, preview, message, fitted = scale_features_from_text(
+        df, params["method"], params["target_variable"], fitted=fitted
+    )
+    return df_scaled, preview, {"message": message, "transform": fitted}
+
+
+STEPS = {
+    "missing": run_missing,
+    "encoding": run_encoding,
+    "scaling": run_scaling,
+}
+
+
+def apply_step(df, step: dict, fitted=None):
+    with span(f"transform_{step['op']}", rows=len(df), columns=df.shape[1]) as s:
+        processed_df, preview, extra = STEPS[step["op"]](df, step["params"], fitted)
+        s.set(rows_out=len(processed_df), columns_out=processed_df.shape[1])
+    return processed_df, preview, extra
+
+
+def step_specs(steps: list) -> list:
+    # what a step does, without the file ids of its fitted state
+    return [{"op": step["op"], "params": step["params"]} for step in steps]
+
+
+def plan_key(base_file_id, steps: list):
+    digest = hashlib.sha1(json.dumps(step_specs(steps), sort_keys=True).encode("utf-8")).hexdigest()
+    return ("plan", str(base_file_id), digest)
+
+
+def current_plan(doc) -> dict:
+    return doc.get("pipeline") or {"base_file_id": doc["latest_version_file_id"], "steps": []}
+
+
+def version_key(plan: dict) -> str:
+    _, base, digest = plan_key(plan["base_file_id"], plan["steps"])
+    return f"{base}:{digest}"
+
+
+def summary_for(plan: dict, df) -> dict:
+    with span("summarize", rows=len(df), columns=df.shape[1]):
+        return {"version": version_key(plan), **summarize_dataset(df)}
+
+
+def replay(fs, base_file_id, steps: list):
+    # resume from the longest prefix of the plan that is still cached
+    df = None
+    start = 0
+    for i in range(len(steps) - 1, 0, -1):
+        df = frame_cache.get(plan_key(base_file_id, steps[:i]))
+        if df is not None:
+            start = i
+            break
+
+    if df is None:
+        df = read_dataframe(fs, base_file_id)
+
+    for step in steps[start:]:
+        fitted = load_transform(fs, step["transform_file_id"]) if step.get("transform_file_id") else None
+        df, _, _ = apply_step(df, step, fitted)
+
+    return df
+
+
+def resolve_frame(fs, plan: dict):
+    if not plan["steps"]:
+        return read_dataframe(fs, plan["base_file_id"])
+
+    key = plan_key(plan["base_file_id"], plan["steps"])
+    return frame_cache.get_or_load(key, lambda: replay(fs, plan["base_file_id"], plan["steps"]))
+
+
+def extend_plan(plan: dict, op: str, params: dict) -> dict:
+    step = {"op": op, "params": params}
+    return {"base_file_id": plan["base_file_id"], "steps": plan["steps"] + [step]}
+
+
+def fit_step(df, plan: dict):
+    # pure CPU work for the newest step of plan, safe to run in a worker
+    processed_df, preview, extra = apply_step(df, plan["steps"][-1])
+    return processed_df, preview, extra, summary_for(plan, processed_df)
+
+
+def cache_plan_output(plan: dict, df):
+    frame_cache.put(plan_key(plan["base_file_id"], plan["steps"]), df)
+
+
+def get_summary(datasets, fs, doc) -> dict:
+    # statistics are stored when a version is written, older documents are
+    # backfilled here the first time they are asked for
+    plan = current_plan(doc)
+    summary = doc.get("summary")
+    if summary and summary.get("version") == version_key(plan):
+        return summary
+
+    summary = summary_for(plan, resolve_frame(fs, plan))
+    datasets.update_one({"_id": doc["_id"]}, {"$set": {"summary": summary}})
+    return summary
+
+
+def step_transform_ids(plan: dict) -> list:
+    return [step["transform_file_id"] for step in plan["steps"] if step.get("transform_file_id")]
+
+
+def base_chain(fs, doc, plan: dict):
+    # the chain that produced the plan's base version, None for versions
+    # written before transforms were kept
+    if doc.get("transform_file_id"):
+        return load_transform(fs, doc["transform_file_id"])
+    if plan["base_file_id"] == doc.get("original_file_id"):
+        schema = file_schema(fs.get(plan["base_file_id"]))
+        return TransformChain(schema or infer_schema(read_dataframe(fs, plan["base_file_id"])))
+    return None
+
+
+def build_chain(fs, doc, plan: dict, columns: list):
+    chain = base_chain(fs, doc, plan)
+    if chain is None or len(step_transform_ids(plan)) != len(plan["steps"]):
+        return None
+
+    with span("build_transform_chain", steps=len(plan["steps"])):
+        steps = [load_transform(fs, file_id) for file_id in step_transform_ids(plan)]
+        targets = [step["params"].get("target_variable") for step in plan["steps"]]
+        return chain.extend(steps, targets, columns)
+
+
+def materialize(datasets, blob_store, fs, doc):
+    # write the pending plan out as one stored version
+    plan = current_plan(doc)
+    df, schema, memory = downcast(resolve_frame(fs, plan))
+    new_file_id = write_dataframe(
+        blob_store, df, filename=f"{doc['name']}_processed", schema=schema, memory=memory
+    )
+    new_plan = {"base_file_id": new_file_id, "steps": []}
+    # the history entry holds a reference of its own
+    blob_store.retain(new_file_id)
+
+    chain = build_chain(fs, doc, plan, list(df.columns))
+    chain_file_id = None
+    if chain is not None:
+        chain_file_id = blob_store.put(dump_transform(chain), filename=f"{doc['name']}_transform.pkl")
+        blob_store.retain(chain_file_id)
+
+    update = {
+        "latest_version_file_id": new_file_id,
+        "pipeline": new_plan,
+        "transform_file_id": chain_file_id,
+    }
+    summary = doc.get("summary")
+    if summary and summary.get("version") == version_key(plan):
+        # same content under a new version key
+        update["summary.version"] = version_key(new_plan)
+
+    entry = version_entry(new_file_id, "preprocessing", step_specs(plan["steps"]), chain_file_id)
+    result = datasets.update_one(
+        {"_id": doc["_id"], "pipeline": doc["pipeline"]},
+        {"$set": update, "$push": {"versions": entry}}
+    )
+
+    if result.matched_count:
+        blob_store.release(plan["base_file_id"])
+        blob_store.release(doc.get("transform_file_id"))
+        for file_id in step_transform_ids(plan):
+            blob_store.release(file_id)
+    else:
+        # plan changed underneath us, the other writer owns the document now
+        for file_id in (new_file_id, chain_file_id):
+            blob_store.release(file_id)
+            blob_store.release(file_id)
+
+    return df
+
+
+def load_latest(datasets, blob_store, fs, doc, columns: list | None = None):
+    plan = current_plan(doc)
+    if not plan["steps"]:
+        return read_dataframe(fs, plan["base_file_id"], columns=columns)
+
+    df = materialize(datasets, blob_store, fs, doc)
+    return df if columns is None else df[list(columns)]
@@ -1,12 +1,13 @@
 # # process_Dataset.py
 import pandas as pd
 import json
+from preprocessing.missing_Values import check_missing_values
 
-def process_dataset(csv_text: str) -> dict:
-    from io import StringIO
-    df = pd.read_csv(StringIO(csv_text))
-
-    describe_df = df.describe()
+def process_dataset(df: pd.DataFrame) -> dict:
+    # one-hot indicator columns are left out, pandas can't describe sparse
+    # columns and a 0/1 column per category would swamp the table anyway
+    dense_cols = [col for col, dtype in df.dtypes.items() if not isinstance(dtype, pd.SparseDtype)]
+    describe_df = df[dense_cols].describe()
     table = []
 
     header = ["Statistic"] + list(describe_df.columns)
@@ -18,3 +19,10 @@ def process_dataset(csv_text: str) -> dict:
     return {
         "statistics": table
     }
+
+
+def summarize_dataset(df: pd.DataFrame) -> dict:
+    return {
+        "statistics": process_dataset(df)["statistics"],
+        "missing_values": check_missing_values(df)["missing_values"],
+    }
@@ -1,21 +1,32 @@
 import numpy as np
-from io import StringIO
 from sklearn.preprocessing import StandardScaler, MinMaxScaler
-from sklearn.compose import ColumnTransformer
 import pandas as pd
+from pandas.api.types import is_numeric_dtype, is_bool_dtype
+from preprocessing.transformers import ScalingTransform
+
+def is_continuous_dtype(dtype) -> bool:
+    # any width of int/float, downcast versions are int8..int32 / float32
+    return (
+        is_numeric_dtype(dtype)
+        and not is_bool_dtype(dtype)
+        and not isinstance(dtype, pd.SparseDtype)
+    )
 
-def scale_features_from_text(csv_text: str, method="standard", target_variable=None):
-    df = pd.read_csv(StringIO(csv_text))
+def scale_features_from_text(df: pd.DataFrame, method="standard", target_variable=None,
+                             fitted: ScalingTransform | None = None):
 
     y = None
     if target_variable and target_variable in df.columns:
         y = df[target_variable]
         df = df.drop(columns=[target_variable])
 
-    continuous_cols = [
-        col for col in df.columns
-        if df[col].dtype in ['int64', 'float64'] and df[col].nunique() > 10
-    ]
+    if fitted is not None:
+        continuous_cols = fitted.continuous_cols
+    else:
+        continuous_cols = [
+            col for col in df.columns
+            if is_continuous_dtype(df[col].dtype) and df[col].nunique() > 10
+        ]
 
     if len(continuous_cols) == 0:
         preview = [list(df.columns)]
@@ -24,24 +35,15 @@ def scale_features_from_text(csv_text: str, method="standard", target_variable=N
                 v.item() if hasattr(v, "item") else v
                 for v in row.values
             ])
-        return df, preview, "No continuous numeric columns to scale."
-
-    scaler = MinMaxScaler() if method == "minmax" else StandardScaler()
-
-    ct = ColumnTransformer(
-        transformers=[("scaler", scaler, continuous_cols)],
-        remainder="passthrough"
-    )
-
-    scaled = ct.fit_transform(df)
-
-    remaining_cols = [c for c in df.columns if c not in continuous_cols]
-    new_cols = continuous_cols + remaining_cols
+        return df, preview, "No continuous numeric columns to scale.", ScalingTransform([], None)
 
-    df_scaled = pd.DataFrame(scaled, columns=new_cols)
+    if fitted is None:
+        scaler = MinMaxScaler() if method == "minmax" else StandardScaler()
+        fitted = ScalingTransform(continuous_cols, scaler.fit(df[continuous_cols]))
+    df_scaled = fitted.transform(df)
 
     if y is not None:
-        df_scaled[target_variable] = y
+        df_scaled[target_variable] = np.asarray(y)
 
     preview = [list(df_scaled.columns)]
     for _, row in df_scaled.head(20).iterrows():
@@ -52,4 +54,4 @@ def scale_features_from_text(csv_text: str, method="standard", target_variable=N
 
     msg = "Scaling applied using MinMaxScaler." if method == "minmax" else "Scaling applied using StandardScaler."
 
-    return df_scaled, preview, msg
+    return df_scaled, preview, msg, fitted
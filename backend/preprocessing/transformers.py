@@ -0,0 +1,237 @@
+# transformers.py
+import io
+import joblib
+import numpy as np
+import pandas as pd
+
+# Fitted state of each preprocessing step. The step functions fit one of
+# these and run their own data through transform(), so new data goes
+# through exactly the same code. A stored version keeps the whole chain
+# from the raw upload to its columns as one artifact.
+
+CHAIN_COMPRESS = 3
+
+
+def apply_fills(X: pd.DataFrame, fills: dict) -> pd.DataFrame:
+    # dense float columns are filled per dtype block in one numpy pass, the
+    # rest (categories, objects, sparse) through a single fillna
+    by_dtype = {}
+    rest = {}
+    for col, value in fills.items():
+        if col not in X.columns:
+            continue
+        dtype = X[col].dtype
+        if pd.api.types.is_float_dtype(dtype) and not isinstance(dtype, pd.SparseDtype):
+            by_dtype.setdefault(dtype, []).append(col)
+        elif not pd.api.types.is_integer_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+            # integer and bool columns can't hold NaN, nothing to fill
+            rest[col] = value
+
+    for dtype, cols in by_dtype.items():
+        values = X[cols].to_numpy(dtype=dtype)
+        gaps = np.isnan(values)
+        if not gaps.any():
+            continue
+        fill_row = np.array([fills[col] for col in cols], dtype=dtype)
+        values = np.where(gaps, fill_row, values)
+        X[cols] = pd.DataFrame(values, columns=cols, index=X.index)
+
+    if rest:
+        # new data is read with categorical columns as category, a chunk
+        # that never has the fill value can't take it until it's added
+        for col, value in rest.items():
+            dtype = X[col].dtype
+            if isinstance(dtype, pd.CategoricalDtype) and value not in dtype.categories:
+                X[col] = X[col].cat.add_categories([value])
+        X = X.fillna(rest)
+    return X
+
+
+def apply_imputers(X: pd.DataFrame, imputers: list) -> pd.DataFrame:
+    for cols, imputer in imputers:
+        block = X[cols]
+        if not block.isna().to_numpy().any():
+            continue
+        dtypes = block.dtypes
+        # the imputed columns come first among the imputer's inputs
+        inputs = list(getattr(imputer, "feature_names_in_", cols))
+        filled = pd.DataFrame(imputer.transform(X[inputs])[:, :len(cols)], columns=cols, index=X.index)
+        X[cols] = filled.astype(dtypes.to_dict())
+    return X
+
+
+class MissingValueTransform:
+    op = "missing"
+    # chains pickled before model imputers existed
+    imputers = ()
+    strategy = "simple"
+
+    def __init__(self, dropped: list, fills: dict, imputed: list, imputers: list | None = None,
+                 strategy: str = "simple"):
+        self.dropped = dropped
+        # every numeric column has a fill value, not just the imputed ones,
+        # new data can have gaps where the training data had none
+        self.fills = fills
+        self.imputed = imputed
+        # [(columns, fitted KNN/iterative imputer)], applied before the fills
+        self.imputers = imputers or []
+        self.strategy = strategy
+
+    def transform(self, X: pd.DataFrame, imputed: pd.DataFrame | None = None) -> pd.DataFrame:
+        # imputed: the imputers' output for X, when fitting produced it already
+        X = X.drop(columns=[col for col in self.dropped if col in X.columns])
+        if imputed is not None:
+            X[list(imputed.columns)] = imputed
+        else:
+            X = apply_imputers(X, self.imputers)
+        return apply_fills(X, self.fills)
+
+    def describe(self) -> dict:
+        return {
+            "op": self.op,
+            "strategy": self.strategy,
+            "dropped": self.dropped,
+            "imputed": self.imputed,
+            "model_imputed": [col for cols, _ in self.imputers for col in cols],
+        }
+
+
+class EncodingTransform:
+    op = "encoding"
+
+    def __init__(self, categorical_cols: list, numeric_cols: list, encoder, feature_names: list):
+        self.categorical_cols = categorical_cols
+        self.numeric_cols = numeric_cols
+        # a fitted OneHotEncoder, or a FeatureHasher (nothing to fit)
+        self.encoder = encoder
+        self.feature_names = feature_names
+
+    def encode(self, X: pd.DataFrame):
+        if hasattr(self.encoder, "categories_"):
+            return self.encoder.transform(X[self.categorical_cols])
+        tokens = (
+            [f"{col}={val}" for col, val in zip(self.categorical_cols, row)]
+            for row in X[self.categorical_cols].itertuples(index=False, name=None)
+        )
+        return self.encoder.transform(tokens)
+
+    def transform(self, X: pd.DataFrame) -> pd.DataFrame:
+        # encoded columns stay sparse all the way into the stored version
+        # and the training matrix, numeric columns keep their dtypes
+        X = X.reset_index(drop=True)
+        parts = []
+        if self.categorical_cols:
+            matrix = self.encode(X)
+            parts.append(pd.DataFrame.sparse.from_spmatrix(matrix.tocsc(), columns=self.feature_names))
+        parts.append(X[self.numeric_cols])
+        return pd.concat(parts, axis=1)
+
+    def describe(self) -> dict:
+        return {
+            "op": self.op,
+            "categorical": self.categorical_cols,
+            "encoded_columns": len(self.feature_names),
+            "hashed": not hasattr(self.encoder, "categories_"),
+        }
+
+
+class ScalingTransform:
+    op = "scaling"
+
+    def __init__(self, continuous_cols: list, scaler):
+        self.continuous_cols = continuous_cols
+        self.scaler = scaler
+
+    def transform(self, X: pd.DataFrame) -> pd.DataFrame:
+        if not self.continuous_cols:
+            return X
+
+        # only the scaled block is rebuilt, the remaining columns (including
+        # sparse one-hot columns) are carried over untouched
+        scaled = pd.DataFrame(
+            self.scaler.transform(X[self.continuous_cols]),
+            columns=self.continuous_cols,
+            index=X.index,
+        )
+        remaining_cols = [c for c in X.columns if c not in self.continuous_cols]
+        return pd.concat([scaled, X[remaining_cols]], axis=1).reset_index(drop=True)
+
+    def describe(self) -> dict:
+        return {"op": self.op, "scaler": type(self.scaler).__name__, "scaled": self.continuous_cols}
+
+
+class TransformChain:
+    # raw upload columns -> a stored version's feature columns
+    def __init__(self, input_schema: dict | None, targets: list | None = None, steps: list | None = None,
+                 output_columns: list | None = None):
+        self.input_schema = input_schema
+        self.targets = targets or []
+        self.steps = steps or []
+        self.output_columns = output_columns
+
+    def extend(self, steps: list, targets: list, output_columns: list) -> "TransformChain":
+        return TransformChain(
+            self.input_schema,
+            self.targets + [t for t in targets if t and t not in self.targets],
+            self.steps + steps,
+            output_columns,
+        )
+
+    def input_columns(self) -> list | None:
+        if self.input_schema is None:
+            return None
+        return [col for col in self.input_schema if col not in self.targets]
+
+    def csv_dtypes(self) -> dict | None:
+        # the upload's dtypes for reading new data, except integer and bool
+        # columns, which can't hold the gaps new data may have
+        if self.input_schema is None:
+            return None
+        return {
+            col: dtype for col, dtype in self.input_schema.items()
+            if col not in self.targets and (dtype == "category" or dtype.startswith("float"))
+        }
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        # targets are not part of scoring data, they're dropped if present
+        df = df.drop(columns=[col for col in self.targets if col in df.columns])
+
+        missing = [col for col in self.input_columns() or [] if col not in df.columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+        for step in self.steps:
+            df = step.transform(df)
+
+        if self.output_columns is not None:
+            df = df[[col for col in self.output_columns if col not in self.targets]]
+        return df
+
+    def describe(self) -> dict:
+        return {
+            "input_columns": self.input_columns(),
+            "targets": self.targets,
+            "output_columns": (
+                None if self.output_columns is None
+                else [col for col in self.output_columns if col not in self.targets]
+            ),
+            "steps": [step.describe() for step in self.steps],
+        }
+
+
+def dump_transform(obj) -> bytes:
+    buffer = io.BytesIO()
+    joblib.dump(obj, buffer, compress=CHAIN_COMPRESS)
+    return buffer.getvalue()
+
+
+def load_transform(fs, file_id):
+    return joblib.load(io.BytesIO(fs.get(file_id).read()))
+
+
+def chunk_to_csv(df: pd.DataFrame, header: bool) -> bytes:
+    # sparse one-hot columns are written out dense, one chunk at a time
+    sparse_cols = [col for col, dtype in df.dtypes.items() if isinstance(dtype, pd.SparseDtype)]
+    if sparse_cols:
+        df = df.astype({col: df[col].dtype.subtype for col in sparse_cols})
+    return df.to_csv(index=False, header=header).encode("utf-8")
@@ -0,0 +1,128 @@
+# blobs.py
+import hashlib
+import io
+from datetime import datetime, timezone
+from pymongo import ReturnDocument
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobWriter:
+    # GridIn look-alike that hashes what it writes, so streamed uploads
+    # are deduplicated once the content hash is known
+    def __init__(self, store, grid_in):
+        self.store = store
+        self.grid_in = grid_in
+        self.digest = hashlib.sha256()
+        self.length = 0
+        self._id = None
+
+    def write(self, data):
+        self.digest.update(data)
+        self.length += len(data)
+        self.grid_in.write(data)
+
+    def abort(self):
+        self.grid_in.abort()
+
+    def close(self):
+        self.grid_in.close()
+        self._id = self.store.register(self.digest.hexdigest(), self.grid_in._id, self.length)
+
+
+class BlobStore:
+    # content-addressed layer over GridFS: identical bytes are stored once
+    # and every pointer to a file (original, latest version, encoder) holds
+    # one reference. Files written before this layer have no blob record,
+    # retain/release ignore them and leave them to compaction. touched_at
+    # marks the last new reference, the compactor leaves recent blobs alone
+    # because the pointer to them may not be written yet.
+    def __init__(self, db, fs):
+        self.fs = fs
+        self.files = db["fs.files"]
+        self.blobs = db["blobs"]
+
+    def ensure_indexes(self):
+        self.blobs.create_index("file_id", unique=True)
+
+    def register(self, digest: str, file_id, length: int):
+        blob = self.blobs.find_one_and_update(
+            {"_id": digest},
+            {
+                "$inc": {"refcount": 1},
+                "$set": {"touched_at": datetime.now(timezone.utc)},
+                "$setOnInsert": {
+                    "file_id": file_id,
+                    "length": length,
+                    "created_at": datetime.now(timezone.utc),
+                },
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+        if blob["file_id"] != file_id:
+            # same content was already stored, drop the copy we just wrote
+            self.fs.delete(file_id)
+
+        return blob["file_id"]
+
+    def new_file(self, **kwargs) -> BlobWriter:
+        return BlobWriter(self, self.fs.new_file(**kwargs))
+
+    def put(self, data, **kwargs):
+        if hasattr(data, "read"):
+            writer = self.new_file(**kwargs)
+            while True:
+                chunk = data.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+            writer.close()
+            return writer._id
+
+        digest = hashlib.sha256(data).hexdigest()
+        existing = self.blobs.find_one_and_update(
+            {"_id": digest},
+            {"$inc": {"refcount": 1}, "$set": {"touched_at": datetime.now(timezone.utc)}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if existing is not None:
+            return existing["file_id"]
+
+        file_id = self.fs.put(io.BytesIO(data), **kwargs)
+        return self.register(digest, file_id, len(data))
+
+    def annotate(self, file_id, **fields):
+        # metadata derived from the content (schema, sizes), so it holds for
+        # every pointer that shares the blob
+        self.files.update_one(
+            {"_id": file_id},
+            {"$set": {f"metadata.{key}": value for key, value in fields.items()}},
+        )
+
+    def retain(self, file_id) -> bool:
+        return self.blobs.update_one(
+            {"file_id": file_id},
+            {"$inc": {"refcount": 1}, "$set": {"touched_at": datetime.now(timezone.utc)}},
+        ).matched_count > 0
+
+    def release(self, file_id) -> bool:
+        if file_id is None:
+            return False
+
+        blob = self.blobs.find_one_and_update(
+            {"file_id": file_id},
+            {"$inc": {"refcount": -1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if blob is None:
+            return False
+
+        if blob["refcount"] <= 0:
+            # a concurrent retain bumps the count back up and keeps the file
+            deleted = self.blobs.delete_one({"_id": blob["_id"], "refcount": {"$lte": 0}})
+            if deleted.deleted_count:
+                self.fs.delete(file_id)
+
+        return True
@@ -0,0 +1,221 @@
+# columnar.py
+import io
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import pyarrow as pa
+import pyarrow.feather as feather
+from storage.frame_cache import frame_cache
+from storage.schema import downcast, read_dtypes, file_schema
+from telemetry import TimedReader, record_span, span
+
+ARROW_FORMAT = "arrow"
+CSV_FORMAT = "csv"
+SPARSE_FORMAT = "sparse"
+
+# rows per record batch, keeps column projection and chunked reads cheap
+ARROW_CHUNK_ROWS = 65536
+
+
+def dataframe_to_csv_bytes(df: pd.DataFrame) -> bytes:
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue().encode("utf-8")
+
+
+def dataframe_to_arrow_buffer(df: pd.DataFrame) -> pa.Buffer:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    feather.write_feather(table, sink, compression="lz4", chunksize=ARROW_CHUNK_ROWS)
+    return sink.getvalue()
+
+
+def sparse_columns(df: pd.DataFrame) -> list:
+    return [col for col, dtype in df.dtypes.items() if isinstance(dtype, pd.SparseDtype)]
+
+
+def dataframe_to_sparse_buffer(df: pd.DataFrame) -> bytes:
+    # one .npz: the sparse columns as a single CSR matrix, the dense ones as
+    # an embedded arrow buffer, plus the column order to put them back in
+    sparse_cols = sparse_columns(df)
+    dense_cols = [col for col in df.columns if col not in set(sparse_cols)]
+    matrix = df[sparse_cols].sparse.to_coo().tocsr()
+
+    dense = b""
+    if dense_cols:
+        dense = dataframe_to_arrow_buffer(df[dense_cols]).to_pybytes()
+
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        columns=np.array(df.columns, dtype=str),
+        sparse_columns=np.array(sparse_cols, dtype=str),
+        data=matrix.data,
+        indices=matrix.indices,
+        indptr=matrix.indptr,
+        shape=np.array(matrix.shape),
+        dense=np.frombuffer(dense, dtype=np.uint8),
+    )
+    return buffer.getvalue()
+
+
+def sparse_buffer_to_dataframe(data: bytes, columns: list | None = None) -> pd.DataFrame:
+    archive = np.load(io.BytesIO(data), allow_pickle=False)
+    order = archive["columns"].tolist()
+    sparse_cols = archive["sparse_columns"].tolist()
+
+    matrix = sp.csr_matrix(
+        (archive["data"], archive["indices"], archive["indptr"]),
+        shape=tuple(archive["shape"]),
+    )
+    parts = [pd.DataFrame.sparse.from_spmatrix(matrix.tocsc(), columns=sparse_cols)]
+
+    dense = archive["dense"]
+    if len(dense):
+        parts.append(feather.read_table(pa.BufferReader(dense.tobytes())).to_pandas())
+
+    df = pd.concat(parts, axis=1)[order]
+    return df if columns is None else df[list(columns)]
+
+
+def serialize(to_bytes, fmt: str, df: pd.DataFrame):
+    with span(f"{fmt}_serialize", rows=len(df), columns=df.shape[1]) as s:
+        data = to_bytes(df)
+        s.set(bytes_written=len(data))
+    return data
+
+
+def put_version(store, data, filename: str, metadata: dict):
+    with span("gridfs_write", bytes_written=len(data)):
+        return store.put(data, filename=filename, metadata=metadata)
+
+
+def write_dataframe(store, df: pd.DataFrame, filename: str,
+                    schema: dict | None = None, memory: dict | None = None):
+    # every stored version is downcast first, its schema travels with the file
+    if schema is None:
+        df, schema, memory = downcast(df)
+
+    if sparse_columns(df):
+        data = serialize(dataframe_to_sparse_buffer, SPARSE_FORMAT, df)
+        file_id = put_version(
+            store, data,
+            filename=f"{filename}.npz",
+            metadata={"format": SPARSE_FORMAT, "schema": schema, "memory": memory},
+        )
+        frame_cache.put((str(file_id), None), df)
+        return file_id
+
+    try:
+        buffer = serialize(dataframe_to_arrow_buffer, ARROW_FORMAT, df)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        # mixed-type object columns have no arrow type, keep them as csv
+        return put_version(
+            store, serialize(dataframe_to_csv_bytes, CSV_FORMAT, df),
+            filename=f"{filename}.csv",
+            metadata={"format": CSV_FORMAT, "schema": schema, "memory": memory},
+        )
+
+    file_id = put_version(
+        store, buffer,
+        filename=f"{filename}.arrow",
+        metadata={"format": ARROW_FORMAT, "schema": schema, "memory": memory},
+    )
+
+    # arrow round-trips the frame as-is, so the next step can skip the read
+    frame_cache.put((str(file_id), None), df)
+
+    return file_id
+
+
+def file_format(grid_out) -> str:
+    metadata = grid_out.metadata or {}
+    return metadata.get("format", CSV_FORMAT)
+
+
+def read_dataframe(fs, file_id, columns: list | None = None) -> pd.DataFrame:
+    if columns is not None:
+        full = frame_cache.get((str(file_id), None))
+        if full is not None:
+            return full[list(columns)]
+
+    key = (str(file_id), tuple(columns) if columns is not None else None)
+    return frame_cache.get_or_load(key, lambda: load_dataframe(fs, file_id, columns))
+
+
+def load_dataframe(fs, file_id, columns: list | None = None) -> pd.DataFrame:
+    # GridFS reads are interleaved with parsing, the reader keeps them apart
+    grid_out = TimedReader(fs.get(file_id))
+    fmt = file_format(grid_out)
+
+    with span(f"{fmt}_parse") as s:
+        df = parse_stored(grid_out, fmt, columns)
+        s.exclude(grid_out.seconds)
+        s.set(rows=len(df), columns=df.shape[1])
+
+    record_span("gridfs_read", grid_out.seconds, bytes_read=grid_out.bytes)
+    return df
+
+
+def parse_stored(grid_out, fmt: str, columns: list | None = None) -> pd.DataFrame:
+    if fmt == SPARSE_FORMAT:
+        return sparse_buffer_to_dataframe(grid_out.read(), columns)
+
+    if fmt == ARROW_FORMAT:
+        # GridOut is seekable, so only the projected columns are fetched
+        table = feather.read_table(grid_out, columns=columns, memory_map=False)
+        # consolidated blocks are writable copies, sklearn mutates some inputs
+        return table.to_pandas()
+
+    # original uploads and versions written before the arrow format
+    dtype = read_dtypes(file_schema(grid_out), columns)
+    return pd.read_csv(grid_out, usecols=columns, dtype=dtype, encoding="utf-8")
+
+
+def iter_dataframe_chunks(fs, file_id, chunk_rows: int = ARROW_CHUNK_ROWS, columns: list | None = None):
+    # yields the stored version a slice at a time, so only one chunk is in
+    # memory no matter how many rows the file has
+    grid_out = fs.get(file_id)
+    fmt = file_format(grid_out)
+
+    if fmt == ARROW_FORMAT:
+        # record batches are read (and decompressed) one at a time
+        reader = pa.ipc.open_file(grid_out)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if columns is not None:
+                batch = batch.select(list(columns))
+            for start in range(0, batch.num_rows, chunk_rows):
+                yield batch.slice(start, chunk_rows).to_pandas()
+        return
+
+    if fmt == SPARSE_FORMAT:
+        # the npz archive has no row index, sparse versions are small enough
+        # to slice in memory
+        df = read_dataframe(fs, file_id, columns)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+        return
+
+    dtype = read_dtypes(file_schema(grid_out), columns)
+    yield from pd.read_csv(grid_out, usecols=columns, dtype=dtype, encoding="utf-8", chunksize=chunk_rows)
+
+
+def stored_columns(fs, file_id) -> list:
+    schema = file_schema(fs.get(file_id))
+    if schema:
+        return list(schema)
+    return list(next(iter_dataframe_chunks(fs, file_id, chunk_rows=1)).columns)
+
+
+def parse_dataframe(data, fmt: str, columns: list | None = None, schema: dict | None = None) -> pd.DataFrame:
+    # same as load_dataframe for bytes that were already downloaded
+    with span(f"{fmt}_parse") as s:
+        if fmt == SPARSE_FORMAT:
+            df = sparse_buffer_to_dataframe(data, columns)
+        elif fmt == ARROW_FORMAT:
+            df = feather.read_table(pa.BufferReader(data), columns=columns).to_pandas()
+        else:
+            df = pd.read_csv(io.BytesIO(data), usecols=columns, dtype=read_dtypes(schema, columns), encoding="utf-8")
+        s.set(rows=len(df), columns=df.shape[1])
+    return df
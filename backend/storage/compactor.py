@@ -0,0 +1,232 @@
+# compactor.py
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import DuplicateKeyError
+from execution import run_io
+from storage.versions import expired_versions
+
+# mark-and-sweep over GridFS: a file survives if a dataset, model or fold
+# document points at it. Refcounts already delete most superseded files the
+# moment they are released; this catches what they can't, i.e. files from
+# before the blob layer, references leaked by a crash between writing a file
+# and pointing at it, chunks of aborted uploads, and pruned history entries.
+COMPACT_INTERVAL_SECONDS = int(os.getenv("COMPACT_INTERVAL_SECONDS", "3600"))
+# files and blobs newer than this are never swept, their pointer may still
+# be on its way to the database
+COMPACT_GRACE_SECONDS = int(os.getenv("COMPACT_GRACE_SECONDS", "3600"))
+
+logger = logging.getLogger(__name__)
+
+# (collection, fields holding GridFS file ids)
+REFERENCES = (
+    ("datasets", ("original_file_id", "latest_version_file_id", "pipeline.base_file_id",
+                  "pipeline.steps.transform_file_id", "transform_file_id", "label_encoder_file_id",
+                  "versions.file_id", "versions.transform_file_id")),
+    ("models", ("file_id", "label_encoder_file_id")),
+    ("fold_indices", ("file_id",)),
+)
+
+
+def field_values(doc: dict, path: str) -> list:
+    # dotted path lookup that walks into arrays, like a mongo projection
+    values = [doc]
+    for key in path.split("."):
+        found = []
+        for value in values:
+            items = value if isinstance(value, list) else [value]
+            found += [item[key] for item in items if isinstance(item, dict) and item.get(key) is not None]
+        values = found
+    return values
+
+
+class Compactor:
+    def __init__(self, db, fs, blob_store, grace_seconds: int = COMPACT_GRACE_SECONDS):
+        self.db = db
+        self.fs = fs
+        self.blob_store = blob_store
+        self.files = db["fs.files"]
+        self.chunks = db["fs.chunks"]
+        self.locks = db["locks"]
+        self.grace = timedelta(seconds=grace_seconds)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.runs = 0
+        self.bytes_reclaimed = 0
+        self.last_report = None
+        self._task = None
+
+    def acquire(self, seconds: float) -> bool:
+        # one compactor at a time across API workers
+        now = datetime.now(timezone.utc)
+        try:
+            self.locks.update_one(
+                {"_id": "compactor", "until": {"$lt": now}},
+                {"$set": {"until": now + timedelta(seconds=seconds), "owner": self.owner}},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def release_lock(self):
+        self.locks.delete_one({"_id": "compactor", "owner": self.owner})
+
+    def prune_versions(self, now: datetime, dry_run: bool):
+        # returns (entries pruned, files deleted, bytes); a file goes right
+        # away when the entry held its last reference
+        datasets = self.db["datasets"]
+        pruned = deleted = reclaimed = 0
+        for doc in datasets.find({"versions.1": {"$exists": True}}, {"versions": 1}):
+            expired = expired_versions(doc["versions"], now)
+            if not expired:
+                continue
+            pruned += len(expired)
+            if dry_run:
+                continue
+
+            datasets.update_one(
+                {"_id": doc["_id"]},
+                {"$pull": {"versions": {"version_id": {"$in": [v["version_id"] for v in expired]}}}},
+            )
+            for entry in expired:
+                for file_id in (entry["file_id"], entry.get("transform_file_id")):
+                    if file_id is None:
+                        continue
+                    f = self.files.find_one({"_id": file_id}, {"length": 1})
+                    self.blob_store.release(file_id)
+                    if f is not None and not self.files.count_documents({"_id": file_id}, limit=1):
+                        deleted += 1
+                        reclaimed += f.get("length", 0)
+        return pruned, deleted, reclaimed
+
+    def referenced_files(self, cutoff: datetime) -> set:
+        referenced = set()
+        for name, fields in REFERENCES:
+            projection = {field: 1 for field in fields}
+            for doc in self.db[name].find({}, projection):
+                for field in fields:
+                    referenced.update(field_values(doc, field))
+
+        # a fresh reference may belong to a document that isn't written yet
+        recent = self.blob_store.blobs.find({"touched_at": {"$gte": cutoff}}, {"file_id": 1})
+        referenced.update(blob["file_id"] for blob in recent)
+        return referenced
+
+    def sweep_files(self, cutoff: datetime, referenced: set, dry_run: bool):
+        deleted = reclaimed = 0
+        for f in self.files.find({"uploadDate": {"$lt": cutoff}}, {"_id": 1, "length": 1}):
+            if f["_id"] in referenced:
+                continue
+
+            if not dry_run:
+                # only untouched blob records go, a blob that was just
+                # deduplicated into has a new pointer coming
+                blob = self.blob_store.blobs.find_one({"file_id": f["_id"]}, {"_id": 1})
+                if blob is not None:
+                    result = self.blob_store.blobs.delete_one(
+                        {"_id": blob["_id"], "touched_at": {"$not": {"$gte": cutoff}}}
+                    )
+                    if not result.deleted_count:
+                        continue
+                self.fs.delete(f["_id"])
+
+            deleted += 1
+            reclaimed += f.get("length", 0)
+        return deleted, reclaimed
+
+    def sweep_chunks(self, cutoff: datetime, dry_run: bool):
+        # chunks without a files document: uploads that died before close()
+        file_ids = {f["_id"] for f in self.files.find({}, {"_id": 1})}
+        deleted = reclaimed = 0
+        for group in self.chunks.aggregate([{"$group": {"_id": "$files_id"}}]):
+            files_id = group["_id"]
+            if files_id in file_ids:
+                continue
+            # GridIn ids are ObjectIds made when the upload started
+            started = getattr(files_id, "generation_time", None)
+            if started is None or started >= cutoff:
+                continue
+
+            for chunk in self.chunks.find({"files_id": files_id}, {"data": 1}):
+                reclaimed += len(chunk["data"])
+                deleted += 1
+            if not dry_run:
+                self.chunks.delete_many({"files_id": files_id})
+        return deleted, reclaimed
+
+    def drop_stale_blobs(self, cutoff: datetime, dry_run: bool) -> int:
+        # blob records whose file is gone would hand out dangling ids on
+        # the next put of the same content
+        file_ids = {f["_id"] for f in self.files.find({}, {"_id": 1})}
+        stale = [
+            blob["_id"]
+            for blob in self.blob_store.blobs.find({"touched_at": {"$not": {"$gte": cutoff}}}, {"file_id": 1})
+            if blob["file_id"] not in file_ids
+        ]
+        if stale and not dry_run:
+            self.blob_store.blobs.delete_many({"_id": {"$in": stale}, "touched_at": {"$not": {"$gte": cutoff}}})
+        return len(stale)
+
+    def run(self, dry_run: bool = False) -> dict:
+        if not self.acquire(max(COMPACT_INTERVAL_SECONDS, 600)):
+            return {"skipped": "another compactor is running"}
+
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        cutoff = now - self.grace
+        try:
+            versions_pruned, released_files, released_bytes = self.prune_versions(now, dry_run)
+            referenced = self.referenced_files(cutoff)
+            files_deleted, file_bytes = self.sweep_files(cutoff, referenced, dry_run)
+            chunks_deleted, chunk_bytes = self.sweep_chunks(cutoff, dry_run)
+            stale_blobs = self.drop_stale_blobs(cutoff, dry_run)
+        finally:
+            self.release_lock()
+
+        report = {
+            "dry_run": dry_run,
+            "versions_pruned": versions_pruned,
+            "files_deleted": released_files + files_deleted,
+            "orphan_chunks_deleted": chunks_deleted,
+            "stale_blobs_dropped": stale_blobs,
+            "bytes_reclaimed": released_bytes + file_bytes + chunk_bytes,
+            "referenced_files": len(referenced),
+            "seconds": time.perf_counter() - started,
+            "finished_at": datetime.now(timezone.utc),
+        }
+        if not dry_run:
+            self.runs += 1
+            self.bytes_reclaimed += report["bytes_reclaimed"]
+            self.last_report = report
+        logger.info("compaction: %s", report)
+        return report
+
+    async def _run_periodically(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_io(self.run)
+            except Exception:
+                logger.exception("compaction failed")
+
+    def start(self, interval: float = COMPACT_INTERVAL_SECONDS):
+        if interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run_periodically(interval))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        last = self.last_report or {}
+        return {
+            "runs": self.runs,
+            "bytes_reclaimed_total": self.bytes_reclaimed,
+            "last_bytes_reclaimed": last.get("bytes_reclaimed", 0),
+            "last_files_deleted": last.get("files_deleted", 0),
+            "last_seconds": last.get("seconds", 0.0),
+        }
@@ -0,0 +1,87 @@
+# csv_ingest.py
+import csv
+import io
+import time
+from storage.columnar import CSV_FORMAT
+from telemetry import record_span, span
+
+PREVIEW_ROWS = 21
+CHUNK_SIZE = 1024 * 1024
+
+
+class TeeReader(io.RawIOBase):
+    # passes every chunk read from source through to sink on the way by
+    def __init__(self, source, sink=None):
+        self.source = source
+        self.sink = sink
+        self.read_seconds = 0.0
+        self.write_seconds = 0.0
+        self.bytes = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        started = time.perf_counter()
+        data = self.source.read(len(buffer))
+        self.read_seconds += time.perf_counter() - started
+        n = len(data)
+        if n:
+            buffer[:n] = data
+            self.bytes += n
+            if self.sink is not None:
+                started = time.perf_counter()
+                self.sink.write(data)
+                self.write_seconds += time.perf_counter() - started
+        return n
+
+
+def iter_csv_rows(stream):
+    text = io.TextIOWrapper(
+        io.BufferedReader(stream, buffer_size=CHUNK_SIZE),
+        encoding="utf-8",
+        newline="",
+    )
+    return csv.reader(text)
+
+
+def ingest_csv(store, source, filename: str):
+    # single pass over the upload: bytes go to GridFS chunk by chunk while
+    # the csv reader counts rows and keeps the preview, nothing else is held
+    grid_in = store.new_file(filename=filename, metadata={"format": CSV_FORMAT})
+
+    preview = []
+    rows = 0
+    tee = TeeReader(source, grid_in)
+    # what is left once the upload reads and GridFS writes are taken out is
+    # utf-8 decoding and csv parsing
+    with span("csv_scan") as s:
+        try:
+            for row in iter_csv_rows(tee):
+                if rows < PREVIEW_ROWS:
+                    preview.append(row)
+                rows += 1
+        except Exception:
+            grid_in.abort()
+            raise
+
+        started = time.perf_counter()
+        grid_in.close()
+        tee.write_seconds += time.perf_counter() - started
+
+        s.exclude(tee.read_seconds + tee.write_seconds)
+        s.set(rows=max(0, rows - 1), bytes_read=tee.bytes)
+
+    record_span("upload_read", tee.read_seconds, bytes_read=tee.bytes)
+    record_span("gridfs_write", tee.write_seconds, bytes_written=tee.bytes)
+
+    return grid_in._id, preview, rows
+
+
+def read_csv_preview(fs, file_id) -> list:
+    preview = []
+    for row in iter_csv_rows(TeeReader(fs.get(file_id))):
+        preview.append(row)
+        if len(preview) >= PREVIEW_ROWS:
+            break
+    return preview
@@ -0,0 +1,124 @@
+# frame_cache.py
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+FRAME_CACHE_MB = int(os.getenv("FRAME_CACHE_MB", "512"))
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def block_arrays(values) -> list:
+    # the numpy buffers behind one block: plain, categorical codes or
+    # datetimes, masked (nullable) and sparse values
+    if isinstance(values, np.ndarray):
+        return [values]
+    arrays = [getattr(values, name, None) for name in ("_ndarray", "_data", "_mask", "sp_values")]
+    return [array for array in arrays if isinstance(array, np.ndarray)]
+
+
+def freeze_frame(df: pd.DataFrame) -> pd.DataFrame:
+    # every reader shares the cached blocks, so they're made read-only: an
+    # in-place edit (df.loc[...] = ..., fillna(inplace=True)) raises instead
+    # of changing the frame for everyone, assigning whole columns still works
+    for values in df._mgr.arrays:
+        for array in block_arrays(values):
+            array.flags.writeable = False
+    return df
+
+
+class FrameCache:
+    # dataset versions are immutable, so entries never need invalidating,
+    # they only age out when the memory budget is exceeded. Frames handed
+    # out are shallow copies of read-only blocks: add, drop or replace
+    # columns freely, copy() before editing values in place.
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is None:
+                return None
+            self._frames.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def get(self, key):
+        df = self._lookup(key)
+        if df is None:
+            return None
+        # shallow copy so callers adding or dropping columns can't touch the cached frame
+        return df.copy(deep=False)
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key, df: pd.DataFrame):
+        nbytes = frame_nbytes(df)
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._frames.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+
+            self._frames[key] = (freeze_frame(df), nbytes)
+            self.current_bytes += nbytes
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._frames.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        df = self._lookup(key)
+        if df is not None:
+            return df.copy(deep=False)
+
+        # one loader per key, concurrent requests for the same version wait for it
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            df = self._lookup(key)
+            if df is None:
+                with self._lock:
+                    self.misses += 1
+                try:
+                    df = loader()
+                    self.put(key, df)
+                finally:
+                    with self._lock:
+                        self._loading.pop(key, None)
+
+        return df.copy(deep=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._frames),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+frame_cache = FrameCache(FRAME_CACHE_MB * 1024 * 1024)
@@ -0,0 +1,226 @@
+# profile.py
+import os
+import numpy as np
+import pandas as pd
+from pandas.api import types
+from storage.columnar import ARROW_CHUNK_ROWS, iter_dataframe_chunks
+from storage.schema import CATEGORY_MAX_UNIQUE, float_dtype, integer_range_dtype, is_category
+from telemetry import span
+
+# statistics, missing counts and the inferred schema of an upload, built a
+# chunk at a time like the upload itself rather than from the whole parsed
+# file. Counts, means, spreads and extremes are exact; quartiles come from a
+# uniform sample of rows, which is every row unless the file has more cells
+# than SUMMARY_SAMPLE_CELLS.
+SUMMARY_SAMPLE_CELLS = int(os.getenv("SUMMARY_SAMPLE_CELLS", "10000000"))
+PROFILE_CHUNK_ROWS = ARROW_CHUNK_ROWS
+
+NUMERIC_KINDS = ("int", "float", "empty")
+QUARTILES = (("25%", 0.25), ("50%", 0.5), ("75%", 0.75))
+
+
+def chunk_kind(series: pd.Series) -> str:
+    dtype = series.dtype
+    if types.is_bool_dtype(dtype):
+        return "bool"
+    if types.is_integer_dtype(dtype):
+        return "int"
+    if types.is_float_dtype(dtype):
+        # a chunk where the column is all gaps says nothing about its type
+        return "float" if series.notna().any() else "empty"
+    if isinstance(dtype, pd.CategoricalDtype) or types.infer_dtype(series, skipna=True) in ("string", "empty"):
+        return "string"
+    return "mixed"
+
+
+def merge_kinds(a: str | None, b: str) -> str:
+    # what pandas infers for the whole column from what it got per chunk
+    if a is None or a == b:
+        return b
+    pair = {a, b}
+    if pair <= set(NUMERIC_KINDS):
+        return "float"
+    if pair == {"string", "empty"}:
+        return "string"
+    return "mixed"
+
+
+class ColumnProfile:
+    def __init__(self, sample_size: int):
+        self.kind = None
+        self.missing = 0
+        self.bytes = 0
+        # numeric values, merged per chunk (Chan et al.)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.max_abs = 0.0
+        # value -> count for text columns, None past CATEGORY_MAX_UNIQUE
+        self.counts = {}
+        # grows with the rows seen up to the sample size
+        self.sample = np.empty(0) if sample_size else None
+
+    def add(self, series: pd.Series, slots: np.ndarray, positions: np.ndarray):
+        kind = chunk_kind(series)
+        self.kind = merge_kinds(self.kind, kind)
+        self.missing += int(series.isna().sum())
+        self.bytes += int(series.memory_usage(index=False, deep=True))
+
+        if kind in ("int", "float"):
+            self.add_numbers(series)
+        elif kind != "empty" and self.counts is not None:
+            for value, n in series.value_counts(dropna=True, sort=False).items():
+                self.counts[value] = self.counts.get(value, 0) + int(n)
+            if len(self.counts) > CATEGORY_MAX_UNIQUE:
+                self.counts = None
+
+        if self.kind not in NUMERIC_KINDS:
+            self.sample = None
+        elif self.sample is not None and len(slots):
+            size = int(slots.max()) + 1
+            if size > len(self.sample):
+                self.sample = np.concatenate([self.sample, np.full(size - len(self.sample), np.nan)])
+            self.sample[slots] = series.to_numpy(dtype=np.float64, na_value=np.nan)[positions]
+
+    def add_numbers(self, series: pd.Series):
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+
+        n = self.count + len(values)
+        mean = values.mean()
+        delta = mean - self.mean
+        self.m2 += ((values - mean) ** 2).sum() + delta ** 2 * self.count * len(values) / n
+        self.mean += delta * len(values) / n
+        self.count = n
+
+        low, high = series.min(), series.max()
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        finite = values[np.isfinite(values)]
+        if len(finite):
+            self.max_abs = max(self.max_abs, float(np.abs(finite).max()))
+
+    def dtype(self, rows: int) -> str:
+        if self.kind == "int":
+            return integer_range_dtype(self.min, self.max)
+        if self.kind in ("float", "empty"):
+            return float_dtype(self.max_abs)
+        if self.kind == "bool":
+            return "bool"
+        if self.kind == "string" and self.counts is not None and is_category(len(self.counts), rows):
+            return "category"
+        return "object"
+
+    def nbytes(self, dtype: str, rows: int) -> int:
+        # memory of the column once read with dtype
+        if dtype == "object":
+            return self.bytes
+        if dtype == "category":
+            categories = pd.Categorical([], categories=list(self.counts))
+            return rows * categories.codes.itemsize + int(categories.categories.memory_usage(deep=True))
+        return rows * np.dtype(dtype).itemsize
+
+    def numeric_stats(self, sampled: int) -> list:
+        std = np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+        stats = [
+            float(self.count),
+            self.mean if self.count else np.nan,
+            std,
+            float(self.min) if self.count else np.nan,
+        ]
+        values = self.sample[:sampled] if self.sample is not None else np.empty(0)
+        values = values[~np.isnan(values)]
+        stats += [float(np.quantile(values, q)) if len(values) else np.nan for _, q in QUARTILES]
+        return stats + [float(self.max) if self.count else np.nan]
+
+    def text_stats(self, rows: int) -> list:
+        if self.counts is None:
+            # too many distinct values to count in bounded memory
+            return [rows - self.missing, None, None, None]
+        if not self.counts:
+            return [0, 0, np.nan, np.nan]
+        top = max(self.counts, key=self.counts.get)
+        return [rows - self.missing, len(self.counts), top, self.counts[top]]
+
+
+class FileProfile:
+    def __init__(self, sample_cells: int = SUMMARY_SAMPLE_CELLS, seed: int = 0):
+        self.sample_cells = sample_cells
+        self.sample_size = 0
+        self.columns = []
+        self.profiles = {}
+        self.rows = 0
+        self._rng = np.random.default_rng(seed)
+
+    def sample_slots(self, n: int):
+        # reservoir sampling over rows: (sample slots, chunk row positions)
+        # to copy, the same rows for every column
+        size = self.sample_size
+        direct = max(0, min(n, size - self.rows))
+        slots = [np.arange(self.rows, self.rows + direct)]
+        positions = [np.arange(direct)]
+
+        rest = np.arange(direct, n)
+        if len(rest) and size:
+            picks = self._rng.integers(0, self.rows + rest + 1)
+            kept = picks < size
+            slots.append(picks[kept])
+            positions.append(rest[kept])
+        return np.concatenate(slots), np.concatenate(positions)
+
+    def add(self, chunk: pd.DataFrame):
+        if not self.profiles:
+            self.columns = list(chunk.columns)
+            self.sample_size = self.sample_cells // max(1, len(self.columns))
+            self.profiles = {col: ColumnProfile(self.sample_size) for col in self.columns}
+
+        slots, positions = self.sample_slots(len(chunk))
+        for col in self.columns:
+            self.profiles[col].add(chunk[col], slots, positions)
+        self.rows += len(chunk)
+
+    def schema(self) -> dict:
+        return {str(col): self.profiles[col].dtype(self.rows) for col in self.columns}
+
+    def memory(self, schema: dict) -> dict:
+        # what downcast() reports, worked out from the per-column totals
+        index = int(pd.RangeIndex(self.rows).memory_usage(deep=True))
+        before = index + sum(self.profiles[col].bytes for col in self.columns)
+        after = index + sum(self.profiles[col].nbytes(schema[str(col)], self.rows) for col in self.columns)
+        return {"before_bytes": before, "after_bytes": after}
+
+    def statistics(self) -> list:
+        # the same table as describe(): numeric columns if there are any,
+        # every column otherwise
+        numeric = [col for col in self.columns if self.profiles[col].kind in NUMERIC_KINDS]
+        sampled = min(self.rows, self.sample_size)
+        if numeric:
+            names = ["count", "mean", "std", "min"] + [name for name, _ in QUARTILES] + ["max"]
+            columns = {col: self.profiles[col].numeric_stats(sampled) for col in numeric}
+        else:
+            names = ["count", "unique", "top", "freq"]
+            columns = {col: self.profiles[col].text_stats(self.rows) for col in self.columns}
+
+        table = [["Statistic"] + list(columns)]
+        for i, name in enumerate(names):
+            table.append([name] + [stats[i] for stats in columns.values()])
+        return table
+
+    def missing_values(self) -> list:
+        return [["Column"] + self.columns, ["Missing"] + [self.profiles[col].missing for col in self.columns]]
+
+    def summary(self) -> dict:
+        return {"statistics": self.statistics(), "missing_values": self.missing_values()}
+
+
+def profile_file(fs, file_id) -> FileProfile:
+    profile = FileProfile()
+    with span("profile_file") as s:
+        for chunk in iter_dataframe_chunks(fs, file_id, PROFILE_CHUNK_ROWS):
+            profile.add(chunk)
+        s.set(rows=profile.rows)
+    return profile
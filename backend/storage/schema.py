@@ -0,0 +1,90 @@
+# schema.py
+import os
+import numpy as np
+import pandas as pd
+from pandas.api import types
+from storage.frame_cache import frame_nbytes
+
+# strings become "category" when they repeat enough for the codes to pay off
+CATEGORY_MAX_UNIQUE = int(os.getenv("CATEGORY_MAX_UNIQUE", "1000"))
+CATEGORY_MAX_RATIO = float(os.getenv("CATEGORY_MAX_RATIO", "0.5"))
+
+INT_DTYPES = ("int8", "int16", "int32")
+FLOAT32_MAX = np.finfo(np.float32).max
+
+
+def integer_dtype(series: pd.Series) -> str:
+    if series.empty:
+        return "int32"
+    return integer_range_dtype(series.min(), series.max())
+
+
+def integer_range_dtype(low, high) -> str:
+    for dtype in INT_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return "int64"
+
+
+def float_dtype(max_abs: float) -> str:
+    # largest finite magnitude in the column
+    return "float32" if max_abs <= FLOAT32_MAX else "float64"
+
+
+def is_category(unique: int, rows: int) -> bool:
+    return unique <= CATEGORY_MAX_UNIQUE and unique <= CATEGORY_MAX_RATIO * rows
+
+
+def column_dtype(series: pd.Series) -> str:
+    dtype = series.dtype
+
+    if isinstance(dtype, (pd.SparseDtype, pd.CategoricalDtype)) or types.is_bool_dtype(dtype):
+        return str(dtype)
+
+    if types.is_integer_dtype(dtype):
+        return integer_dtype(series)
+
+    if types.is_float_dtype(dtype):
+        finite = series[np.isfinite(series)]
+        return float_dtype(finite.abs().max() if not finite.empty else 0.0)
+
+    if types.is_object_dtype(dtype) and types.infer_dtype(series, skipna=True) == "string":
+        if is_category(series.nunique(dropna=True), len(series)):
+            return "category"
+
+    return str(dtype)
+
+
+def infer_schema(df: pd.DataFrame) -> dict:
+    return {str(col): column_dtype(df[col]) for col in df.columns}
+
+
+def apply_schema(df: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    dtypes = {
+        col: dtype for col, dtype in schema.items()
+        if col in df.columns and str(df[col].dtype) != dtype and not dtype.startswith("Sparse")
+    }
+    return df.astype(dtypes) if dtypes else df
+
+
+def downcast(df: pd.DataFrame):
+    # returns (downcast frame, schema, memory before/after in bytes)
+    schema = infer_schema(df)
+    before = frame_nbytes(df)
+    df = apply_schema(df, schema)
+    return df, schema, {"before_bytes": before, "after_bytes": frame_nbytes(df)}
+
+
+def read_dtypes(schema: dict | None, columns: list | None = None) -> dict | None:
+    # explicit dtypes for pd.read_csv, so a version is never re-inferred
+    if not schema:
+        return None
+    return {
+        col: dtype for col, dtype in schema.items()
+        if columns is None or col in columns
+    }
+
+
+def file_schema(grid_out) -> dict | None:
+    return (grid_out.metadata or {}).get("schema")
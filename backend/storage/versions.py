@@ -0,0 +1,64 @@
+# versions.py
+import os
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+
+# every stored version a dataset has pointed at, oldest first, on the
+# dataset document as "versions". Each entry holds a blob reference of its
+# own, so superseded versions stay readable until the retention policy
+# prunes them and the compactor reclaims their files.
+VERSION_RETENTION_COUNT = int(os.getenv("VERSION_RETENTION_COUNT", "5"))
+VERSION_RETENTION_DAYS = float(os.getenv("VERSION_RETENTION_DAYS", "30"))
+
+
+def version_entry(file_id, source: str, steps: list | None = None, transform_file_id=None) -> dict:
+    entry = {
+        "version_id": ObjectId(),
+        "file_id": file_id,
+        "source": source,
+        "created_at": datetime.now(timezone.utc),
+    }
+    if steps:
+        entry["steps"] = steps
+    if transform_file_id is not None:
+        # the fitted chain from the upload to this version, also referenced
+        # by the entry
+        entry["transform_file_id"] = transform_file_id
+    return entry
+
+
+def add_version(datasets, blob_store, dataset_id, file_id, source: str, steps: list | None = None):
+    blob_store.retain(file_id)
+    datasets.update_one({"_id": dataset_id}, {"$push": {"versions": version_entry(file_id, source, steps)}})
+
+
+def as_utc(value: datetime) -> datetime:
+    # pymongo hands back naive datetimes unless the client is tz_aware
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def expired_versions(versions: list, now: datetime, keep: int = VERSION_RETENTION_COUNT,
+                     max_age_days: float = VERSION_RETENTION_DAYS) -> list:
+    # entries past the newest `keep` or older than max_age_days (0 turns
+    # either limit off); the newest entry always stays
+    max_age = timedelta(days=max_age_days) if max_age_days else None
+    expired = []
+    for i, entry in enumerate(versions[:-1]):
+        newer = len(versions) - 1 - i
+        too_many = keep and newer >= keep
+        too_old = max_age is not None and now - as_utc(entry["created_at"]) > max_age
+        if too_many or too_old:
+            expired.append(entry)
+    return expired
+
+
+def serialize_version(entry: dict, latest_file_id) -> dict:
+    return {
+        "version_id": str(entry["version_id"]),
+        "file_id": str(entry["file_id"]),
+        "source": entry["source"],
+        "steps": entry.get("steps", []),
+        "has_transform": "transform_file_id" in entry,
+        "created_at": entry["created_at"],
+        "latest": entry["file_id"] == latest_file_id,
+    }
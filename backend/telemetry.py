@@ -0,0 +1,255 @@
+# telemetry.py
+import os
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# per-stage spans for the current request, plus process-wide aggregates for
+# /metrics. Spans recorded in a process-pool or job worker only reach that
+# process's aggregates, not the request that started them.
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+# tracemalloc slows allocation-heavy code down noticeably, and its peak is
+# process-wide, so concurrent requests inflate each other's numbers
+TRACE_MEMORY = os.getenv("TELEMETRY_TRACE_MEMORY", "0") == "1"
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNTED = ("bytes_read", "bytes_written", "rows")
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_request_spans = ContextVar("request_spans", default=None)
+_active_span = ContextVar("active_span", default=None)
+
+
+class Span:
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.seconds = 0.0
+        self.peak_memory = None
+        self._excluded = 0.0
+        self._base_memory = 0
+        self._peak_seen = 0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def exclude(self, seconds: float):
+        # time measured separately (and recorded as its own span)
+        self._excluded += seconds
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_seconds = {}
+        self.stage_totals = {}
+        self.stage_peak_memory = {}
+        self.request_seconds = {}
+        self._collectors = []
+
+    def observe_span(self, span: Span):
+        with self._lock:
+            self.stage_seconds.setdefault(span.name, Histogram()).observe(span.seconds)
+            for key in COUNTED:
+                if span.attrs.get(key):
+                    totals = self.stage_totals.setdefault(span.name, {})
+                    totals[key] = totals.get(key, 0) + span.attrs[key]
+            if span.peak_memory is not None:
+                self.stage_peak_memory[span.name] = max(
+                    self.stage_peak_memory.get(span.name, 0), span.peak_memory
+                )
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float):
+        with self._lock:
+            self.request_seconds.setdefault((method, route, str(status)), Histogram()).observe(seconds)
+
+    def add_collector(self, name: str, collect):
+        # collect() -> {metric: number}, exported as gauges under name_
+        self._collectors.append((name, collect))
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            lines += render_histogram(
+                "nocode_stage_seconds", "Time spent per request stage",
+                {(("stage", name),): h for name, h in self.stage_seconds.items()},
+            )
+            for key in COUNTED:
+                metric = f"nocode_stage_{key}_total"
+                lines += [f"# HELP {metric} {key.replace('_', ' ').capitalize()} per stage", f"# TYPE {metric} counter"]
+                for name, totals in self.stage_totals.items():
+                    if key in totals:
+                        lines.append(f'{metric}{{stage="{escape(name)}"}} {totals[key]}')
+            lines += ["# HELP nocode_stage_peak_memory_bytes Largest traced peak per stage",
+                      "# TYPE nocode_stage_peak_memory_bytes gauge"]
+            for name, peak in self.stage_peak_memory.items():
+                lines.append(f'nocode_stage_peak_memory_bytes{{stage="{escape(name)}"}} {peak}')
+            lines += render_histogram(
+                "nocode_http_request_seconds", "Request latency per route",
+                {(("method", m), ("route", r), ("status", s)): h for (m, r, s), h in self.request_seconds.items()},
+            )
+
+        for name, collect in self._collectors:
+            for key, value in collect().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    metric = f"nocode_{name}_{key}"
+                    lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+
+        return "\n".join(lines) + "\n"
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: tuple, extra: tuple = ()) -> str:
+    return ",".join(f'{key}="{escape(str(value))}"' for key, value in labels + extra)
+
+
+def render_histogram(metric: str, help_text: str, histograms: dict) -> list:
+    lines = [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+    for labels, h in histograms.items():
+        # observe() already counts a value in every bucket it fits
+        for bound, count in zip(BUCKETS, h.counts):
+            lines.append(f"{metric}_bucket{{{format_labels(labels, (('le', bound),))}}} {count}")
+        lines.append(f'{metric}_bucket{{{format_labels(labels, (("le", "+Inf"),))}}} {h.count}')
+        lines.append(f"{metric}_sum{{{format_labels(labels)}}} {h.sum}")
+        lines.append(f"{metric}_count{{{format_labels(labels)}}} {h.count}")
+    return lines
+
+
+metrics = Metrics()
+
+
+def start_tracing():
+    if TRACE_MEMORY and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def finish_span(span: Span):
+    metrics.observe_span(span)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append(span)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    s = Span(name, attrs)
+    parent = _active_span.get()
+    token = _active_span.set(s)
+
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        if parent is not None:
+            parent._peak_seen = max(parent._peak_seen, peak)
+        s._base_memory = s._peak_seen = current
+        tracemalloc.reset_peak()
+
+    started = time.perf_counter()
+    try:
+        yield s
+    finally:
+        s.seconds = max(0.0, time.perf_counter() - started - s._excluded)
+        _active_span.reset(token)
+
+        if tracing:
+            # nested spans reset the peak, so the highest absolute value
+            # seen is handed up to the parent on the way in and out
+            s._peak_seen = max(s._peak_seen, tracemalloc.get_traced_memory()[1])
+            s.peak_memory = max(0, s._peak_seen - s._base_memory)
+            if parent is not None:
+                parent._peak_seen = max(parent._peak_seen, s._peak_seen)
+
+        finish_span(s)
+
+
+def record_span(name: str, seconds: float, **attrs):
+    # for stages timed piecemeal, e.g. reads interleaved with parsing
+    s = Span(name, attrs)
+    s.seconds = seconds
+    finish_span(s)
+
+
+class TimedReader:
+    # file-like wrapper that adds up the time and bytes spent in read(), so
+    # I/O can be told apart from the parser consuming it
+    def __init__(self, raw):
+        self._raw = raw
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def read(self, *args):
+        started = time.perf_counter()
+        data = self._raw.read(*args)
+        self.seconds += time.perf_counter() - started
+        self.bytes += len(data)
+        return data
+
+    def readinto(self, buffer):
+        started = time.perf_counter()
+        n = self._raw.readinto(buffer)
+        self.seconds += time.perf_counter() - started
+        self.bytes += n or 0
+        return n
+
+    def __iter__(self):
+        return iter(self.read, b"")
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+TOKEN = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def server_timing(spans: list, total: float) -> str:
+    entries = []
+    for s in spans:
+        desc = ",".join(f"{key}={value}" for key, value in s.attrs.items() if value is not None)
+        if s.peak_memory is not None:
+            desc += f"{',' if desc else ''}peak_memory={s.peak_memory}"
+        entry = f"{TOKEN.sub('_', s.name)};dur={s.seconds * 1000:.2f}"
+        entries.append(entry + (f';desc="{desc}"' if desc else ""))
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+async def timing_middleware(request, call_next):
+    spans = []
+    token = _request_spans.set(spans)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _request_spans.reset(token)
+
+    elapsed = time.perf_counter() - started
+    # the route template, not the path, keeps ids out of the label values
+    route = request.scope.get("route")
+    metrics.observe_request(
+        request.method, route.path if route is not None else "unmatched", response.status_code, elapsed
+    )
+
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = server_timing(spans, elapsed)
+    return response
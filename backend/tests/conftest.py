@@ -0,0 +1,56 @@
+# conftest.py
+# python -m pytest tests, from the backend directory. The app connects to
+# mongo at import time, so every module runs against one in-memory mongomock
+# client, and the local caches go to a throwaway directory.
+import os
+import sys
+import tempfile
+import mongomock
+import mongomock.gridfs
+import pymongo
+import pytest
+
+_scratch = tempfile.mkdtemp(prefix="nocode_tests_")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("TRAIN_EXECUTOR", "thread")
+os.environ.setdefault("FEATURE_CACHE_DIR", os.path.join(_scratch, "feature_cache"))
+os.environ.setdefault("MODEL_CACHE_DIR", os.path.join(_scratch, "model_cache"))
+
+mongomock.gridfs.enable_gridfs_integration()
+_client = mongomock.MongoClient()
+pymongo.MongoClient = lambda *args, **kwargs: _client
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def empty_database():
+    yield
+    from db import db
+    for name in db.list_collection_names():
+        db.drop_collection(name)
+
+
+@pytest.fixture(scope="session")
+def client():
+    # one app startup for the session, shutdown closes the worker pools
+    from fastapi.testclient import TestClient
+    from jose import jwt
+    import main
+
+    token = jwt.encode({"id": "test-user", "email": "test@example.com"}, os.environ["SECRET_KEY"], algorithm="HS256")
+    with TestClient(main.app) as c:
+        c.cookies.set("access_token", token)
+        yield c
+
+
+@pytest.fixture
+def upload(client):
+    # DataFrame -> dataset id
+    def upload_frame(df, name: str = "data.csv") -> str:
+        files = {"file": (name, df.to_csv(index=False).encode(), "text/csv")}
+        response = client.post("/dataset/upload", files=files)
+        assert response.status_code == 200, response.text
+        return response.json()["dataset_id"]
+    return upload_frame
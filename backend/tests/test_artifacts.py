@@ -0,0 +1,34 @@
+import os
+import numpy as np
+from sklearn.linear_model import LinearRegression
+from db import fs
+from training import artifacts
+
+
+def test_local_artifact_copies_are_evicted_least_recently_used_first(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "MODEL_CACHE_DIR", str(tmp_path))
+    models = [LinearRegression().fit(np.arange(2 * n).reshape(-1, 1), np.arange(2 * n)) for n in (2, 3, 4)]
+    file_ids = [artifacts.store_model_artifact(fs, model, f"model{i}")[0] for i, model in enumerate(models)]
+
+    paths = [artifacts.cached_artifact_path(fs, file_id, artifacts.JOBLIB_FORMAT) for file_id in file_ids[:2]]
+    os.utime(paths[0], (1, 1))
+    os.utime(paths[1], (2, 2))
+    # the first one is used again, so the second is now the oldest
+    artifacts.cached_artifact_path(fs, file_ids[0], artifacts.JOBLIB_FORMAT)
+    monkeypatch.setattr(artifacts, "MODEL_CACHE_DIR_MAX_BYTES", sum(os.path.getsize(p) for p in paths))
+
+    newest = artifacts.cached_artifact_path(fs, file_ids[2], artifacts.JOBLIB_FORMAT)
+
+    assert os.path.exists(paths[0])
+    assert not os.path.exists(paths[1])
+    assert os.path.exists(newest)
+
+
+def test_replaced_artifacts_are_discarded(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "MODEL_CACHE_DIR", str(tmp_path))
+    file_id, _ = artifacts.store_model_artifact(fs, LinearRegression().fit([[0], [1]], [0, 1]), "model")
+    path = artifacts.cached_artifact_path(fs, file_id, artifacts.JOBLIB_FORMAT)
+
+    artifacts.discard_cached_artifact(file_id)
+
+    assert not os.path.exists(path)
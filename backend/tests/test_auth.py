@@ -0,0 +1,72 @@
+import time
+import pytest
+from jose import JWTError
+import auth
+from auth import TokenCache, create_access_token, decode_token
+from execution import PoolFull
+
+
+def test_cached_tokens_expire_with_the_ttl_or_their_own_exp():
+    cache = TokenCache(ttl=60, max_entries=10)
+    cache.put("fresh", {"id": "a"})
+    cache.put("expired", {"id": "b", "exp": time.time() - 1})
+
+    assert cache.get("fresh") == {"id": "a"}
+    assert cache.get("expired") is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+
+def test_the_least_recently_used_token_is_evicted():
+    cache = TokenCache(ttl=60, max_entries=2)
+    cache.put("a", {"id": "a"})
+    cache.put("b", {"id": "b"})
+    cache.get("a")
+    cache.put("c", {"id": "c"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"id": "a"}
+    # raw tokens are never kept as keys
+    assert list(cache._entries) == [TokenCache.key("c"), TokenCache.key("a")]
+
+
+def test_a_token_is_verified_once_while_cached(monkeypatch):
+    monkeypatch.setattr(auth, "token_cache", TokenCache())
+    calls = []
+    real_decode = auth.jwt.decode
+    monkeypatch.setattr(auth.jwt, "decode", lambda *args, **kwargs: calls.append(1) or real_decode(*args, **kwargs))
+    token = create_access_token({"id": "u1", "email": "a@example.com"})
+
+    assert decode_token(token)["id"] == "u1"
+    assert decode_token(token)["id"] == "u1"
+    assert len(calls) == 1
+
+    with pytest.raises(JWTError):
+        decode_token("not-a-token")
+    with pytest.raises(JWTError):
+        decode_token("not-a-token")
+    assert len(calls) == 3
+
+
+def test_register_and_login(client):
+    user = {"name": "Ada", "email": "ada@example.com", "password": "secret"}
+
+    assert client.post("/register", json=user).status_code == 200
+    assert client.post("/register", json=user).status_code == 400
+
+    login = client.post("/login", json={"email": user["email"], "password": "secret"})
+    assert login.status_code == 200
+    assert "access_token" in login.headers["set-cookie"]
+    assert client.post("/login", json={"email": user["email"], "password": "wrong"}).status_code == 400
+
+
+def test_logins_are_turned_away_when_the_bcrypt_pool_is_full(client, monkeypatch):
+    class FullPool:
+        async def run(self, fn, *args):
+            raise PoolFull("bcrypt")
+
+    monkeypatch.setattr(auth, "password_pool", FullPool())
+
+    response = client.post("/register", json={"name": "Bo", "email": "bo@example.com", "password": "x"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(auth.BCRYPT_RETRY_AFTER_SECONDS)
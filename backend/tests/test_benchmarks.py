@@ -0,0 +1,47 @@
+import pytest
+from benchmarks.suite import BENCHMARKS, compare_runs, run_suite
+from benchmarks.synthetic import CLASS_TARGET, REGRESSION_TARGET, make_dataset
+
+
+def test_synthetic_data_has_the_requested_shape():
+    df = make_dataset(2000, numeric=4, categorical=3, missing=0.1, cardinality=5, classes=4)
+
+    assert df.shape == (2000, 4 + 3 + 2)
+    assert df[CLASS_TARGET].nunique() == 4
+    assert df[REGRESSION_TARGET].notna().all()
+    features = df.drop(columns=[CLASS_TARGET, REGRESSION_TARGET])
+    assert 0.07 < features.isna().mean().mean() < 0.13
+    assert make_dataset(100, seed=1).equals(make_dataset(100, seed=1))
+
+
+def test_a_run_times_every_function_at_every_size():
+    functions = ["check_missing_values", "one_hot_encode_text", "write_dataframe", "load_dataframe"]
+    seen = []
+
+    report = run_suite([100, 200], {"numeric": 3, "categorical": 1}, functions=functions,
+                       repeat=1, on_result=seen.append)
+
+    assert [(r["function"], r["rows"]) for r in report["results"]] == [
+        (name, rows) for rows in (100, 200) for name in functions
+    ]
+    assert seen == report["results"]
+    assert report["config"]["store"] == "mongomock"
+    for result in report["results"]:
+        assert result["seconds"]["min"] <= result["seconds"]["median"]
+        assert result["peak_memory_bytes"] > 0
+
+
+def test_unknown_functions_are_rejected():
+    with pytest.raises(ValueError, match="nope"):
+        run_suite([100], {}, functions=["nope"])
+    assert "train_classifier_model" in BENCHMARKS
+
+
+def test_compare_flags_slowdowns_past_the_threshold():
+    def report(*cases):
+        return {"results": [{"function": f, "rows": 100, "seconds": {"min": s}} for f, s in cases]}
+
+    rows = compare_runs(report(("a", 1.0), ("b", 1.0), ("gone", 1.0)),
+                        report(("a", 1.05), ("b", 1.5), ("new", 1.0)), threshold=0.1)
+
+    assert [(function, worse) for function, _, _, _, _, worse in rows] == [("a", False), ("b", True)]
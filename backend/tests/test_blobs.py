@@ -0,0 +1,74 @@
+import io
+import pandas as pd
+from bson import ObjectId
+from db import blob_store, datasets, db, fs
+
+
+def blob(file_id) -> dict:
+    return db["blobs"].find_one({"file_id": file_id})
+
+
+def test_identical_content_is_stored_once():
+    first = blob_store.put(b"a,b\n1,2\n", filename="one.csv")
+    second = blob_store.put(io.BytesIO(b"a,b\n1,2\n"), filename="two.csv")
+    other = blob_store.put(b"a,b\n3,4\n", filename="three.csv")
+
+    assert first == second != other
+    assert blob(first)["refcount"] == 2
+    assert db["fs.files"].count_documents({}) == 2
+
+
+def test_the_file_goes_with_its_last_reference():
+    file_id = blob_store.put(b"payload", filename="x")
+    blob_store.retain(file_id)
+
+    blob_store.release(file_id)
+    assert fs.exists(file_id) and blob(file_id)["refcount"] == 1
+
+    blob_store.release(file_id)
+    assert not fs.exists(file_id) and blob(file_id) is None
+
+
+def test_files_from_before_the_blob_layer_are_left_alone():
+    file_id = fs.put(b"legacy", filename="old.csv")
+
+    assert not blob_store.retain(file_id)
+    assert not blob_store.release(file_id)
+    assert fs.exists(file_id)
+
+
+def test_uploads_of_the_same_file_share_one_copy(upload):
+    df = pd.DataFrame({"a": [1, 2, 3], "b": [4.0, 5.0, 6.0]})
+    ids = [upload(df), upload(df)]
+
+    docs = [datasets.find_one({"_id": ObjectId(i)}) for i in ids]
+    file_id = docs[0]["original_file_id"]
+    assert docs[1]["original_file_id"] == file_id
+    # upload, latest pointer and history entry, per dataset
+    assert blob(file_id)["refcount"] == 6
+
+
+def test_restore_is_a_pointer_update(client, upload):
+    dataset_id = upload(pd.DataFrame({"a": [1.0, 2.0, 3.0], "label": [0, 1, 0]}))
+    client.post("/preprocessing/scaling", json={"dataset_id": dataset_id, "target_variable": "label"})
+    client.post("/train/train-regressor", json={
+        "dataset_id": dataset_id, "model_name": "Linear Regression", "target_variable": "label", "test_percentage": 34,
+    })
+    files_before = db["fs.files"].count_documents({})
+
+    response = client.get(f"/dataset/restore/{dataset_id}")
+
+    assert response.status_code == 200, response.text
+    doc = datasets.find_one({"_id": ObjectId(dataset_id)})
+    assert doc["latest_version_file_id"] == doc["original_file_id"]
+    assert db["fs.files"].count_documents({}) <= files_before
+
+
+def test_clones_of_a_sample_share_one_copy(client):
+    sample_id = datasets.insert_one({"name": "iris", "is_sample": True, "data": [["a", "b"], ["1", "2"]]}).inserted_id
+
+    ids = [client.post(f"/dataset/clone/{sample_id}").json()["dataset_id"] for _ in range(2)]
+
+    file_ids = {datasets.find_one({"_id": ObjectId(i)})["original_file_id"] for i in ids}
+    assert len(file_ids) == 1
+    assert db["fs.files"].count_documents({}) == 1
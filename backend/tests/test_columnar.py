@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+from db import blob_store, fs
+from storage import columnar
+from storage.frame_cache import frame_cache
+
+
+def typed_frame(rows: int = 200) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "count": rng.integers(0, 100, size=rows).astype(np.int16),
+        "score": rng.normal(size=rows).astype(np.float32),
+        "city": pd.Categorical(rng.choice(["Oslo", "Lima"], size=rows)),
+        "flag": rng.random(rows) < 0.5,
+    })
+
+
+@pytest.fixture(autouse=True)
+def cold_frame_cache(monkeypatch):
+    # every read goes to the stored file
+    monkeypatch.setattr(frame_cache, "put", lambda key, df: None)
+
+
+def test_versions_are_stored_as_arrow_and_read_back_typed():
+    df = typed_frame()
+    file_id = columnar.write_dataframe(blob_store, df, filename="v")
+
+    assert fs.get(file_id).metadata["format"] == columnar.ARROW_FORMAT
+    read = columnar.read_dataframe(fs, file_id)
+    # no text round trip: values, categories and bools come back as they went in
+    pd.testing.assert_frame_equal(read, df, check_dtype=False)
+    assert isinstance(read["city"].dtype, pd.CategoricalDtype)
+    assert read["flag"].dtype == bool
+
+
+def test_reads_project_the_requested_columns():
+    file_id = columnar.write_dataframe(blob_store, typed_frame(), filename="v")
+
+    read = columnar.read_dataframe(fs, file_id, columns=["score", "flag"])
+
+    assert list(read.columns) == ["score", "flag"]
+    assert read["score"].dtype == np.float32
+
+
+def test_chunked_reads_cover_every_row_once():
+    df = typed_frame(250)
+    file_id = columnar.write_dataframe(blob_store, df, filename="v")
+
+    chunks = list(columnar.iter_dataframe_chunks(fs, file_id, chunk_rows=100, columns=["count"]))
+
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+    assert pd.concat(chunks)["count"].tolist() == df["count"].tolist()
+
+
+def test_columns_arrow_cannot_type_fall_back_to_csv():
+    df = pd.DataFrame({"mixed": [1, "a", 2.5], "x": [1.0, 2.0, 3.0]})
+    file_id = columnar.write_dataframe(blob_store, df, filename="v")
+
+    assert fs.get(file_id).metadata["format"] == columnar.CSV_FORMAT
+    assert columnar.read_dataframe(fs, file_id)["x"].tolist() == [1.0, 2.0, 3.0]
+
+
+def test_csv_files_without_metadata_still_load():
+    file_id = fs.put(b"a,b\n1,x\n2,y\n", filename="old.csv")
+
+    read = columnar.read_dataframe(fs, file_id, columns=["a"])
+
+    assert read["a"].tolist() == [1, 2]
@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from fastapi.testclient import TestClient
+import main
+from db import db, fs, blob_store
+from storage.compactor import Compactor, field_values
+
+
+def test_compaction_needs_a_signed_in_user():
+    response = TestClient(main.app).post("/storage/compact")
+
+    assert response.status_code == 401
+
+
+def test_compaction_is_a_dry_run_unless_asked(client, monkeypatch):
+    report = client.post("/storage/compact").json()
+    assert report["dry_run"] is True
+
+    assert client.post("/storage/compact?dry_run=false").status_code == 403
+
+    monkeypatch.setattr(main, "STORAGE_ADMINS", {"test-user"})
+    assert client.post("/storage/compact?dry_run=false").json()["dry_run"] is False
+
+
+def stored(data: bytes, days_old: float = 0):
+    # a blob with one reference, uploaded (and last retained) days_old ago
+    file_id = blob_store.put(data, filename="test.bin")
+    when = datetime.now(timezone.utc) - timedelta(days=days_old)
+    db["fs.files"].update_one({"_id": file_id}, {"$set": {"uploadDate": when}})
+    db["blobs"].update_one({"file_id": file_id}, {"$set": {"touched_at": when}})
+    return file_id
+
+
+def exists(file_id) -> bool:
+    return db["fs.files"].count_documents({"_id": file_id}) == 1
+
+
+def compactor() -> Compactor:
+    return Compactor(db, fs, blob_store, grace_seconds=3600)
+
+
+def test_field_values_walks_nested_arrays():
+    doc = {
+        "versions": [{"file_id": 1, "transform_file_id": 2}, {"file_id": 3}],
+        "pipeline": {"steps": [{"transform_file_id": 4}, {"op": "scaling"}], "base_file_id": 5},
+    }
+
+    assert field_values(doc, "versions.file_id") == [1, 3]
+    assert field_values(doc, "versions.transform_file_id") == [2]
+    assert field_values(doc, "pipeline.steps.transform_file_id") == [4]
+    assert field_values(doc, "pipeline.base_file_id") == [5]
+    assert field_values(doc, "label_encoder_file_id") == []
+
+
+def test_unreferenced_files_inside_the_grace_window_are_kept():
+    fresh = stored(b"fresh")
+    old = stored(b"old", days_old=1)
+
+    report = compactor().run()
+
+    assert exists(fresh)
+    assert not exists(old)
+    assert report["files_deleted"] == 1
+
+
+def test_referenced_files_are_kept():
+    file_id = stored(b"referenced", days_old=1)
+    db["datasets"].insert_one({"original_file_id": file_id})
+
+    compactor().run()
+
+    assert exists(file_id)
+
+
+def test_pruned_versions_release_their_files():
+    old, older, latest = stored(b"v1", days_old=90), stored(b"v2", days_old=60), stored(b"v3")
+    transform = stored(b"chain", days_old=60)
+    versions = [
+        {"version_id": ObjectId(), "file_id": old, "created_at": datetime.now(timezone.utc) - timedelta(days=90)},
+        {"version_id": ObjectId(), "file_id": older, "transform_file_id": transform,
+         "created_at": datetime.now(timezone.utc) - timedelta(days=60)},
+        {"version_id": ObjectId(), "file_id": latest, "created_at": datetime.now(timezone.utc)},
+    ]
+    dataset_id = db["datasets"].insert_one({"versions": versions}).inserted_id
+
+    report = compactor().run()
+
+    assert report["versions_pruned"] == 2
+    assert [v["file_id"] for v in db["datasets"].find_one({"_id": dataset_id})["versions"]] == [latest]
+    assert not exists(old) and not exists(older) and not exists(transform)
+    assert exists(latest)
+    assert db["blobs"].count_documents({}) == 1
+
+
+def test_orphan_chunks_are_swept_once_out_of_the_grace_window():
+    old = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(days=1))
+    fresh = ObjectId()
+    db["fs.chunks"].insert_many([
+        {"files_id": old, "n": 0, "data": b"x" * 10},
+        {"files_id": old, "n": 1, "data": b"x" * 5},
+        {"files_id": fresh, "n": 0, "data": b"y"},
+    ])
+
+    report = compactor().run()
+
+    assert report["orphan_chunks_deleted"] == 2
+    assert db["fs.chunks"].count_documents({"files_id": old}) == 0
+    assert db["fs.chunks"].count_documents({"files_id": fresh}) == 1
+
+
+def test_dry_run_deletes_nothing():
+    unreferenced = stored(b"old", days_old=1)
+    pruned = stored(b"v1", days_old=90)
+    latest = stored(b"v2")
+    db["datasets"].insert_one({"versions": [
+        {"version_id": ObjectId(), "file_id": pruned, "created_at": datetime.now(timezone.utc) - timedelta(days=90)},
+        {"version_id": ObjectId(), "file_id": latest, "created_at": datetime.now(timezone.utc)},
+    ]})
+    orphan = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(days=1))
+    db["fs.chunks"].insert_one({"files_id": orphan, "n": 0, "data": b"z"})
+    before = {name: db[name].count_documents({}) for name in ("fs.files", "fs.chunks", "blobs")}
+
+    report = compactor().run(dry_run=True)
+
+    assert report["versions_pruned"] == 1
+    assert report["files_deleted"] == 1
+    assert report["orphan_chunks_deleted"] == 1
+    assert {name: db[name].count_documents({}) for name in before} == before
+    assert len(db["datasets"].find_one()["versions"]) == 2
+    assert exists(unreferenced) and exists(pruned)
@@ -0,0 +1,71 @@
+import time
+import numpy as np
+import pandas as pd
+from training.compare import build_shared_split, load_shared_split, rank_results
+
+
+def wait_for_leaderboard(client, job_id: str) -> dict:
+    for _ in range(400):
+        board = client.get(f"/train/compare/{job_id}").json()
+        if board["status"] in ("done", "failed", "cancelled"):
+            return board
+        time.sleep(0.05)
+    raise AssertionError(f"comparison {job_id} did not finish")
+
+
+def test_the_leaderboard_ranks_by_the_task_metric_and_lists_failures_last():
+    results = [
+        {"model_name": "a", "metrics": {"r2_score": 0.5}},
+        {"model_name": "b", "error": "boom"},
+        {"model_name": "c", "metrics": {"r2_score": 0.9}},
+    ]
+
+    board = rank_results("regression", results)
+
+    assert [(r.get("rank"), r["model_name"]) for r in board] == [(1, "c"), (2, "a"), (None, "b")]
+
+
+def test_candidates_share_one_memory_mapped_split(tmp_path):
+    X = np.arange(40, dtype=np.float32).reshape(20, 2)
+    y = np.arange(20, dtype=np.float32)
+
+    sizes = build_shared_split("regression", X, y, 25, str(tmp_path))
+    X_train, X_test, y_train, y_test = load_shared_split(str(tmp_path))
+
+    assert sizes == {"X_train": 15, "X_test": 5, "y_train": 15, "y_test": 5}
+    assert isinstance(X_train, np.memmap) and not X_train.flags.writeable
+    assert sorted(np.concatenate([y_train, y_test]).tolist()) == y.tolist()
+
+
+def test_compare_trains_every_model_on_one_split(client, upload):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"a": rng.normal(size=120), "b": rng.normal(size=120)})
+    df["y"] = 3 * df["a"] + rng.normal(scale=0.1, size=120)
+    dataset_id = upload(df)
+    names = ["Linear Regression", "Lasso Regression", "Decision Tree Regression"]
+
+    response = client.post("/train/compare", json={
+        "task": "regression", "dataset_id": dataset_id, "target_variable": "y",
+        "test_percentage": 25, "model_names": names,
+    })
+    assert response.status_code == 200, response.text
+    board = wait_for_leaderboard(client, response.json()["job_id"])
+
+    assert board["status"] == "done", board
+    assert board["pending"] == []
+    assert board["split"]["X_test"] == 30
+    ranked = board["leaderboard"]
+    assert sorted(r["model_name"] for r in ranked) == sorted(names)
+    scores = [r["metrics"]["r2_score"] for r in ranked]
+    assert scores == sorted(scores, reverse=True)
+    assert all(r["model_id"] for r in ranked)
+
+
+def test_compare_rejects_unknown_models(client):
+    response = client.post("/train/compare", json={
+        "task": "regression", "dataset_id": "0" * 24, "target_variable": "y",
+        "test_percentage": 25, "model_names": ["Linear Regression", "Magic"],
+    })
+
+    assert response.status_code == 400
+    assert "Magic" in response.json()["detail"]
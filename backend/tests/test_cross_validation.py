@@ -0,0 +1,14 @@
+import numpy as np
+from training.cross_validation import assign_folds
+
+
+def test_fold_ids_hold_more_than_127_folds():
+    folds = assign_folds(np.arange(600), 300, stratified=False)
+
+    assert folds.min() == 0
+    assert folds.max() == 299
+    assert np.array_equal(np.bincount(folds), np.full(300, 2))
+
+
+def test_small_k_keeps_one_byte_per_row():
+    assert assign_folds(np.arange(50), 5, stratified=False).itemsize == 1
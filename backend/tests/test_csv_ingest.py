@@ -0,0 +1,61 @@
+import io
+import pytest
+from db import blob_store, datasets, db, fs
+from storage import csv_ingest
+
+
+class RecordingReader(io.BytesIO):
+    # remembers how much the ingest asked for at a time
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.sizes = []
+
+    def read(self, size=-1):
+        self.sizes.append(size)
+        return super().read(size)
+
+
+def csv_bytes(rows: int) -> bytes:
+    lines = ["id,note"] + [f'{i},"line {i}\nstill {i}"' for i in range(rows)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def test_the_upload_is_stored_as_is_while_rows_are_counted():
+    data = csv_bytes(2000)
+    source = RecordingReader(data)
+
+    file_id, preview, rows = csv_ingest.ingest_csv(blob_store, source, "notes.csv")
+
+    assert fs.get(file_id).read() == data
+    # quoted newlines don't start a row
+    assert rows == 2001
+    assert preview[0] == ["id", "note"] and preview[1] == ["0", "line 0\nstill 0"]
+    assert len(preview) == csv_ingest.PREVIEW_ROWS
+    # read a piece at a time, never the whole file
+    assert len(source.sizes) > 1 and 0 < max(source.sizes) < len(data)
+
+
+def test_a_file_that_isnt_utf8_leaves_nothing_behind():
+    with pytest.raises(UnicodeDecodeError):
+        csv_ingest.ingest_csv(blob_store, io.BytesIO(b"a,b\n1,\xff\xfe\n"), "bad.csv")
+
+    assert db["fs.files"].count_documents({}) == 0
+
+
+def test_upload_rejects_empty_and_non_utf8_files(client):
+    for content in (b"", b"a\n\xff\n"):
+        response = client.post("/dataset/upload", files={"file": ("bad.csv", content, "text/csv")})
+        assert response.status_code == 400
+    assert datasets.count_documents({}) == 0
+    assert db["fs.files"].count_documents({}) == 0
+
+
+def test_upload_records_rows_and_preview(client):
+    response = client.post("/dataset/upload", files={"file": ("notes.csv", csv_bytes(30), "text/csv")})
+
+    assert response.status_code == 200, response.text
+    doc = datasets.find_one()
+    assert doc["rows"] == 30
+    assert doc["columns"] == ["id", "note"]
+    assert response.json()["preview"] == doc["preview"]
+    assert csv_ingest.read_csv_preview(fs, doc["original_file_id"]) == doc["preview"]
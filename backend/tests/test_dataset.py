@@ -0,0 +1,43 @@
+import io
+import numpy as np
+import pandas as pd
+from db import datasets, fs
+from preprocessing.process_Dataset import summarize_dataset
+from storage.schema import downcast, file_schema
+
+
+def mixed_frame(rows: int = 3000) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "count": rng.integers(0, 500, size=rows),
+        "score": rng.normal(size=rows),
+        "city": rng.choice(["Oslo", "Lima", "Pune"], size=rows),
+        "flag": rng.random(rows) < 0.5,
+    })
+    df["score"] = df["score"].mask(rng.random(rows) < 0.2)
+    # integers in the first chunks, gaps in the last one
+    df["count"] = df["count"].astype("float").mask(df.index > rows - 100)
+    return df
+
+
+def test_upload_summary_matches_the_whole_file(client, upload, monkeypatch):
+    monkeypatch.setattr("storage.profile.PROFILE_CHUNK_ROWS", 700)
+    df = mixed_frame()
+    dataset_id = upload(df)
+
+    doc = datasets.find_one()
+    expected_frame, expected_schema, expected_memory = downcast(pd.read_csv(io.StringIO(df.to_csv(index=False))))
+    expected = summarize_dataset(expected_frame)
+    grid_out = fs.get(doc["original_file_id"])
+
+    assert file_schema(grid_out) == expected_schema
+    assert grid_out.metadata["memory"] == expected_memory
+    assert doc["summary"]["missing_values"] == expected["missing_values"]
+
+    statistics = client.post("/dataset/process", json={"dataset_id": dataset_id}).json()["statistics"]
+    assert statistics[0] == expected["statistics"][0]
+    assert np.allclose(
+        np.array([row[1:] for row in statistics[1:]], dtype=float),
+        np.array([row[1:] for row in expected["statistics"][1:]], dtype=float),
+        rtol=1e-5, equal_nan=True,
+    )
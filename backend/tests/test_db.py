@@ -0,0 +1,68 @@
+import asyncio
+import importlib.util
+import pandas as pd
+import pymongo
+import auth
+import dataset
+import db
+import preprocess
+import train
+from storage.columnar import read_dataframe, write_dataframe
+
+
+def load_db_module(monkeypatch, **env):
+    # a private copy of db.py, the shared one stays as it is
+    for key, value in env.items():
+        monkeypatch.setenv(key, value)
+    created = []
+    real_client = pymongo.MongoClient
+    monkeypatch.setattr(pymongo, "MongoClient", lambda *args, **kwargs: created.append(kwargs) or real_client())
+    spec = importlib.util.spec_from_file_location("db_under_test", db.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module, created
+
+
+def test_pool_size_timeouts_and_read_preference_come_from_the_environment(monkeypatch):
+    _, created = load_db_module(
+        monkeypatch, MONGO_MAX_POOL_SIZE="7", MONGO_SOCKET_TIMEOUT_MS="1500", MONGO_READ_PREFERENCE="secondaryPreferred",
+    )
+
+    assert len(created) == 1
+    assert created[0]["maxPoolSize"] == 7
+    assert created[0]["socketTimeoutMS"] == 1500
+    assert created[0]["readPreference"] == "secondaryPreferred"
+
+
+def test_every_router_shares_one_client():
+    assert auth.users.database is db.db
+    assert dataset.datasets is preprocess.datasets is train.datasets is db.datasets
+    assert dataset.fs is preprocess.fs is train.fs is db.fs
+
+
+def test_the_threaded_driver_awaits_pymongo_calls():
+    collection = db.async_collection("things")
+    assert isinstance(collection, db.ThreadedCollection)
+
+    async def run():
+        inserted = await collection.insert_one({"name": "a"})
+        return await collection.find_one({"_id": inserted.inserted_id})
+
+    assert asyncio.run(run())["name"] == "a"
+
+
+def test_the_motor_driver_is_used_when_configured(monkeypatch):
+    module, _ = load_db_module(monkeypatch, MONGO_ASYNC_DRIVER="motor")
+
+    assert module.motor_enabled()
+    assert type(module.async_collection("things")).__module__.startswith("motor")
+
+
+def test_async_reads_return_the_stored_frame():
+    df = pd.DataFrame({"a": [1.0, 2.0], "b": ["x", "y"]})
+    file_id = write_dataframe(db.blob_store, df, filename="v")
+
+    read = asyncio.run(db.read_dataframe_async(file_id, ["a"]))
+
+    assert read["a"].tolist() == [1.0, 2.0]
+    assert read.equals(read_dataframe(db.fs, file_id, ["a"]))
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from db import blob_store, fs
+from preprocessing.encoding import one_hot_encode_text
+from storage import columnar
+from storage.columnar import sparse_columns
+from training.train_classification import prepare_classification_data
+
+
+def id_frame(rows: int = 2000) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "user": [f"u{i}" for i in range(rows)],
+        "city": rng.choice(["Oslo", "Lima", "Pune"], size=rows, p=[0.6, 0.399, 0.001]),
+        "x": rng.normal(size=rows),
+        "label": rng.integers(0, 2, size=rows),
+    })
+
+
+def encode(df: pd.DataFrame, **limits) -> pd.DataFrame:
+    encoded, _, _, _ = one_hot_encode_text(df, "label", **limits)
+    return encoded
+
+
+def test_one_hot_columns_stay_sparse():
+    encoded = encode(id_frame())
+
+    assert len(sparse_columns(encoded)) == 1999 + 2
+    assert encoded["x"].dtype == np.float64
+    # one stored value per row and encoded column group, at most
+    assert encoded[sparse_columns(encoded)].sparse.density < 0.01
+
+
+def test_cardinality_limits_bound_the_width():
+    capped = encode(id_frame(), max_categories=10)
+    frequent = encode(id_frame(), min_frequency=0.01)
+
+    assert len(sparse_columns(capped)) <= 2 * 10
+    # every user is rare, so are Pune's couple of rows
+    assert len(sparse_columns(frequent)) == 2
+
+
+def test_hashing_keeps_a_fixed_width():
+    small = encode(id_frame(200), hash_features=32)
+    large = encode(id_frame(), hash_features=32)
+
+    assert sparse_columns(small) == sparse_columns(large) == [f"hash_{i}" for i in range(32)]
+
+
+def test_sparse_versions_round_trip_through_npz():
+    encoded = encode(id_frame(), max_categories=50)
+    file_id = columnar.write_dataframe(blob_store, encoded, filename="encoded")
+
+    assert fs.get(file_id).metadata["format"] == columnar.SPARSE_FORMAT
+    read = columnar.sparse_buffer_to_dataframe(fs.get(file_id).read())
+    assert list(read.columns) == list(encoded.columns)
+    assert sparse_columns(read) == sparse_columns(encoded)
+    cols = sparse_columns(encoded)
+    assert (read[cols].sparse.to_coo() != encoded[cols].sparse.to_coo()).nnz == 0
+    assert np.allclose(read["x"], encoded["x"])
+
+
+def test_training_gets_the_encoded_columns_as_csr():
+    X, y = prepare_classification_data(encode(id_frame(), max_categories=50), "label")
+
+    assert sp.isspmatrix_csr(X)
+    assert X.shape[0] == len(y)
@@ -0,0 +1,83 @@
+import asyncio
+import contextvars
+import threading
+import time
+import pytest
+from execution import BoundedPool, LoopLagMonitor, PoolFull, run_cpu
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def test_cpu_work_runs_off_the_loop_and_keeps_the_request_context():
+    def work():
+        return threading.current_thread() is threading.main_thread(), request_id.get()
+
+    async def run():
+        request_id.set("r1")
+        return await run_cpu(work)
+
+    on_loop_thread, seen = asyncio.run(run())
+
+    assert not on_loop_thread
+    assert seen == "r1"
+
+
+def test_the_loop_keeps_ticking_while_cpu_work_runs():
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        await run_cpu(time.sleep, 0.3)
+        ticker.cancel()
+        return ticks
+
+    assert asyncio.run(run()) >= 10
+
+
+def test_blocking_the_loop_shows_up_as_lag():
+    async def run():
+        monitor = LoopLagMonitor(interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.2)
+        await asyncio.sleep(0.05)
+        monitor.stop()
+        return monitor.stats()
+
+    stats = asyncio.run(run())
+
+    assert stats["samples"] > 0
+    assert stats["max"] >= 0.15
+
+
+def test_a_bounded_pool_turns_work_away_once_full():
+    release = threading.Event()
+
+    async def run():
+        pool = BoundedPool("test", workers=1, max_pending=1)
+        running = [asyncio.create_task(pool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(PoolFull):
+            await pool.run(release.wait)
+        release.set()
+        await asyncio.gather(*running)
+        pool.shutdown()
+        return pool.stats()
+
+    stats = asyncio.run(run())
+
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+
+
+def test_loop_lag_is_reported(client):
+    response = client.get("/health/loop")
+
+    assert response.status_code == 200
+    assert "interval" in response.json()
@@ -0,0 +1,83 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from training.feature_cache import FeatureCache
+
+
+def frame(rows: int = 50) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"a": rng.normal(size=rows), "b": rng.integers(0, 5, size=rows)})
+    df["label"] = (df["a"] > 0).astype(float)
+    df["y"] = 3 * df["a"] + df["b"]
+    return df
+
+
+def loader(df: pd.DataFrame, calls: list):
+    def load_frame():
+        calls.append(1)
+        return df
+    return load_frame
+
+
+def test_a_second_load_is_a_memory_mapped_hit(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    calls = []
+
+    built = cache.load("regression", "v1", "y", loader(frame(), calls))
+    cached = cache.load("regression", "v1", "y", loader(frame(), calls))
+
+    assert len(calls) == 1
+    assert not built[3]["cached"] and cached[3]["cached"]
+    assert isinstance(cached[0], np.memmap)
+    assert np.array_equal(built[0], cached[0]) and np.array_equal(built[1], cached[1])
+    assert cached[2] == ["a", "b", "label"]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+@pytest.mark.parametrize("task, target, dtype", [
+    ("regression", "y", np.float32),
+    ("classification", "label", np.int64),
+])
+def test_features_and_targets_are_contiguous_and_typed(tmp_path, task, target, dtype):
+    cache = FeatureCache(str(tmp_path))
+    for _ in range(2):
+        X, y, _, _ = cache.load(task, "v1", target, loader(frame(), []))
+
+        assert X.dtype == np.float32 and X.flags["C_CONTIGUOUS"]
+        assert y.dtype == dtype and y.flags["C_CONTIGUOUS"]
+
+
+def test_a_new_version_or_target_is_built_again(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    calls = []
+
+    cache.load("regression", "v1", "y", loader(frame(), calls))
+    cache.load("regression", "v2", "y", loader(frame(), calls))
+    cache.load("regression", "v1", "a", loader(frame(), calls))
+
+    assert len(calls) == 3
+    assert cache.stats()["entries"] == 3
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    for used, version in enumerate(("v1", "v2")):
+        cache.load("regression", version, "y", loader(frame(), []))
+        os.utime(cache.paths("regression", version, "y")["json"], (used, used))
+    # v1 is used again, so v2 is now the oldest
+    cache.load("regression", "v1", "y", loader(frame(), []))
+    cache.max_bytes = cache.stats()["bytes"]
+
+    cache.load("regression", "v3", "y", loader(frame(), []))
+
+    assert not os.path.exists(cache.paths("regression", "v2", "y")["json"])
+    assert os.path.exists(cache.paths("regression", "v1", "y")["json"])
+    assert os.path.exists(cache.paths("regression", "v3", "y")["json"])
+
+
+def test_non_numeric_regression_targets_are_rejected(tmp_path):
+    df = frame().assign(y="high")
+
+    with pytest.raises(ValueError, match="numeric"):
+        FeatureCache(str(tmp_path)).load("regression", "v1", "y", loader(df, []))
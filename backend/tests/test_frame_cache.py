@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+from storage.frame_cache import FrameCache, frame_nbytes
+
+
+def frame(n: int = 100) -> pd.DataFrame:
+    x = np.arange(n, dtype=np.float64)
+    x[1] = np.nan
+    return pd.DataFrame({
+        "x": x,
+        "n": pd.array(np.arange(n), dtype="Int64"),
+        "city": pd.Categorical(["paris", "rome"] * (n // 2)),
+    })
+
+
+def test_frames_past_the_byte_budget_evict_the_least_recently_used():
+    nbytes = frame_nbytes(frame())
+    cache = FrameCache(2 * nbytes)
+    cache.put("a", frame())
+    cache.put("b", frame())
+    cache.get("a")
+
+    cache.put("c", frame())
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["bytes"] == 2 * nbytes
+    assert cache.stats()["evictions"] == 1
+
+
+def test_a_frame_larger_than_the_budget_is_not_cached():
+    cache = FrameCache(frame_nbytes(frame()) - 1)
+    cache.put("a", frame())
+
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_concurrent_loads_of_a_key_share_one_loader():
+    cache = FrameCache(1 << 20)
+    calls = []
+
+    def load():
+        calls.append(1)
+        return frame()
+
+    first = cache.get_or_load("a", load)
+    second = cache.get_or_load("a", load)
+
+    assert len(calls) == 1
+    assert first.equals(second)
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+@pytest.mark.parametrize("edit", [
+    lambda df: df.loc.__setitem__((0, "x"), -1.0),
+    lambda df: df.iloc.__setitem__((0, 1), -1),
+    lambda df: df.interpolate(inplace=True),
+    lambda df: df["x"].to_numpy().__setitem__(0, -1.0),
+])
+def test_in_place_edits_cannot_reach_the_cached_frame(edit):
+    cache = FrameCache(1 << 20)
+    cache.put("a", frame())
+    df = cache.get("a")
+
+    with pytest.raises(ValueError, match="read-only"):
+        edit(df)
+
+    assert cache.get("a").equals(frame())
+
+
+def test_replacing_columns_leaves_the_cached_frame_alone():
+    cache = FrameCache(1 << 20)
+    cache.put("a", frame())
+    df = cache.get("a")
+
+    df["x"] = df["x"] * 2
+    df["new"] = 1
+    df.fillna({"x": 0}, inplace=True)
+    df = df.drop(columns=["city"])
+    edited = cache.get("a").copy()
+    edited.loc[0, "x"] = -1.0
+
+    assert cache.get("a").equals(frame())
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+from sklearn.impute import SimpleImputer
+from preprocessing import imputation
+from preprocessing.imputation import fit_imputation
+from preprocessing.missing_Values import handle_missing_values
+from preprocessing.transformers import apply_fills
+
+
+def correlated_frame(rows: int = 300) -> pd.DataFrame:
+    # b is a copy of a, so a model-based imputer can recover its gaps
+    rng = np.random.default_rng(0)
+    a = rng.normal(size=rows)
+    df = pd.DataFrame({
+        "a": a,
+        "b": a * 2.0,
+        "c": rng.choice(["x", "y", "z"], size=rows, p=[0.5, 0.3, 0.2]),
+        "label": rng.integers(0, 2, size=rows),
+    })
+    df.loc[::7, "b"] = np.nan
+    df.loc[::11, "c"] = None
+    return df
+
+
+def test_vectorized_fills_match_simple_imputer():
+    X = correlated_frame().drop(columns=["label"])
+
+    fills, imputers, imputed = fit_imputation(X, ["b", "c"])
+
+    assert imputers == [] and imputed is None
+    assert np.isclose(fills["b"], SimpleImputer(strategy="mean").fit(X[["b"]]).statistics_[0])
+    assert fills["c"] == SimpleImputer(strategy="most_frequent").fit(X[["c"]]).statistics_[0]
+    # columns without gaps get a fill too, for new data
+    assert "a" in fills
+
+
+def test_fills_go_in_per_dtype_block():
+    X = pd.DataFrame({"f": [1.0, np.nan], "g": np.array([np.nan, 2.0], dtype=np.float32), "s": ["a", None]})
+
+    filled = apply_fills(X, {"f": 9.0, "g": 8.0, "s": "z"})
+
+    assert filled["f"].tolist() == [1.0, 9.0]
+    assert filled["g"].dtype == np.float32 and filled["g"].tolist() == [8.0, 2.0]
+    assert filled["s"].tolist() == ["a", "z"]
+
+
+def test_knn_and_iterative_recover_correlated_gaps():
+    df = correlated_frame()
+    gaps = df["b"].isna()
+    truth = df.loc[gaps, "a"] * 2.0
+
+    errors = {}
+    for strategy in ("simple", "knn", "iterative"):
+        processed, _, _, fitted = handle_missing_values(df, "label", "classification", strategy)
+        assert not processed.isna().any().any()
+        errors[strategy] = np.abs(processed.loc[gaps, "b"] - truth).mean()
+        assert fitted.describe()["model_imputed"] == ([] if strategy == "simple" else ["b"])
+
+    assert errors["knn"] < errors["simple"] / 2
+    assert errors["iterative"] < errors["simple"] / 2
+
+
+def test_fitted_imputers_replay_on_new_rows():
+    df = correlated_frame()
+    _, _, _, fitted = handle_missing_values(df, "label", "classification", "iterative")
+    new = pd.DataFrame({"a": [1.0, -2.0], "b": [np.nan, np.nan], "c": [None, "y"]})
+
+    out = fitted.transform(new)
+
+    assert np.allclose(out["b"], [2.0, -4.0], atol=0.2)
+    assert out["c"].notna().all()
+
+
+def test_columns_past_the_time_budget_keep_their_means(monkeypatch):
+    monkeypatch.setattr(imputation, "IMPUTE_BLOCK_COLUMNS", 1)
+    df = correlated_frame()
+    df.loc[::5, "a"] = np.nan
+
+    processed, _, changes, fitted = handle_missing_values(df, "label", "classification", "knn", time_budget=0)
+
+    assert fitted.imputers == []
+    assert not processed.isna().any().any()
+    assert any("time budget ran out" in change for change in changes)
+
+
+def test_unknown_strategies_are_rejected():
+    result = handle_missing_values(correlated_frame(), "label", "classification", "magic")
+
+    assert result == {"error": "Unknown imputation strategy 'magic'"}
+
+
+def test_the_endpoint_takes_a_strategy(client, upload):
+    dataset_id = upload(correlated_frame())
+    response = client.post("/preprocessing/missing/handle", json={
+        "dataset_id": dataset_id, "target_variable": "label", "task": "classification", "strategy": "knn",
+    })
+    assert response.status_code == 200, response.text
+    assert any("Imputed 'b'" in change for change in response.json()["changes"])
@@ -0,0 +1,48 @@
+import time
+from datetime import datetime, timedelta, timezone
+from db import db
+from training.jobs import DONE, FAILED, QUEUED, RUNNING, JobQueue
+
+
+def job(job_id: str, status: str, owner: str, heartbeat_age: float | None) -> dict:
+    doc = {"_id": job_id, "status": status, "owner": owner}
+    if heartbeat_age is not None:
+        doc["heartbeat_at"] = datetime.now(timezone.utc) - timedelta(seconds=heartbeat_age)
+    return doc
+
+
+def test_jobs_orphaned_by_a_restart_are_failed():
+    collection = db["jobs_test"]
+    queue = JobQueue(collection, workers=1, executor="thread")
+    collection.insert_many([
+        job("crashed", RUNNING, "old-worker", heartbeat_age=600),
+        job("never-stamped", QUEUED, "old-worker", heartbeat_age=None),
+        job("alive", RUNNING, "other-worker", heartbeat_age=5),
+        job("mine", RUNNING, queue.owner, heartbeat_age=600),
+        job("finished", DONE, "old-worker", heartbeat_age=600),
+    ])
+
+    assert queue.fail_stale(stale_seconds=120) == 2
+
+    status = {doc["_id"]: doc["status"] for doc in collection.find()}
+    assert status == {"crashed": FAILED, "never-stamped": FAILED, "alive": RUNNING, "mine": RUNNING, "finished": DONE}
+    assert "submit it again" in collection.find_one({"_id": "crashed"})["error"]
+
+
+def test_the_heartbeat_keeps_live_jobs_fresh_and_fails_orphans(monkeypatch):
+    monkeypatch.setattr("training.jobs.JOB_HEARTBEAT_SECONDS", 0.01)
+    collection = db["jobs_test"]
+    queue = JobQueue(collection, workers=1, executor="thread")
+    collection.insert_many([
+        job("mine", RUNNING, queue.owner, heartbeat_age=600),
+        job("crashed", RUNNING, "old-worker", heartbeat_age=600),
+    ])
+
+    queue.start_heartbeat()
+    time.sleep(0.1)
+    queue.shutdown()
+
+    mine = collection.find_one({"_id": "mine"})
+    assert mine["status"] == RUNNING
+    assert datetime.now(timezone.utc) - mine["heartbeat_at"].replace(tzinfo=timezone.utc) < timedelta(seconds=5)
+    assert collection.find_one({"_id": "crashed"})["status"] == FAILED
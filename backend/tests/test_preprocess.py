@@ -0,0 +1,28 @@
+import asyncio
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+import preprocess
+from db import datasets, fs
+
+
+def test_a_step_fitted_on_a_stale_pipeline_is_rejected(client, upload):
+    rng = np.random.default_rng(0)
+    dataset_id = upload(pd.DataFrame({"a": rng.normal(size=50), "label": rng.integers(0, 2, size=50)}))
+    stale = datasets.find_one()
+
+    response = client.post("/preprocessing/scaling", json={"dataset_id": dataset_id, "target_variable": "label"})
+    assert response.status_code == 200, response.text
+
+    # a second step that was fitted on the document from before the first
+    _, _, _, plan, _ = asyncio.run(preprocess.run_pipeline_step(
+        stale, "scaling", {"method": "minmax", "target_variable": "label"}
+    ))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(preprocess.save_pipeline_step(stale, plan, {}))
+
+    assert error.value.status_code == 409
+    steps = datasets.find_one()["pipeline"]["steps"]
+    assert [step["params"]["method"] for step in steps] == ["standard"]
+    assert not fs.exists(plan["steps"][-1]["transform_file_id"])
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+from bson import ObjectId
+import train
+from db import datasets, fs, models_collection
+
+
+def regression_frame(rows: int = 400) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"a": rng.normal(size=rows), "b": rng.normal(size=rows)})
+    df["y"] = 2 * df["a"] - df["b"]
+    return df
+
+
+def preliminary_fit(client, upload, monkeypatch) -> dict:
+    # the full-fit job's params, the job itself is run by the test
+    submitted = {}
+
+    def submit(kind, fn, params, dataset_id=None):
+        submitted.update(params)
+        return "progressive-job"
+
+    monkeypatch.setattr(train.job_queue, "submit", submit)
+    response = client.post("/train/progressive", json={
+        "task": "regression", "dataset_id": upload(regression_frame()), "model_name": "Linear Regression",
+        "target_variable": "y", "test_percentage": 20, "fractions": [0.5],
+    })
+    assert response.status_code == 200, response.text
+    assert response.json()["job_id"] == "progressive-job"
+    return submitted
+
+
+def test_the_full_fit_replaces_the_preliminary_model(client, upload, monkeypatch):
+    params = preliminary_fit(client, upload, monkeypatch)
+    preliminary = models_collection.find_one({"_id": ObjectId(params["model_id"])})
+    assert preliminary["progressive"]["status"] == "preliminary"
+
+    result = train.run_progressive_job("progressive-job", params)
+
+    final = models_collection.find_one({"_id": ObjectId(params["model_id"])})
+    assert result["model_id"] == params["model_id"]
+    assert final["progressive"]["status"] == "final"
+    assert final["file_id"] != preliminary["file_id"]
+    assert not fs.exists(preliminary["file_id"])
+
+    response = client.post("/train/predict", json={"model_id": params["model_id"], "rows": [[1.0, 1.0]]})
+    assert response.status_code == 200, response.text
+    assert abs(response.json()["predictions"][0] - 1.0) < 1e-6
+
+
+def test_the_full_fit_trains_on_the_version_the_preliminary_fit_used(client, upload, monkeypatch):
+    params = preliminary_fit(client, upload, monkeypatch)
+    response = client.post("/preprocessing/scaling", json={"dataset_id": params["dataset_id"], "method": "standard"})
+    assert response.status_code == 200, response.text
+
+    train.run_progressive_job("progressive-job", params)
+
+    # the pending step was neither written out nor trained on
+    doc = datasets.find_one({"_id": ObjectId(params["dataset_id"])})
+    assert train.current_plan(doc)["steps"]
+    final = models_collection.find_one({"_id": ObjectId(params["model_id"])})
+    assert final["feature_columns"] == ["a", "b"]
+    assert final["progressive"]["status"] == "final"
+
+
+def test_the_full_fit_fails_when_the_features_differ(client, upload, monkeypatch):
+    params = preliminary_fit(client, upload, monkeypatch)
+    params["feature_columns"] = ["a"]
+
+    with pytest.raises(ValueError, match="changed"):
+        train.run_progressive_job("progressive-job", params)
+
+    doc = models_collection.find_one({"_id": ObjectId(params["model_id"])})
+    assert doc["progressive"]["status"] == "failed"
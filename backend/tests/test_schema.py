@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+from db import fs, datasets
+from storage.columnar import read_dataframe
+from storage.schema import FLOAT32_MAX, column_dtype, downcast, float_dtype, integer_range_dtype
+
+
+@pytest.mark.parametrize("low, high, dtype", [
+    (-128, 127, "int8"),
+    (0, 128, "int16"),
+    (-129, 0, "int16"),
+    (-32768, 32767, "int16"),
+    (0, 32768, "int32"),
+    (-2 ** 31, 2 ** 31 - 1, "int32"),
+    (0, 2 ** 31, "int64"),
+])
+def test_integers_take_the_narrowest_type_that_holds_their_range(low, high, dtype):
+    assert integer_range_dtype(low, high) == dtype
+
+
+def test_floats_stay_float64_only_past_the_float32_range():
+    assert float_dtype(0.0) == "float32"
+    assert float_dtype(float(FLOAT32_MAX)) == "float32"
+    assert float_dtype(1e39) == "float64"
+    # infinities don't count towards the range
+    assert column_dtype(pd.Series([1.0, np.inf, np.nan])) == "float32"
+
+
+def test_repeated_strings_become_categories():
+    rows = 100
+    assert column_dtype(pd.Series(["a", "b"] * (rows // 2))) == "category"
+    assert column_dtype(pd.Series([f"id{i}" for i in range(rows)])) == "object"
+    assert column_dtype(pd.Series([True, False])) == "bool"
+
+
+def test_downcasting_reports_the_memory_saved():
+    df = pd.DataFrame({"n": np.arange(1000), "x": np.linspace(0, 1, 1000), "s": ["a", "b"] * 500})
+
+    small, schema, memory = downcast(df)
+
+    assert schema == {"n": "int16", "x": "float32", "s": "category"}
+    assert small.dtypes.astype(str).to_dict() == schema
+    assert memory["after_bytes"] < memory["before_bytes"] / 3
+    assert np.allclose(small["x"], df["x"])
+
+
+def test_uploads_are_read_back_with_their_stored_schema(client, upload):
+    df = pd.DataFrame({"n": np.arange(300) % 100, "x": np.linspace(0, 1, 300), "s": ["a", "b", "c"] * 100})
+    dataset_id = upload(df)
+
+    response = client.get(f"/dataset/schema/{dataset_id}")
+
+    body = response.json()
+    assert body["schema"] == {"n": "int8", "x": "float32", "s": "category"}
+    assert body["memory"]["after_bytes"] < body["memory"]["before_bytes"]
+    read = read_dataframe(fs, datasets.find_one()["original_file_id"])
+    assert read.dtypes.astype(str).to_dict() == body["schema"]
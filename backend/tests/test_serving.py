@@ -0,0 +1,165 @@
+import asyncio
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from bson import ObjectId
+import train
+from db import datasets, models_collection
+from training.serving import LoadedModel, MicroBatcher
+
+
+def loaded(file_id: str) -> LoadedModel:
+    return LoadedModel(None, "regression", ["x"], file_id=file_id)
+
+
+def test_a_failing_request_does_not_fail_its_batch():
+    async def predict(entry, blocks):
+        X = np.concatenate(blocks)
+        if np.isnan(X).any():
+            raise ValueError("Input X contains NaN")
+        return X[:, 0].tolist()
+
+    async def run():
+        batcher = MicroBatcher(predict, max_wait_ms=50)
+        entry = loaded("v1")
+        return await asyncio.gather(
+            batcher.submit("m", entry, np.array([[1.0], [2.0]])),
+            batcher.submit("m", entry, np.array([[np.nan]])),
+            batcher.submit("m", entry, np.array([[3.0]])),
+            return_exceptions=True,
+        )
+
+    good, bad, other = asyncio.run(run())
+
+    assert good == [1.0, 2.0]
+    assert other == [3.0]
+    assert isinstance(bad, ValueError)
+
+
+def test_a_reloaded_model_is_not_batched_with_the_stale_one():
+    async def predict(entry, blocks):
+        return [entry.file_id] * sum(len(block) for block in blocks)
+
+    async def run():
+        batcher = MicroBatcher(predict, max_wait_ms=50)
+        return await asyncio.gather(
+            batcher.submit("m", loaded("preliminary"), np.zeros((1, 1))),
+            batcher.submit("m", loaded("final"), np.zeros((1, 1))),
+        )
+
+    assert asyncio.run(run()) == [["preliminary"], ["final"]]
+
+
+def wait_for_job(client, job_id: str) -> dict:
+    for _ in range(200):
+        job = client.get(f"/train/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed", "cancelled"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def regression_frame(rows: int = 200) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"a": rng.normal(size=rows), "b": rng.normal(size=rows)})
+    df["y"] = 2 * df["a"] - df["b"]
+    return df
+
+
+def test_streaming_models_fill_gaps_like_they_were_trained(client, upload):
+    dataset_id = upload(regression_frame())
+    response = client.post("/train/stream", json={
+        "task": "regression", "dataset_id": dataset_id, "model_name": "SGD Regressor",
+        "target_variable": "y", "test_percentage": 20, "epochs": 1,
+    })
+    job = wait_for_job(client, response.json()["job_id"])
+    assert job["status"] == "done", job
+
+    response = client.post("/train/predict", json={"model_id": job["result"]["model_id"], "rows": [[None, 1.0]]})
+
+    assert response.status_code == 200, response.text
+
+
+def test_regression_serving_rejects_what_training_rejected(client, upload):
+    dataset_id = upload(regression_frame())
+    response = client.post("/train/train-regressor", json={
+        "dataset_id": dataset_id, "model_name": "Linear Regression", "target_variable": "y", "test_percentage": 20,
+    })
+    assert response.status_code == 200, response.text
+
+    response = client.post("/train/predict", json={"model_id": response.json()["model_id"], "rows": [["x", 1.0]]})
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("epochs", [0, -1, 10_000])
+def test_streaming_epochs_are_bounded(client, epochs):
+    response = client.post("/train/stream", json={
+        "task": "regression", "dataset_id": "0" * 24, "model_name": "SGD Regressor",
+        "target_variable": "y", "test_percentage": 20, "epochs": epochs,
+    })
+
+    assert response.status_code == 422
+
+
+def labelled_frame(rows: int = 200) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"a": rng.normal(size=rows), "b": rng.normal(size=rows)})
+    df["label"] = np.where(df["a"] > 0, "yes", "no")
+    df["flag"] = (df["b"] > 0).astype(int)
+    return df
+
+
+def train_classifier(client, dataset_id: str, target: str) -> dict:
+    response = client.post("/train/train-classifier", json={
+        "dataset_id": dataset_id, "model_name": "Logistic Regression", "target_variable": target, "test_percentage": 20,
+    })
+    assert response.status_code == 200, response.text
+    return models_collection.find_one({"_id": ObjectId(response.json()["model_id"])})
+
+
+def test_only_the_encoded_target_is_decoded(client, upload):
+    dataset_id = upload(labelled_frame())
+    response = client.post("/preprocessing/encoding", json={"dataset_id": dataset_id, "target_variable": "label"})
+    assert response.status_code == 200, response.text
+
+    labelled = train_classifier(client, dataset_id, "label")
+    flagged = train_classifier(client, dataset_id, "flag")
+
+    assert labelled["label_encoder_file_id"] is not None
+    assert flagged["label_encoder_file_id"] is None
+    response = client.post("/train/predict", json={"model_id": str(labelled["_id"]), "rows": [[2.0, 0.0, 0]]})
+    assert response.json()["predictions"] == ["yes"]
+    response = client.post("/train/predict", json={"model_id": str(flagged["_id"]), "rows": [[0.0, 2.0, 1]]})
+    assert response.json()["predictions"] == [1]
+
+
+def test_restoring_the_original_drops_the_label_encoder(client, upload):
+    dataset_id = upload(labelled_frame())
+    client.post("/preprocessing/encoding", json={"dataset_id": dataset_id, "target_variable": "label"})
+    train_classifier(client, dataset_id, "label")
+
+    response = client.get(f"/dataset/restore/{dataset_id}")
+    assert response.status_code == 200, response.text
+
+    doc = datasets.find_one({"_id": ObjectId(dataset_id)})
+    assert "label_encoder_file_id" not in doc and "label_encoder_target" not in doc
+    assert train_classifier(client, dataset_id, "flag")["label_encoder_file_id"] is None
+
+
+def test_streaming_refuses_steps_that_were_never_written_out(client, upload):
+    dataset_id = upload(regression_frame())
+    client.post("/preprocessing/scaling", json={"dataset_id": dataset_id, "method": "standard"})
+    params = {
+        "task": "regression", "dataset_id": dataset_id, "model_name": "SGD Regressor",
+        "target_variable": "y", "test_percentage": 20, "epochs": 1,
+    }
+
+    response = client.post("/train/stream", json=params)
+    assert response.status_code == 409
+    with pytest.raises(ValueError, match="written out"):
+        train.run_streaming_job("stream-job", params)
+
+    # the plan is left pending, not replayed in memory
+    assert datasets.find_one({"_id": ObjectId(dataset_id)})["pipeline"]["steps"]
@@ -0,0 +1,70 @@
+import io
+import time
+import pandas as pd
+import telemetry
+from telemetry import Metrics, TimedReader, server_timing, span
+
+
+def test_nested_spans_are_timed_separately_and_excluded_time_is_dropped():
+    with span("outer", rows=10) as outer:
+        with span("inner"):
+            time.sleep(0.02)
+        outer.exclude(0.5)
+
+    assert outer.seconds == 0.0
+    assert outer.attrs == {"rows": 10}
+    assert "nocode_stage_seconds_count{stage=\"inner\"} 1" in telemetry.metrics.render()
+
+
+def test_histograms_count_every_bucket_a_value_fits():
+    metrics = Metrics()
+    metrics.observe_request("GET", "/things/{id}", 200, 0.03)
+    metrics.observe_request("GET", "/things/{id}", 200, 2.0)
+    metrics.add_collector("pool", lambda: {"queued": 3, "name": "ignored", "enabled": True})
+
+    text = metrics.render()
+
+    labels = 'method="GET",route="/things/{id}",status="200"'
+    assert f'nocode_http_request_seconds_bucket{{{labels},le="0.025"}} 0' in text
+    assert f'nocode_http_request_seconds_bucket{{{labels},le="0.05"}} 1' in text
+    assert f'nocode_http_request_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f"nocode_http_request_seconds_count{{{labels}}} 2" in text
+    assert "nocode_pool_queued 3" in text
+    assert "nocode_pool_name" not in text and "nocode_pool_enabled" not in text
+
+
+def test_server_timing_lists_each_span_and_the_total():
+    s = telemetry.Span("csv scan", {"rows": 5, "skipped": None})
+    s.seconds = 0.0125
+
+    header = server_timing([s], 0.02)
+
+    assert header == 'csv_scan;dur=12.50;desc="rows=5", total;dur=20.00'
+
+
+def test_timed_reads_count_the_bytes():
+    reader = TimedReader(io.BytesIO(b"abcdef"))
+
+    assert reader.read(4) == b"abcd"
+    assert reader.read() == b"ef"
+    assert reader.bytes == 6
+
+
+def test_requests_get_a_server_timing_header_and_route_metrics(client, upload, monkeypatch):
+    monkeypatch.setattr(telemetry, "SERVER_TIMING", True)
+    files = {"file": ("data.csv", pd.DataFrame({"a": [1, 2, 3]}).to_csv(index=False).encode(), "text/csv")}
+
+    response = client.post("/dataset/upload", files=files)
+
+    assert response.status_code == 200
+    names = [entry.split(";")[0] for entry in response.headers["Server-Timing"].split(", ")]
+    assert {"csv_scan", "upload_read", "total"} <= set(names)
+
+    client.get(f"/dataset/schema/{response.json()['dataset_id']}")
+    text = client.get("/metrics").text
+    assert 'route="/dataset/schema/{dataset_id}"' in text
+    assert response.json()["dataset_id"] not in text
+
+
+def test_the_header_is_off_by_default(client):
+    assert "Server-Timing" not in client.get("/metrics").headers
@@ -0,0 +1,54 @@
+import io
+import numpy as np
+import pandas as pd
+import preprocess
+
+
+def training_frame(rows: int = 60) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "width": rng.normal(size=rows).round(3),
+        "color": rng.choice(["red", "green", "blue"], size=rows),
+        "label": rng.integers(0, 2, size=rows),
+    })
+    df.loc[::7, "width"] = np.nan
+    df.loc[::9, "color"] = np.nan
+    return df
+
+
+def fit_pipeline(client, upload) -> str:
+    dataset_id = upload(training_frame())
+    for path, body in [("missing/handle", {"task": "classification"}), ("encoding", {})]:
+        response = client.post(f"/preprocessing/{path}", json={"dataset_id": dataset_id, "target_variable": "label", **body})
+        assert response.status_code == 200, response.text
+    return dataset_id
+
+
+def apply(client, dataset_id: str, df: pd.DataFrame):
+    files = {"file": ("new.csv", df.to_csv(index=False).encode(), "text/csv")}
+    return client.post(f"/preprocessing/transform/{dataset_id}", files=files)
+
+
+def test_categorical_gaps_take_the_fill_value_missing_from_the_chunk(client, upload, monkeypatch):
+    dataset_id = fit_pipeline(client, upload)
+    monkeypatch.setattr(preprocess, "TRANSFORM_CHUNK_ROWS", 2)
+    new = pd.DataFrame({
+        # all-NaN chunk, then an unseen category next to a gap
+        "width": [0.1, 0.2, 0.3, 0.4],
+        "color": [np.nan, np.nan, "purple", np.nan],
+    })
+
+    response = apply(client, dataset_id, new)
+
+    assert response.status_code == 200, response.text
+    out = pd.read_csv(io.BytesIO(response.content))
+    assert len(out) == 4
+    assert not out.isna().to_numpy().any()
+
+
+def test_untransformable_rows_are_a_bad_request(client, upload):
+    dataset_id = fit_pipeline(client, upload)
+
+    response = apply(client, dataset_id, pd.DataFrame({"color": ["red"]}))
+
+    assert response.status_code == 400
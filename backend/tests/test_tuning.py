@@ -0,0 +1,21 @@
+import pytest
+from training.tuning import halving_schedule
+
+
+@pytest.mark.parametrize("n_candidates, factor, rungs", [
+    (1, 3, 1), (2, 3, 1), (3, 3, 2), (8, 2, 4), (26, 3, 3), (27, 3, 4), (243, 3, 6), (1000, 10, 4), (999, 10, 3),
+])
+def test_one_rung_per_power_of_factor(n_candidates, factor, rungs):
+    assert len(halving_schedule(n_candidates, 100000, factor, min_samples=1)) == rungs
+
+
+def test_survivors_shrink_and_rows_grow_by_factor():
+    schedule = halving_schedule(27, 8100, 3, min_samples=10)
+
+    assert schedule == [(27, 300), (9, 900), (3, 2700), (1, 8100)]
+
+
+def test_rows_never_drop_below_min_samples():
+    schedule = halving_schedule(81, 1000, 3, min_samples=50)
+
+    assert [rows for _, rows in schedule] == [50, 50, 111, 333, 1000]
@@ -1,47 +1,74 @@
 # routes_classifier.py
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, conint
 from bson import ObjectId
-import pandas as pd
-from gridfs import GridFS
-from pymongo import MongoClient
 import io
 import joblib
 import os
+import tempfile
+import time
+from joblib import Parallel, delayed
+from typing import Any, List
 from datetime import datetime, timezone
-from training.train_classification import train_classifier_model
-from training.train_regression import train_regression_model
+from training.jobs import JobQueue, QueueFull, report_progress, check_cancelled
+from training.compare import TASKS, COMPARE_WORKERS, build_shared_split, fit_candidate, fit_features, rank_results
+from training.feature_cache import FeatureCache
+from training.features import FEATURE_CONVERSIONS
+from training.tuning import (
+    SEARCH_SPACES, TUNE_WORKERS, sample_candidates, halving_schedule, fit_size, fit_trial, select_survivors
+)
+from training.streaming import STREAMING_MODELS, STREAM_EPOCHS, STREAM_MAX_EPOCHS, train_streaming_model
+from training.progressive import PROGRESSIVE_FRACTIONS, progressive_estimates
+from training.artifacts import store_model_artifact, load_model_artifact, discard_cached_artifact
+from training.serving import (
+    MODEL_CACHE_MB, LoadedModel, ModelCache, MicroBatcher, LatencyTracker, request_features,
+    predict_features
+)
+from execution import run_io
+from preprocessing.pipeline import current_plan, materialize
+from storage.columnar import read_dataframe, stored_columns
+from training.cross_validation import FoldCache, cross_validate
+from db import datasets, fs, models_collection, blob_store, jobs_collection, folds_collection
 
 router = APIRouter()
 
-MONGO_URL = os.getenv("MONGO_URL")
-client = MongoClient(MONGO_URL)
-db = client["nocode_ml"]
-datasets = db["datasets"]
-fs = GridFS(db)
-models_collection = db["models"]
+job_queue = JobQueue(jobs_collection)
+model_cache = ModelCache(MODEL_CACHE_MB * 1024 * 1024)
+latency = LatencyTracker()
+fold_cache = FoldCache(folds_collection, blob_store, fs)
+
+feature_cache = FeatureCache()
 
 class ClassificationTrainRequest(BaseModel):
     dataset_id: str
     model_name: str
     target_variable: str
     test_percentage: float
+    cv_folds: int | None = None
 
 class ClassificationTrainResponse(BaseModel):
     message: str
     metrics: dict
     model_info: dict
+    model_id: str | None = None
+    cross_validation: dict | None = None
+    feature_matrix: dict | None = None
 
-def load_latest_dataset(dataset_id: str) -> pd.DataFrame:
-    doc = datasets.find_one({"_id": ObjectId(dataset_id)})
-    if not doc:
-        raise HTTPException(404, "Dataset not found")
+def load_features(task: str, version, target_variable: str):
+    # (X, y, feature columns, build info); contiguous float32 features are
+    # built once per stored version and target, then memory-mapped
+    return feature_cache.load(task, version, target_variable, lambda: read_dataframe(fs, version))
 
-    file_id = doc.get("latest_version_file_id") or doc["original_file_id"]
-    grid_out = fs.get(file_id)
-    csv_text = grid_out.read().decode("utf-8")
 
-    return pd.read_csv(io.StringIO(csv_text))
+def cross_validate_dataset(task: str, version, X, y, model_name: str, target_variable: str, k: int) -> dict:
+    if k < 2 or k > len(y):
+        raise ValueError("cv_folds must be between 2 and the number of rows")
+
+    folds, stratified = fold_cache.get_or_create(str(version), target_variable, k, task, y)
+
+    result = cross_validate(task, model_name, X, y, folds)
+    result.update({"version": str(version), "stratified": stratified})
+    return result
 
 
 def save_model_to_mongo(model, dataset_id: str, model_name: str):
@@ -59,42 +86,82 @@ def save_model_to_mongo(model, dataset_id: str, model_name: str):
 
     return str(model_file_id)
 
+def store_trained_model(model, dataset_id: str, model_name: str, target_variable: str,
+                        test_percentage: float, metrics: dict, model_info: dict,
+                        task: str | None = None, feature_columns: list | None = None,
+                        cross_validation: dict | None = None, progressive: dict | None = None,
+                        feature_conversion: dict | None = None):
+    model_file_id, artifact = store_model_artifact(fs, model, filename=f"{dataset_id}_{model_name}")
+
+    # the model keeps its own reference to the label encoder, so predictions
+    # still decode after the dataset is re-encoded; only an encoder fitted on
+    # this target decodes its labels
+    label_encoder_file_id = None
+    if task == "classification":
+        doc = datasets.find_one(
+            {"_id": ObjectId(dataset_id)}, {"label_encoder_file_id": 1, "label_encoder_target": 1}
+        ) or {}
+        if doc.get("label_encoder_target") == target_variable:
+            label_encoder_file_id = doc.get("label_encoder_file_id")
+        if label_encoder_file_id is not None:
+            blob_store.retain(label_encoder_file_id)
+
+    result = models_collection.insert_one({
+        "dataset_id": dataset_id,
+        "model_name": model_name,
+        "file_id": model_file_id,
+        "task": task,
+        "feature_columns": feature_columns,
+        "feature_conversion": feature_conversion or FEATURE_CONVERSIONS.get(task),
+        "label_encoder_file_id": label_encoder_file_id,
+        "artifact": artifact,
+        "metrics": metrics,
+        "cross_validation": cross_validation,
+        "progressive": progressive,
+        "model_info": model_info,
+        "test_percentage": test_percentage,
+        "target_variable": target_variable,
+        "created_at": datetime.now(timezone.utc)
+    })
+
+    return result.inserted_id
+
 @router.post("/train-classifier", response_model=ClassificationTrainResponse)
 def train_classifier(req: ClassificationTrainRequest):
 
-    df = load_latest_dataset(req.dataset_id)
+    version = latest_stored_version(req.dataset_id)
 
     try:
-        model, metrics, model_info = train_classifier_model(
-            df,
+        X, y, columns, features = load_features("classification", version, req.target_variable)
+        model, metrics, model_info = fit_features(
+            "classification",
             req.model_name,
-            req.target_variable,
+            X, y,
             req.test_percentage
         )
+
+        cv = None
+        if req.cv_folds:
+            cv = cross_validate_dataset(
+                "classification", version, X, y, req.model_name, req.target_variable, req.cv_folds
+            )
     except Exception as e:
         raise HTTPException(400, str(e))
 
-    buffer = io.BytesIO()
-    joblib.dump(model, buffer)
-    buffer.seek(0)
-
-    model_file_id = fs.put(buffer, filename=f"{req.dataset_id}_{req.model_name}.pkl")
-
-    models_collection.insert_one({
-        "dataset_id": req.dataset_id,
-        "model_name": req.model_name,
-        "file_id": model_file_id,
-        "metrics": metrics,
-        "model_info": model_info,
-        "test_percentage": req.test_percentage,
-        "target_variable": req.target_variable,
-        "created_at": datetime.now(timezone.utc)
-    })
+    model_id = store_trained_model(
+        model, req.dataset_id, req.model_name, req.target_variable,
+        req.test_percentage, metrics, model_info,
+        task="classification", feature_columns=columns,
+        cross_validation=cv
+    )
 
     return {
         "message": f"{req.model_name} training complete.",
         "metrics": metrics,
-        "model_info": model_info
+        "model_info": model_info,
+        "model_id": str(model_id),
+        "cross_validation": cv,
+        "feature_matrix": features
     }
 
 class RegressionTrainRequest(BaseModel):
@@ -102,47 +169,712 @@ class RegressionTrainRequest(BaseModel):
     model_name: str
     target_variable: str
     test_percentage: float
+    cv_folds: int | None = None
 
 
 class RegressionTrainResponse(BaseModel):
     message: str
     metrics: dict
     model_info: dict
+    model_id: str | None = None
+    cross_validation: dict | None = None
+    feature_matrix: dict | None = None
 
 @router.post("/train-regressor", response_model=RegressionTrainResponse)
 def train_regression(req: RegressionTrainRequest):
 
-    df = load_latest_dataset(req.dataset_id)
+    version = latest_stored_version(req.dataset_id)
 
     try:
-        model, metrics, model_info = train_regression_model(
-            df,
+        X, y, columns, features = load_features("regression", version, req.target_variable)
+        model, metrics, model_info = fit_features(
+            "regression",
             req.model_name,
-            req.target_variable,
+            X, y,
             req.test_percentage
         )
+
+        cv = None
+        if req.cv_folds:
+            cv = cross_validate_dataset(
+                "regression", version, X, y, req.model_name, req.target_variable, req.cv_folds
+            )
     except Exception as e:
         raise HTTPException(400, str(e))
 
-    buffer = io.BytesIO()
-    joblib.dump(model, buffer)
-    buffer.seek(0)
+    model_id = store_trained_model(
+        model, req.dataset_id, req.model_name, req.target_variable,
+        req.test_percentage, metrics, model_info,
+        task="regression", feature_columns=columns,
+        cross_validation=cv
+    )
+
+    return {
+        "message": f"{req.model_name} training complete.",
+        "metrics": metrics,
+        "model_info": model_info,
+        "model_id": str(model_id),
+        "cross_validation": cv,
+        "feature_matrix": features
+    }
 
-    file_id = fs.put(buffer, filename=f"{req.dataset_id}_{req.model_name}.pkl")
 
-    models_collection.insert_one({
-        "dataset_id": req.dataset_id,
-        "model_name": req.model_name,
-        "file_id": file_id,
+def run_training_job(job_id: str, params: dict):
+    # runs inside a job-queue worker process
+    report_progress(jobs_collection, job_id, "loading", 0.1)
+    version = latest_stored_version(params["dataset_id"])
+    X, y, columns, features = load_features(params["task"], version, params["target_variable"])
+    check_cancelled(jobs_collection, job_id)
+
+    report_progress(jobs_collection, job_id, "fitting", 0.3, rows=len(y), feature_matrix=features)
+    model, metrics, model_info = fit_features(
+        params["task"],
+        params["model_name"],
+        X, y,
+        params["test_percentage"]
+    )
+    check_cancelled(jobs_collection, job_id)
+
+    cv = None
+    if params.get("cv_folds"):
+        report_progress(jobs_collection, job_id, "cross-validating", 0.6)
+        cv = cross_validate_dataset(
+            params["task"], version, X, y, params["model_name"],
+            params["target_variable"], params["cv_folds"]
+        )
+        check_cancelled(jobs_collection, job_id)
+
+    report_progress(jobs_collection, job_id, "saving", 0.9)
+    model_id = store_trained_model(
+        model, params["dataset_id"], params["model_name"], params["target_variable"],
+        params["test_percentage"], metrics, model_info,
+        task=params["task"], feature_columns=columns,
+        cross_validation=cv
+    )
+
+    return {
         "metrics": metrics,
         "model_info": model_info,
-        "test_percentage": req.test_percentage,
-        "target_variable": req.target_variable,
-        "created_at": datetime.now(timezone.utc)
+        "model_id": str(model_id),
+        "cross_validation": cv,
+        "feature_matrix": features,
+    }
+
+
+def serialize_job(doc):
+    doc = dict(doc)
+    doc["job_id"] = doc.pop("_id")
+    return doc
+
+
+class TrainJobRequest(BaseModel):
+    task: str
+    dataset_id: str
+    model_name: str
+    target_variable: str
+    test_percentage: float
+    cv_folds: int | None = None
+
+class TrainJobResponse(BaseModel):
+    job_id: str
+    status: str
+
+@router.post("/jobs", response_model=TrainJobResponse)
+def submit_training_job(req: TrainJobRequest):
+    if req.task not in TASKS:
+        raise HTTPException(400, f"Unknown task '{req.task}'")
+
+    if not datasets.find_one({"_id": ObjectId(req.dataset_id)}, {"_id": 1}):
+        raise HTTPException(404, "Dataset not found")
+
+    try:
+        job_id = job_queue.submit("train", run_training_job, req.dict(), dataset_id=req.dataset_id)
+    except QueueFull:
+        raise HTTPException(503, "Training queue is full, try again later")
+
+    return {"job_id": job_id, "status": "queued"}
+
+@router.get("/jobs/stats")
+def training_job_stats():
+    return job_queue.stats()
+
+@router.get("/jobs/{job_id}")
+def get_training_job(job_id: str):
+    doc = jobs_collection.find_one({"_id": job_id})
+    if not doc:
+        raise HTTPException(404, "Job not found")
+
+    return serialize_job(doc)
+
+@router.post("/jobs/{job_id}/cancel")
+def cancel_training_job(job_id: str):
+    if not job_queue.cancel(job_id):
+        raise HTTPException(409, "Job already finished")
+
+    return serialize_job(jobs_collection.find_one({"_id": job_id}))
+
+
+def train_compare_candidate(params: dict, model_name: str, data_dir: str):
+    try:
+        model, metrics, model_info, fit_seconds = fit_candidate(params["task"], model_name, data_dir)
+    except Exception as e:
+        return {"model_name": model_name, "error": str(e)}
+
+    model_id = store_trained_model(
+        model, params["dataset_id"], model_name, params["target_variable"],
+        params["test_percentage"], metrics, model_info,
+        task=params["task"], feature_columns=params["feature_columns"]
+    )
+
+    return {
+        "model_name": model_name,
+        "metrics": metrics,
+        "model_info": model_info,
+        "fit_seconds": fit_seconds,
+        "model_id": str(model_id),
+    }
+
+
+def run_compare_job(job_id: str, params: dict):
+    task = params["task"]
+    names = params["model_names"]
+
+    report_progress(jobs_collection, job_id, "loading", 0.05)
+    version = latest_stored_version(params["dataset_id"])
+    X, y, columns, features = load_features(task, version, params["target_variable"])
+    params = {**params, "feature_columns": columns}
+
+    with tempfile.TemporaryDirectory(prefix="compare_") as data_dir:
+        split_sizes = build_shared_split(task, X, y, params["test_percentage"], data_dir)
+        del X, y
+        report_progress(
+            jobs_collection, job_id, "fitting", 0.1, split=split_sizes, feature_matrix=features, results=[]
+        )
+
+        candidates = Parallel(
+            n_jobs=min(COMPARE_WORKERS, len(names)),
+            return_as="generator_unordered",
+        )(delayed(train_compare_candidate)(params, name, data_dir) for name in names)
+
+        results = []
+        for result in candidates:
+            results.append(result)
+            jobs_collection.update_one(
+                {"_id": job_id},
+                {
+                    "$push": {"results": result},
+                    "$set": {"progress": 0.1 + 0.9 * len(results) / len(names)},
+                }
+            )
+            check_cancelled(jobs_collection, job_id)
+
+    return {"leaderboard": rank_results(task, results)}
+
+
+class CompareRequest(BaseModel):
+    task: str
+    dataset_id: str
+    target_variable: str
+    test_percentage: float
+    model_names: List[str] | None = None
+
+@router.post("/compare", response_model=TrainJobResponse)
+def submit_compare_job(req: CompareRequest):
+    if req.task not in TASKS:
+        raise HTTPException(400, f"Unknown task '{req.task}'")
+
+    available = TASKS[req.task]["names"]
+    names = req.model_names or available
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise HTTPException(400, f"Unknown models: {', '.join(unknown)}")
+
+    if not datasets.find_one({"_id": ObjectId(req.dataset_id)}, {"_id": 1}):
+        raise HTTPException(404, "Dataset not found")
+
+    params = req.dict()
+    params["model_names"] = list(names)
+
+    try:
+        job_id = job_queue.submit("compare", run_compare_job, params, dataset_id=req.dataset_id)
+    except QueueFull:
+        raise HTTPException(503, "Training queue is full, try again later")
+
+    return {"job_id": job_id, "status": "queued"}
+
+@router.get("/compare/{job_id}")
+def get_leaderboard(job_id: str):
+    doc = jobs_collection.find_one({"_id": job_id, "kind": "compare"})
+    if not doc:
+        raise HTTPException(404, "Comparison not found")
+
+    results = doc.get("results", [])
+    finished = {r["model_name"] for r in results}
+
+    return {
+        "job_id": job_id,
+        "status": doc["status"],
+        "progress": doc.get("progress", 0.0),
+        "split": doc.get("split"),
+        "leaderboard": rank_results(doc["params"]["task"], results),
+        "pending": [name for name in doc["params"]["model_names"] if name not in finished],
+        "error": doc.get("error"),
+    }
+
+
+def run_tune_job(job_id: str, params: dict):
+    task = params["task"]
+    model_name = params["model_name"]
+
+    report_progress(jobs_collection, job_id, "loading", 0.05)
+    version = latest_stored_version(params["dataset_id"])
+    X, y, columns, features = load_features(task, version, params["target_variable"])
+
+    with tempfile.TemporaryDirectory(prefix="tune_") as data_dir:
+        # loaded and split once, every trial memory-maps the same arrays
+        split_sizes = build_shared_split(task, X, y, params["test_percentage"], data_dir)
+        del X, y
+
+        candidates = sample_candidates(model_name, params["n_candidates"])
+        schedule = halving_schedule(len(candidates), fit_size(split_sizes["X_train"]), params["factor"])
+        total = sum(keep for keep, _ in schedule)
+        report_progress(jobs_collection, job_id, "searching", 0.1, split=split_sizes, schedule=schedule, trials=[])
+
+        done = 0
+        with Parallel(n_jobs=min(TUNE_WORKERS, len(candidates)), return_as="generator_unordered") as parallel:
+            for rung, (keep, rows) in enumerate(schedule):
+                candidates = candidates[:keep]
+                trials = []
+                for trial in parallel(
+                    delayed(fit_trial)(task, model_name, candidate, data_dir, rows) for candidate in candidates
+                ):
+                    trial["rung"] = rung
+                    trials.append(trial)
+                    done += 1
+                    jobs_collection.update_one(
+                        {"_id": job_id},
+                        {"$push": {"trials": trial}, "$set": {"progress": 0.1 + 0.8 * done / total}}
+                    )
+                    check_cancelled(jobs_collection, job_id)
+
+                survivors = select_survivors(task, trials, len(trials))
+                if not survivors:
+                    raise ValueError(f"Every trial failed, last error: {trials[-1]['error']}")
+                candidates = survivors
+
+        best_params = candidates[0]
+        report_progress(jobs_collection, job_id, "saving", 0.9, best_params=best_params)
+        model, metrics, model_info, fit_seconds = fit_candidate(task, model_name, data_dir, best_params)
+
+    model_info["params"] = best_params
+    model_id = store_trained_model(
+        model, params["dataset_id"], model_name, params["target_variable"],
+        params["test_percentage"], metrics, model_info,
+        task=task, feature_columns=columns
+    )
+
+    return {
+        "best_params": best_params,
+        "metrics": metrics,
+        "model_info": model_info,
+        "fit_seconds": fit_seconds,
+        "model_id": str(model_id),
+    }
+
+
+class TuneRequest(BaseModel):
+    task: str
+    dataset_id: str
+    model_name: str
+    target_variable: str
+    test_percentage: float
+    n_candidates: int = 27
+    factor: int = 3
+
+@router.post("/tune", response_model=TrainJobResponse)
+def submit_tune_job(req: TuneRequest):
+    if req.task not in TASKS:
+        raise HTTPException(400, f"Unknown task '{req.task}'")
+
+    if req.model_name not in TASKS[req.task]["names"]:
+        raise HTTPException(400, f"Unknown model '{req.model_name}'")
+
+    if req.model_name not in SEARCH_SPACES:
+        raise HTTPException(400, f"{req.model_name} has no hyperparameters to tune")
+
+    if req.n_candidates < 1 or req.factor < 2:
+        raise HTTPException(400, "n_candidates must be at least 1 and factor at least 2")
+
+    if not datasets.find_one({"_id": ObjectId(req.dataset_id)}, {"_id": 1}):
+        raise HTTPException(404, "Dataset not found")
+
+    try:
+        job_id = job_queue.submit("tune", run_tune_job, req.dict(), dataset_id=req.dataset_id)
+    except QueueFull:
+        raise HTTPException(503, "Training queue is full, try again later")
+
+    return {"job_id": job_id, "status": "queued"}
+
+@router.get("/tune/{job_id}")
+def get_tune_job(job_id: str):
+    doc = jobs_collection.find_one({"_id": job_id, "kind": "tune"})
+    if not doc:
+        raise HTTPException(404, "Tuning job not found")
+
+    task = doc["params"]["task"]
+    trials = doc.get("trials", [])
+    # best first within the furthest rung each trial reached
+    ranked = sorted(
+        (t for t in trials if "score" in t),
+        key=lambda t: (t["rung"], t["score"] if TASKS[task]["higher_is_better"] else -t["score"]),
+        reverse=True,
+    )
+
+    return {
+        "job_id": job_id,
+        "status": doc["status"],
+        "stage": doc.get("stage"),
+        "progress": doc.get("progress", 0.0),
+        "schedule": doc.get("schedule"),
+        "trials": ranked + [t for t in trials if "score" not in t],
+        "best_params": doc.get("best_params"),
+        "result": doc.get("result"),
+        "error": doc.get("error"),
+    }
+
+
+def replace_trained_model(model_id, model, metrics: dict, model_info: dict, fields: dict):
+    # swaps the artifact of an existing model document in place, so the
+    # model id handed out with a preliminary fit stays valid
+    doc = models_collection.find_one({"_id": model_id}, {"file_id": 1, "dataset_id": 1, "model_name": 1})
+    model_file_id, artifact = store_model_artifact(
+        fs, model, filename=f"{doc['dataset_id']}_{doc['model_name']}"
+    )
+
+    models_collection.update_one({"_id": model_id}, {"$set": {
+        "file_id": model_file_id,
+        "artifact": artifact,
+        "metrics": metrics,
+        "model_info": model_info,
+        "replaced_at": datetime.now(timezone.utc),
+        **fields,
+    }})
+    fs.delete(doc["file_id"])
+    discard_cached_artifact(doc["file_id"])
+
+
+def run_progressive_job(job_id: str, params: dict):
+    # full-data fit behind a preliminary model, replaces it when done
+    model_id = ObjectId(params["model_id"])
+
+    try:
+        report_progress(jobs_collection, job_id, "loading", 0.1)
+        # the version the preliminary fit used, not whatever is latest now:
+        # the model document keeps that fit's feature columns
+        version = ObjectId(params["version_file_id"])
+        X, y, columns, features = load_features(params["task"], version, params["target_variable"])
+        if columns != params["feature_columns"]:
+            raise ValueError("The features of the stored version changed since the preliminary fit")
+        check_cancelled(jobs_collection, job_id)
+
+        report_progress(jobs_collection, job_id, "fitting", 0.3, rows=len(y), feature_matrix=features)
+        started = time.perf_counter()
+        model, metrics, model_info = fit_features(
+            params["task"],
+            params["model_name"],
+            X, y,
+            params["test_percentage"]
+        )
+        check_cancelled(jobs_collection, job_id)
+    except Exception as e:
+        models_collection.update_one(
+            {"_id": model_id}, {"$set": {"progressive.status": "failed", "progressive.error": str(e)}}
+        )
+        raise
+
+    full_fit_seconds = time.perf_counter() - started
+
+    report_progress(jobs_collection, job_id, "saving", 0.9)
+    replace_trained_model(model_id, model, metrics, model_info, {
+        "progressive.status": "final",
+        "progressive.full_fit_seconds": full_fit_seconds,
     })
 
     return {
-        "message": f"{req.model_name} training complete.",
         "metrics": metrics,
-        "model_info": model_info
-    }
\ No newline at end of file
+        "model_info": model_info,
+        "model_id": str(model_id),
+        "full_fit_seconds": full_fit_seconds,
+    }
+
+
+class ProgressiveTrainRequest(BaseModel):
+    task: str
+    dataset_id: str
+    model_name: str
+    target_variable: str
+    test_percentage: float
+    fractions: List[float] = PROGRESSIVE_FRACTIONS
+
+class ProgressiveTrainResponse(BaseModel):
+    message: str
+    model_id: str
+    job_id: str | None = None
+    metrics: dict
+    estimates: list
+    seconds: float
+    feature_matrix: dict | None = None
+
+@router.post("/progressive", response_model=ProgressiveTrainResponse)
+def train_progressive(req: ProgressiveTrainRequest):
+    if req.task not in TASKS:
+        raise HTTPException(400, f"Unknown task '{req.task}'")
+
+    if not req.fractions or not all(0 < f < 1 for f in req.fractions):
+        raise HTTPException(400, "fractions must be between 0 and 1")
+
+    started = time.perf_counter()
+    version = latest_stored_version(req.dataset_id)
+
+    try:
+        X, y, columns, features = load_features(req.task, version, req.target_variable)
+        estimates, model = progressive_estimates(
+            req.task, req.model_name, X, y, req.test_percentage, req.fractions
+        )
+        if estimates:
+            metrics, model_info = estimates[-1]["metrics"], {}
+        else:
+            # too few rows for a sample to be any quicker, fit it all now
+            model, metrics, model_info = fit_features(
+                req.task, req.model_name, X, y, req.test_percentage
+            )
+    except Exception as e:
+        raise HTTPException(400, str(e))
+
+    progressive = {
+        "status": "preliminary" if estimates else "final",
+        "estimates": estimates,
+        "preliminary_seconds": time.perf_counter() - started,
+    }
+    model_id = store_trained_model(
+        model, req.dataset_id, req.model_name, req.target_variable,
+        req.test_percentage, metrics, model_info,
+        task=req.task, feature_columns=columns, progressive=progressive
+    )
+
+    job_id = None
+    if estimates:
+        params = {
+            **req.dict(),
+            "model_id": str(model_id),
+            "version_file_id": str(version),
+            "feature_columns": columns,
+        }
+        try:
+            job_id = job_queue.submit("progressive", run_progressive_job, params, dataset_id=req.dataset_id)
+            models_collection.update_one({"_id": model_id}, {"$set": {"progressive.job_id": job_id}})
+        except QueueFull:
+            # the preliminary model stays usable, it just won't be replaced
+            models_collection.update_one({"_id": model_id}, {"$set": {"progressive.status": "queue-full"}})
+
+    if not estimates:
+        message = f"{req.model_name} training complete."
+    elif job_id:
+        message = f"Preliminary {req.model_name} ready, full fit queued."
+    else:
+        message = f"Preliminary {req.model_name} ready, training queue is full so it won't be replaced."
+
+    return {
+        "message": message,
+        "model_id": str(model_id),
+        "job_id": job_id,
+        "metrics": metrics,
+        "estimates": estimates,
+        "seconds": time.perf_counter() - started,
+        "feature_matrix": features,
+    }
+
+
+def latest_stored_version(dataset_id: str):
+    # training reads a stored file, pending steps are written out first
+    doc = datasets.find_one({"_id": ObjectId(dataset_id)})
+    if not doc:
+        raise HTTPException(404, "Dataset not found")
+
+    if current_plan(doc)["steps"]:
+        materialize(datasets, blob_store, fs, doc)
+        doc = datasets.find_one({"_id": ObjectId(dataset_id)})
+
+    return doc.get("latest_version_file_id") or doc["original_file_id"]
+
+
+# writing out pending steps replays them on the whole dataset in memory,
+# which is what streaming is there to avoid; the fitted steps don't cover
+# the target (mean imputation, label encoding), so they can't be replayed
+# chunk by chunk either
+STREAM_PENDING_STEPS = (
+    "This dataset has preprocessing steps that haven't been written out, "
+    "streaming only reads stored versions. Train any other model on it first to write them out."
+)
+
+
+def has_pending_steps(doc) -> bool:
+    return bool((doc.get("pipeline") or {}).get("steps"))
+
+
+def run_streaming_job(job_id: str, params: dict):
+    report_progress(jobs_collection, job_id, "loading", 0.02)
+    # a step can land after the job was queued
+    doc = datasets.find_one({"_id": ObjectId(params["dataset_id"])})
+    if not doc:
+        raise ValueError("Dataset not found")
+    if has_pending_steps(doc):
+        raise ValueError(STREAM_PENDING_STEPS)
+    file_id = doc.get("latest_version_file_id") or doc["original_file_id"]
+
+    stored = stored_columns(fs, file_id)
+    if params["target_variable"] not in stored:
+        raise ValueError("Target variable not found in dataset")
+    columns = [col for col in stored if col != params["target_variable"]]
+
+    stage_progress = {"scanning": 0.05, "fitting": 0.1, "evaluating": 0.9}
+
+    def on_pass(stage, fraction):
+        check_cancelled(jobs_collection, job_id)
+        progress = stage_progress[stage] + (0.8 * fraction if stage == "fitting" else 0.0)
+        report_progress(jobs_collection, job_id, stage, progress)
+
+    model, metrics, model_info = train_streaming_model(
+        fs, file_id, params["task"], params["model_name"], params["target_variable"],
+        columns, params["test_percentage"], epochs=params["epochs"], on_pass=on_pass
+    )
+
+    report_progress(jobs_collection, job_id, "saving", 0.95)
+    model_id = store_trained_model(
+        model, params["dataset_id"], params["model_name"], params["target_variable"],
+        params["test_percentage"], metrics, model_info,
+        task=params["task"], feature_columns=columns,
+        feature_conversion=FEATURE_CONVERSIONS["streaming"]
+    )
+
+    return {
+        "metrics": metrics,
+        "model_info": model_info,
+        "model_id": str(model_id),
+    }
+
+
+class StreamTrainRequest(BaseModel):
+    task: str
+    dataset_id: str
+    model_name: str
+    target_variable: str
+    test_percentage: float
+    epochs: conint(ge=1, le=STREAM_MAX_EPOCHS) = STREAM_EPOCHS
+
+@router.post("/stream", response_model=TrainJobResponse)
+def submit_streaming_job(req: StreamTrainRequest):
+    if req.task not in STREAMING_MODELS:
+        raise HTTPException(400, f"Unknown task '{req.task}'")
+
+    if req.model_name not in STREAMING_MODELS[req.task]:
+        raise HTTPException(
+            400, f"Streaming supports: {', '.join(STREAMING_MODELS[req.task])}"
+        )
+
+    doc = datasets.find_one({"_id": ObjectId(req.dataset_id)}, {"pipeline": 1})
+    if not doc:
+        raise HTTPException(404, "Dataset not found")
+    if has_pending_steps(doc):
+        raise HTTPException(409, STREAM_PENDING_STEPS)
+
+    try:
+        job_id = job_queue.submit("stream", run_streaming_job, req.dict(), dataset_id=req.dataset_id)
+    except QueueFull:
+        raise HTTPException(503, "Training queue is full, try again later")
+
+    return {"job_id": job_id, "status": "queued"}
+
+
+def load_served_model(model_id: str) -> LoadedModel:
+    doc = models_collection.find_one({"_id": ObjectId(model_id)})
+    if not doc:
+        raise HTTPException(404, "Model not found")
+
+    if not doc.get("feature_columns"):
+        raise HTTPException(400, "Model was trained before serving was supported, retrain it")
+
+    model, load_seconds = load_model_artifact(fs, doc)
+
+    artifact = doc.get("artifact")
+    if artifact:
+        models_collection.update_one({"_id": doc["_id"]}, {"$set": {"artifact.load_seconds": load_seconds}})
+        nbytes = artifact["bytes"]
+    else:
+        nbytes = fs.get(doc["file_id"]).length
+
+    label_encoder = None
+    if doc.get("label_encoder_file_id"):
+        label_encoder = joblib.load(fs.get(doc["label_encoder_file_id"]))
+
+    return LoadedModel(
+        model,
+        doc["task"],
+        doc["feature_columns"],
+        label_encoder=label_encoder,
+        nbytes=nbytes,
+        file_id=doc["file_id"],
+        preliminary=(doc.get("progressive") or {}).get("status") == "preliminary",
+        feature_conversion=doc.get("feature_conversion"),
+    )
+
+
+async def predict_batch(entry: LoadedModel, blocks: list):
+    return await run_io(predict_features, entry, blocks)
+
+batcher = MicroBatcher(predict_batch)
+
+
+class PredictRequest(BaseModel):
+    model_id: str
+    rows: List[Any]
+
+@router.post("/predict")
+async def predict(req: PredictRequest):
+    started = time.perf_counter()
+
+    if not ObjectId.is_valid(req.model_id):
+        raise HTTPException(400, "Invalid model id")
+
+    entry = await run_io(model_cache.get_or_load, req.model_id, lambda: load_served_model(req.model_id))
+
+    if entry.preliminary:
+        # the full fit may have replaced it since it was cached
+        doc = await run_io(models_collection.find_one, {"_id": ObjectId(req.model_id)}, {"file_id": 1})
+        if doc and doc["file_id"] != entry.file_id:
+            model_cache.invalidate(req.model_id)
+            entry = await run_io(model_cache.get_or_load, req.model_id, lambda: load_served_model(req.model_id))
+
+    try:
+        X = await run_io(request_features, entry, req.rows)
+        predictions = await batcher.submit(req.model_id, entry, X)
+    except Exception as e:
+        raise HTTPException(400, str(e))
+
+    elapsed = time.perf_counter() - started
+    latency.record(req.model_id, elapsed)
+
+    return {
+        "model_id": req.model_id,
+        "predictions": predictions,
+        "latency_ms": elapsed * 1000,
+    }
+
+@router.get("/predict/stats")
+def prediction_stats():
+    return {
+        "cache": model_cache.stats(),
+        "batches": batcher.batches,
+        "batched_requests": batcher.batched_requests,
+        "latency_ms": latency.stats(),
+    }
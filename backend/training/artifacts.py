@@ -0,0 +1,167 @@
+# artifacts.py
+import os
+import tempfile
+import time
+import joblib
+from xgboost import XGBClassifier, XGBRegressor
+from telemetry import span
+
+# joblib keeps numpy arrays out of the pickle stream, so an uncompressed
+# artifact on local disk can be loaded with its arrays memory-mapped instead
+# of copied; compression trades that away for a smaller file
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "model_cache"))
+MODEL_COMPRESS = int(os.getenv("MODEL_COMPRESS", "0"))
+# local copies past this are evicted least recently used first
+MODEL_CACHE_DIR_MAX_BYTES = int(os.getenv("MODEL_CACHE_DIR_MB", "4096")) * 1024 * 1024
+
+JOBLIB_FORMAT = "joblib"
+XGBOOST_FORMAT = "xgboost-ubj"
+
+EXTENSIONS = {
+    JOBLIB_FORMAT: ".joblib",
+    XGBOOST_FORMAT: ".ubj",
+}
+
+XGBOOST_CLASSES = {
+    "classification": XGBClassifier,
+    "regression": XGBRegressor,
+}
+
+
+def artifact_format(model) -> str:
+    if isinstance(model, (XGBClassifier, XGBRegressor)):
+        return XGBOOST_FORMAT
+    return JOBLIB_FORMAT
+
+
+def dump_model(model, path: str, compress: int = MODEL_COMPRESS) -> dict:
+    fmt = artifact_format(model)
+
+    started = time.perf_counter()
+    if fmt == XGBOOST_FORMAT:
+        # native binary format, no pickle and no dependency on the
+        # python-side class layout
+        model.save_model(path)
+        compress = 0
+    else:
+        joblib.dump(model, path, compress=compress)
+
+    return {
+        "format": fmt,
+        "compress": compress,
+        "bytes": os.path.getsize(path),
+        "dump_seconds": time.perf_counter() - started,
+    }
+
+
+def store_model_artifact(fs, model, filename: str):
+    # returns (file_id, artifact info for the model document)
+    fmt = artifact_format(model)
+    fd, path = tempfile.mkstemp(suffix=EXTENSIONS[fmt])
+    os.close(fd)
+
+    try:
+        with span("model_dump", format=fmt) as s:
+            artifact = dump_model(model, path)
+            s.set(bytes_written=artifact["bytes"])
+        with span("gridfs_write", bytes_written=artifact["bytes"]), open(path, "rb") as f:
+            file_id = fs.put(f, filename=filename + EXTENSIONS[fmt], metadata={"format": fmt})
+    finally:
+        os.remove(path)
+
+    return file_id, artifact
+
+
+def cached_artifact_path(fs, file_id, fmt: str) -> str:
+    # artifacts are immutable, so a local copy keyed by file id never goes stale
+    path = os.path.join(MODEL_CACHE_DIR, f"{file_id}{EXTENSIONS[fmt]}")
+    try:
+        # the mtime is the last use, for eviction
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=MODEL_CACHE_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            grid_out = fs.get(file_id)
+            for chunk in iter(lambda: grid_out.read(1024 * 1024), b""):
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    evict_cached_artifacts(keep=path)
+    return path
+
+
+def cached_artifacts() -> list:
+    # [(last used, bytes, path)], oldest first
+    entries = []
+    suffixes = tuple(EXTENSIONS.values())
+    for name in os.listdir(MODEL_CACHE_DIR):
+        if not name.endswith(suffixes):
+            continue
+        path = os.path.join(MODEL_CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    return sorted(entries)
+
+
+def evict_cached_artifacts(max_bytes: int | None = None, keep: str | None = None):
+    # a model that was loaded memory-mapped keeps reading its file after
+    # the unlink, the pages stay until it's dropped
+    max_bytes = MODEL_CACHE_DIR_MAX_BYTES if max_bytes is None else max_bytes
+    entries = cached_artifacts()
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def discard_cached_artifact(file_id):
+    # for artifacts that were replaced, nothing will load them again
+    for extension in EXTENSIONS.values():
+        try:
+            os.remove(os.path.join(MODEL_CACHE_DIR, f"{file_id}{extension}"))
+        except FileNotFoundError:
+            pass
+
+
+def load_model_artifact(fs, doc: dict):
+    with span("model_load", format=(doc.get("artifact") or {}).get("format", JOBLIB_FORMAT)):
+        return read_model_artifact(fs, doc)
+
+
+def read_model_artifact(fs, doc: dict):
+    # returns (model, seconds spent loading)
+    started = time.perf_counter()
+    artifact = doc.get("artifact")
+
+    if artifact is None:
+        # models stored before artifacts were tracked are plain joblib streams
+        model = joblib.load(fs.get(doc["file_id"]))
+        return model, time.perf_counter() - started
+
+    path = cached_artifact_path(fs, doc["file_id"], artifact["format"])
+
+    if artifact["format"] == XGBOOST_FORMAT:
+        model = XGBOOST_CLASSES[doc["task"]]()
+        model.load_model(path)
+    else:
+        model = joblib.load(path, mmap_mode=None if artifact["compress"] else "r")
+
+    return model, time.perf_counter() - started
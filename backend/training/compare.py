@@ -0,0 +1,94 @@
+# compare.py
+import os
+import time
+import numpy as np
+import scipy.sparse as sp
+from training.train_classification import (
+    CLASSIFIER_NAMES, prepare_classification_data, split_classification_data, evaluate_classifier
+)
+from training.train_regression import (
+    REGRESSOR_NAMES, prepare_regression_data, split_regression_data, evaluate_regressor
+)
+
+COMPARE_WORKERS = int(os.getenv("COMPARE_WORKERS", str(os.cpu_count() or 1)))
+
+TASKS = {
+    "classification": {
+        "names": CLASSIFIER_NAMES,
+        "prepare": prepare_classification_data,
+        "split": split_classification_data,
+        "evaluate": evaluate_classifier,
+        "rank_by": "accuracy",
+        "higher_is_better": True,
+    },
+    "regression": {
+        "names": REGRESSOR_NAMES,
+        "prepare": prepare_regression_data,
+        "split": split_regression_data,
+        "evaluate": evaluate_regressor,
+        "rank_by": "r2_score",
+        "higher_is_better": True,
+    },
+}
+
+SPLIT_NAMES = ("X_train", "X_test", "y_train", "y_test")
+
+
+def fit_features(task: str, model_name: str, X, y, test_percentage: float):
+    # the train_*_model functions, for features that are already built
+    spec = TASKS[task]
+    X_train, X_test, y_train, y_test = spec["split"](X, y, test_percentage)
+    return spec["evaluate"](model_name, X_train, X_test, y_train, y_test)
+
+
+def build_shared_split(task: str, X, y, test_percentage: float, data_dir: str):
+    # split once and park the arrays on disk, every candidate memory-maps the
+    # same read-only copy instead of receiving its own pickled one
+    parts = TASKS[task]["split"](X, np.asarray(y), test_percentage)
+
+    for name, array in zip(SPLIT_NAMES, parts):
+        if sp.issparse(array):
+            # sparse features can't be memory-mapped, they are small anyway
+            sp.save_npz(os.path.join(data_dir, f"{name}.npz"), array.tocsr(), compressed=False)
+        else:
+            np.save(os.path.join(data_dir, f"{name}.npy"), array, allow_pickle=False)
+
+    return {name: array.shape[0] for name, array in zip(SPLIT_NAMES, parts)}
+
+
+def load_split_part(data_dir: str, name: str):
+    sparse_path = os.path.join(data_dir, f"{name}.npz")
+    if os.path.exists(sparse_path):
+        return sp.load_npz(sparse_path)
+    return np.load(os.path.join(data_dir, f"{name}.npy"), mmap_mode="r")
+
+
+def load_shared_split(data_dir: str):
+    return [load_split_part(data_dir, name) for name in SPLIT_NAMES]
+
+
+def fit_candidate(task: str, model_name: str, data_dir: str, params: dict | None = None):
+    X_train, X_test, y_train, y_test = load_shared_split(data_dir)
+
+    started = time.perf_counter()
+    model, metrics, model_info = TASKS[task]["evaluate"](
+        model_name, X_train, X_test, y_train, y_test, params
+    )
+
+    return model, metrics, model_info, time.perf_counter() - started
+
+
+def rank_results(task: str, results: list) -> list:
+    spec = TASKS[task]
+    key = spec["rank_by"]
+
+    scored = [r for r in results if "metrics" in r]
+    failed = [r for r in results if "metrics" not in r]
+
+    scored.sort(key=lambda r: r["metrics"][key], reverse=spec["higher_is_better"])
+
+    leaderboard = []
+    for rank, result in enumerate(scored, start=1):
+        leaderboard.append({"rank": rank, **result})
+
+    return leaderboard + failed
@@ -0,0 +1,123 @@
+# cross_validation.py
+import io
+import os
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from joblib import Parallel, delayed
+from pymongo.errors import DuplicateKeyError
+from sklearn.model_selection import KFold, StratifiedKFold
+from training.compare import TASKS
+
+CV_WORKERS = int(os.getenv("CV_WORKERS", str(os.cpu_count() or 1)))
+MAX_STRATIFY_CLASSES = 20
+
+
+def can_stratify(task: str, y, k: int) -> bool:
+    # same rule as the holdout split, plus every class needs a row per fold
+    if task != "classification":
+        return False
+    _, counts = np.unique(np.asarray(y), return_counts=True)
+    return bool(len(counts) <= MAX_STRATIFY_CLASSES and counts.min() >= k)
+
+
+def assign_folds(y, k: int, stratified: bool) -> np.ndarray:
+    # per row, the fold it is held out in, in the smallest unsigned type
+    # that holds k - 1
+    splitter = (
+        StratifiedKFold(n_splits=k, shuffle=True, random_state=42)
+        if stratified else KFold(n_splits=k, shuffle=True, random_state=42)
+    )
+    folds = np.empty(len(y), dtype=np.min_scalar_type(k - 1))
+    for fold, (_, test_index) in enumerate(splitter.split(np.zeros(len(y)), np.asarray(y))):
+        folds[test_index] = fold
+    return folds
+
+
+class FoldCache:
+    # fold assignments per (dataset version, target, k), so every model
+    # evaluated on a version sees exactly the same splits. The arrays live
+    # in the blob store, the collection maps keys to them.
+    def __init__(self, collection, blob_store, fs):
+        self.collection = collection
+        self.blob_store = blob_store
+        self.fs = fs
+
+    def get_or_create(self, version: str, target_variable: str, k: int, task: str, y):
+        stratified = can_stratify(task, y, k)
+        key = f"{version}:{target_variable}:{k}:{'stratified' if stratified else 'kfold'}"
+
+        doc = self.collection.find_one({"_id": key})
+        if doc is not None:
+            return np.load(io.BytesIO(self.fs.get(doc["file_id"]).read()))["folds"], stratified
+
+        folds = assign_folds(y, k, stratified)
+        buffer = io.BytesIO()
+        np.savez(buffer, folds=folds)
+        file_id = self.blob_store.put(buffer.getvalue(), filename=f"folds_{key}.npz")
+
+        try:
+            self.collection.insert_one({
+                "_id": key,
+                "file_id": file_id,
+                "version": version,
+                "target_variable": target_variable,
+                "k": k,
+                "stratified": stratified,
+                "rows": len(folds),
+                "created_at": datetime.now(timezone.utc),
+            })
+        except DuplicateKeyError:
+            # someone else cached the same key first, identical content
+            self.blob_store.release(file_id)
+
+        return folds, stratified
+
+
+def take_rows(X, index):
+    return X.iloc[index] if isinstance(X, pd.DataFrame) else X[index]
+
+
+def fit_fold(task: str, model_name: str, X, y, folds: np.ndarray, fold: int, params: dict | None = None) -> dict:
+    test = folds == fold
+    train_index, test_index = np.flatnonzero(~test), np.flatnonzero(test)
+    y = np.asarray(y)
+
+    _, metrics, _ = TASKS[task]["evaluate"](
+        model_name,
+        take_rows(X, train_index), take_rows(X, test_index),
+        y[train_index], y[test_index],
+        params,
+    )
+    return {"fold": fold, "rows": len(test_index), **metrics}
+
+
+def aggregate_folds(fold_metrics: list) -> dict:
+    aggregate = {}
+    for name, value in fold_metrics[0].items():
+        if name in ("fold", "rows") or not isinstance(value, (int, float)):
+            continue
+        values = np.array([m[name] for m in fold_metrics], dtype=np.float64)
+        aggregate[name] = {"mean": float(values.mean()), "std": float(values.std())}
+
+    if "confusion_matrix" in fold_metrics[0]:
+        shapes = {np.shape(m["confusion_matrix"]) for m in fold_metrics}
+        if len(shapes) == 1:
+            aggregate["confusion_matrix"] = np.sum(
+                [m["confusion_matrix"] for m in fold_metrics], axis=0
+            ).tolist()
+
+    return aggregate
+
+
+def cross_validate(task: str, model_name: str, X, y, folds: np.ndarray, params: dict | None = None) -> dict:
+    k = int(folds.max()) + 1
+    # joblib memory-maps large arrays for the workers instead of copying them
+    fold_metrics = Parallel(n_jobs=min(CV_WORKERS, k))(
+        delayed(fit_fold)(task, model_name, X, y, folds, fold, params) for fold in range(k)
+    )
+    return {
+        "k": k,
+        "folds": fold_metrics,
+        "aggregate": aggregate_folds(fold_metrics),
+    }
@@ -0,0 +1,163 @@
+# feature_cache.py
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+import scipy.sparse as sp
+from training.compare import TASKS
+from telemetry import span
+
+# X/y per (stored version, target, task), as .npy files on local disk.
+# Versions are immutable, so an entry never goes stale; every training path
+# and worker process memory-maps the same read-only arrays instead of
+# parsing the version and converting it again. Sparse (one-hot) features
+# aren't cached, they're cheap to rebuild and can't be memory-mapped.
+FEATURE_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "feature_cache"))
+FEATURE_CACHE_MAX_BYTES = int(os.getenv("FEATURE_CACHE_MB", "2048")) * 1024 * 1024
+
+
+def save_array(directory: str, path: str, array: np.ndarray):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, array, allow_pickle=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class FeatureCache:
+    def __init__(self, directory: str = FEATURE_CACHE_DIR, max_bytes: int = FEATURE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.build_seconds = 0.0
+
+    def paths(self, task: str, version: str, target_variable: str) -> dict:
+        key = hashlib.sha1(f"{version}:{target_variable}:{task}".encode("utf-8")).hexdigest()
+        return {part: os.path.join(self.directory, f"{key}.{part}") for part in ("X.npy", "y.npy", "json")}
+
+    def get(self, task: str, version: str, target_variable: str):
+        paths = self.paths(task, version, target_variable)
+        try:
+            # the metadata goes in last, if it's there the arrays are too
+            with open(paths["json"]) as f:
+                meta = json.load(f)
+            X = np.load(paths["X.npy"], mmap_mode="r")
+            y = np.load(paths["y.npy"], mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        os.utime(paths["json"])
+        return X, y, meta
+
+    def load(self, task: str, version, target_variable: str, load_frame):
+        # returns (X, y, feature columns, info); load_frame() is only called
+        # on a miss
+        version = str(version)
+        started = time.perf_counter()
+        with span("feature_matrix_load") as s:
+            cached = self.get(task, version, target_variable)
+            s.set(hit=cached is not None)
+        if cached is not None:
+            X, y, meta = cached
+            with self._lock:
+                self.hits += 1
+            return X, y, meta["columns"], {
+                "cached": True,
+                "rows": X.shape[0],
+                "columns": X.shape[1],
+                "build_seconds": meta["build_seconds"],
+                "load_seconds": time.perf_counter() - started,
+            }
+
+        with self._lock:
+            self.misses += 1
+
+        df = load_frame()
+        columns = [col for col in df.columns if col != target_variable]
+        with span("feature_matrix_build", rows=len(df), columns=len(columns)):
+            build_started = time.perf_counter()
+            X, y = TASKS[task]["prepare"](df, target_variable)
+            build_seconds = time.perf_counter() - build_started
+        del df
+
+        with self._lock:
+            self.build_seconds += build_seconds
+
+        info = {
+            "cached": False,
+            "rows": X.shape[0],
+            "columns": X.shape[1],
+            "build_seconds": build_seconds,
+            "load_seconds": time.perf_counter() - started,
+        }
+        if sp.issparse(X):
+            return X, y, columns, info
+
+        self.put(task, version, target_variable, X, y, {"columns": columns, "build_seconds": build_seconds})
+        return X, y, columns, info
+
+    def put(self, task: str, version: str, target_variable: str, X: np.ndarray, y: np.ndarray, meta: dict):
+        if X.nbytes + y.nbytes > self.max_bytes:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        paths = self.paths(task, version, target_variable)
+        save_array(self.directory, paths["X.npy"], X)
+        save_array(self.directory, paths["y.npy"], y)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        with os.fdopen(fd, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, paths["json"])
+
+        self.evict()
+
+    def entries(self) -> list:
+        # [(last used, bytes, paths)], oldest first
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            base = os.path.join(self.directory, name[:-len(".json")])
+            paths = [f"{base}.json", f"{base}.X.npy", f"{base}.y.npy"]
+            try:
+                used = os.path.getmtime(paths[0])
+                size = sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+            except OSError:
+                continue
+            entries.append((used, size, paths))
+        return sorted(entries)
+
+    def evict(self):
+        # least recently used first; a worker that still has an entry mapped
+        # keeps reading it, unlinking doesn't pull the pages away
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, paths in entries:
+            if total <= self.max_bytes:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+    def stats(self) -> dict:
+        entries = self.entries() if os.path.isdir(self.directory) else []
+        with self._lock:
+            return {
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "build_seconds_total": self.build_seconds,
+            }
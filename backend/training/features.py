@@ -0,0 +1,81 @@
+# features.py
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+from storage.columnar import sparse_columns
+
+FEATURE_DTYPE = np.float32
+# targets are cached and trained on like the features: regression targets
+# as contiguous float32, encoded class labels as contiguous integers
+TARGET_DTYPE = np.float32
+LABEL_DTYPE = np.int64
+
+# how each training path turns features into X; the one a model was trained
+# with is stored on its document so serving converts new rows the same way
+FEATURE_CONVERSIONS = {
+    "classification": {"coerce": True, "fill_value": 0},
+    "regression": {"coerce": False, "fill_value": None},
+    "streaming": {"coerce": True, "fill_value": 0},
+}
+
+
+def dense_feature_matrix(X: pd.DataFrame, fill_value=None, coerce: bool = True) -> np.ndarray:
+    # one C-contiguous float32 array, filled a dtype block at a time rather
+    # than converting column by column; non-numeric columns are coerced to
+    # NaN, or rejected when coerce is off
+    other = [col for col, dtype in X.dtypes.items() if not (is_numeric_dtype(dtype) or is_bool_dtype(dtype))]
+    if other and not coerce:
+        raise ValueError("All feature columns must be numeric, encode the dataset first")
+
+    out = np.empty(X.shape, dtype=FEATURE_DTYPE, order="C")
+    position = {col: i for i, col in enumerate(X.columns)}
+    blocks = {}
+    for col, dtype in X.dtypes.items():
+        if col not in other:
+            blocks.setdefault(dtype, []).append(col)
+
+    for cols in blocks.values():
+        out[:, [position[col] for col in cols]] = X[cols].to_numpy(dtype=FEATURE_DTYPE)
+    for col in other:
+        out[:, position[col]] = pd.to_numeric(X[col], errors="coerce").to_numpy(dtype=FEATURE_DTYPE)
+
+    if fill_value is not None:
+        np.nan_to_num(out, copy=False, nan=fill_value, posinf=np.inf, neginf=-np.inf)
+    return out
+
+
+def regression_target(y: pd.Series) -> np.ndarray:
+    try:
+        y = pd.to_numeric(y)
+    except (TypeError, ValueError):
+        raise ValueError("The target column must be numeric for regression")
+    return np.ascontiguousarray(y.to_numpy(dtype=TARGET_DTYPE, na_value=np.nan))
+
+
+def class_labels(y: pd.Series) -> np.ndarray:
+    # labels that aren't whole numbers (not encoded, or gaps) stay float64
+    # for the classifier to reject like before
+    values = pd.to_numeric(y, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    if np.isfinite(values).all() and (values == np.round(values)).all():
+        return np.ascontiguousarray(values, dtype=LABEL_DTYPE)
+    return values
+
+
+def sparse_feature_matrix(X: pd.DataFrame, fill_value=None):
+    # CSR matrix in X's column order: encoded sparse columns go straight in,
+    # the (few) dense columns are converted and stacked next to them
+    sparse_cols = sparse_columns(X)
+    dense_cols = [col for col in X.columns if col not in set(sparse_cols)]
+
+    dense = X[dense_cols].apply(pd.to_numeric, errors="coerce")
+    if fill_value is not None:
+        dense = dense.fillna(fill_value)
+
+    matrix = sp.hstack([
+        sp.csr_matrix(dense.to_numpy(dtype=np.float64)),
+        X[sparse_cols].sparse.to_coo().tocsr(),
+    ], format="csr")
+
+    position = {col: i for i, col in enumerate(dense_cols + sparse_cols)}
+    return matrix[:, [position[col] for col in X.columns]]
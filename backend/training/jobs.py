@@ -0,0 +1,274 @@
+# jobs.py
+import logging
+import os
+import socket
+import threading
+import time
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+
+TRAIN_WORKERS = int(os.getenv("TRAIN_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+TRAIN_EXECUTOR = os.getenv("TRAIN_EXECUTOR", "process")
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "100"))
+# the API worker holding a job's queue entry or future stamps it this often;
+# a queued or running job that hasn't been stamped for JOB_STALE_SECONDS
+# belongs to a worker that's gone and is marked failed
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "120"))
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+def report_progress(collection, job_id: str, stage: str, progress: float, **fields):
+    collection.update_one(
+        {"_id": job_id},
+        {"$set": {"stage": stage, "progress": progress, **fields}}
+    )
+
+
+def check_cancelled(collection, job_id: str):
+    doc = collection.find_one({"_id": job_id}, {"cancel_requested": 1})
+    if doc and doc.get("cancel_requested"):
+        raise JobCancelled()
+
+
+def summarize_times(values) -> dict:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "avg": sum(ordered) / len(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+    }
+
+
+class JobQueue:
+    # jobs wait in a local deque and are only handed to the pool when a worker
+    # is free, so "running" really means running and queued jobs can be dropped.
+    # Job documents live in Mongo so any API worker can answer status polls.
+    def __init__(self, collection, workers: int = TRAIN_WORKERS, executor: str = TRAIN_EXECUTOR):
+        self.collection = collection
+        self.workers = workers
+        self.executor_kind = executor
+        self._executor = None
+        self._pending = deque()
+        self._running = {}
+        self._cond = threading.Condition()
+        self._dispatcher = None
+        self._heartbeat = None
+        self._stopped = threading.Event()
+        # pids repeat across container restarts, the suffix doesn't
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{os.urandom(4).hex()}"
+        self.counts = {DONE: 0, FAILED: 0, CANCELLED: 0}
+        self.wait_times = deque(maxlen=200)
+        self.run_times = deque(maxlen=200)
+
+    def _ensure_executor(self):
+        if self._executor is None:
+            if self.executor_kind == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+            else:
+                # spawn, forked children would inherit the parent's mongo sockets
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+        return self._executor
+
+    def _start(self):
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+            self._dispatcher.start()
+        self.start_heartbeat()
+
+    def start_heartbeat(self):
+        # also started with the app, so jobs orphaned by a restart are failed
+        # even if this worker never gets a job of its own
+        if self._heartbeat is None:
+            self._heartbeat = threading.Thread(target=self._beat, daemon=True)
+            self._heartbeat.start()
+
+    def _beat(self):
+        while True:
+            try:
+                self.collection.update_many(
+                    {"owner": self.owner, "status": {"$in": [QUEUED, RUNNING]}},
+                    {"$set": {"heartbeat_at": datetime.now(timezone.utc)}}
+                )
+                self.fail_stale()
+            except Exception:
+                logger.exception("job heartbeat failed")
+            if self._stopped.wait(JOB_HEARTBEAT_SECONDS):
+                return
+
+    def fail_stale(self, stale_seconds: float = JOB_STALE_SECONDS) -> int:
+        # jobs left queued or running by a worker that restarted or died,
+        # nothing would ever finish them and their clients would poll forever
+        now = datetime.now(timezone.utc)
+        result = self.collection.update_many(
+            {
+                "status": {"$in": [QUEUED, RUNNING]},
+                "owner": {"$ne": self.owner},
+                "$or": [
+                    {"heartbeat_at": {"$lt": now - timedelta(seconds=stale_seconds)}},
+                    # submitted before jobs were stamped
+                    {"heartbeat_at": {"$exists": False}},
+                ],
+            },
+            {"$set": {
+                "status": FAILED,
+                "stage": FAILED,
+                "error": "The server stopped before the job finished, submit it again",
+                "finished_at": now,
+            }}
+        )
+        return result.modified_count
+
+    def submit(self, kind: str, fn, params: dict, **fields) -> str:
+        with self._cond:
+            if len(self._pending) >= MAX_QUEUED_JOBS:
+                raise QueueFull()
+
+            job_id = os.urandom(12).hex()
+            self.collection.insert_one({
+                "_id": job_id,
+                "kind": kind,
+                "params": params,
+                "status": QUEUED,
+                "stage": QUEUED,
+                "progress": 0.0,
+                "cancel_requested": False,
+                "owner": self.owner,
+                "submitted_at": datetime.now(timezone.utc),
+                "heartbeat_at": datetime.now(timezone.utc),
+                **fields,
+            })
+
+            self._start()
+            self._pending.append((job_id, fn, params, time.perf_counter()))
+            self._cond.notify_all()
+
+        return job_id
+
+    def cancel(self, job_id: str) -> bool:
+        with self._cond:
+            for item in self._pending:
+                if item[0] == job_id:
+                    self._pending.remove(item)
+                    self.counts[CANCELLED] += 1
+                    self.collection.update_one(
+                        {"_id": job_id},
+                        {"$set": {
+                            "status": CANCELLED,
+                            "cancel_requested": True,
+                            "finished_at": datetime.now(timezone.utc),
+                        }}
+                    )
+                    return True
+
+        # running (possibly on another API worker): the job stops at its next
+        # checkpoint, a fit already in progress can't be interrupted
+        result = self.collection.update_one(
+            {"_id": job_id, "status": {"$in": [QUEUED, RUNNING]}},
+            {"$set": {"cancel_requested": True}}
+        )
+        return result.matched_count > 0
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while not self._pending or len(self._running) >= self.workers:
+                    self._cond.wait()
+                job_id, fn, params, queued_at = self._pending.popleft()
+                started_at = time.perf_counter()
+                self._running[job_id] = started_at
+                self.wait_times.append(started_at - queued_at)
+
+            started = self.collection.update_one(
+                {"_id": job_id, "cancel_requested": False},
+                {"$set": {
+                    "status": RUNNING,
+                    "stage": "starting",
+                    "started_at": datetime.now(timezone.utc),
+                    "queue_seconds": started_at - queued_at,
+                }}
+            )
+            if not started.matched_count:
+                # cancelled through another API worker while it was queued here
+                with self._cond:
+                    self._running.pop(job_id)
+                    self.counts[CANCELLED] += 1
+                self.collection.update_one(
+                    {"_id": job_id},
+                    {"$set": {"status": CANCELLED, "stage": CANCELLED, "finished_at": datetime.now(timezone.utc)}}
+                )
+                continue
+
+            future = self._ensure_executor().submit(fn, job_id, params)
+            future.add_done_callback(lambda f, job_id=job_id: self._finish(job_id, f))
+
+    def _finish(self, job_id: str, future):
+        error = future.exception()
+
+        with self._cond:
+            started_at = self._running.pop(job_id)
+            run_seconds = time.perf_counter() - started_at
+            self.run_times.append(run_seconds)
+            if isinstance(error, BrokenProcessPool):
+                # a worker died (e.g. OOM), start a fresh pool for the next job
+                self._executor = None
+            self._cond.notify_all()
+
+        update = {
+            "finished_at": datetime.now(timezone.utc),
+            "run_seconds": run_seconds,
+        }
+
+        if error is None:
+            update.update({"status": DONE, "stage": DONE, "progress": 1.0, "result": future.result()})
+        elif isinstance(error, JobCancelled):
+            update.update({"status": CANCELLED, "stage": CANCELLED})
+        else:
+            update.update({"status": FAILED, "stage": FAILED, "error": str(error)})
+
+        with self._cond:
+            self.counts[update["status"]] += 1
+
+        self.collection.update_one({"_id": job_id}, {"$set": update})
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "executor": self.executor_kind,
+                "queue_depth": len(self._pending),
+                "running": len(self._running),
+                "completed": dict(self.counts),
+                "queue_wait_seconds": summarize_times(list(self.wait_times)),
+                "run_seconds": summarize_times(list(self.run_times)),
+            }
+
+    def shutdown(self):
+        self._stopped.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,67 @@
+# progressive.py
+import os
+import time
+import numpy as np
+from sklearn.model_selection import train_test_split
+from training.compare import TASKS
+from training.cross_validation import MAX_STRATIFY_CLASSES, take_rows
+
+PROGRESSIVE_FRACTIONS = [
+    float(f) for f in os.getenv("PROGRESSIVE_FRACTIONS", "0.01,0.1").split(",")
+]
+PROGRESSIVE_MIN_ROWS = int(os.getenv("PROGRESSIVE_MIN_ROWS", "50"))
+# preliminary scores don't need the whole test split, predicting on it can
+# cost more than the sample fit for KNN / SVM
+PROGRESSIVE_MAX_TEST_ROWS = int(os.getenv("PROGRESSIVE_MAX_TEST_ROWS", "20000"))
+
+
+def sample_index(task: str, y, rows: int, seed: int = 42) -> np.ndarray:
+    index = np.arange(len(y))
+    stratify = None
+    if task == "classification" and len(np.unique(y)) <= MAX_STRATIFY_CLASSES:
+        stratify = y
+
+    try:
+        sample, _ = train_test_split(index, train_size=rows, stratify=stratify, random_state=seed)
+    except ValueError:
+        # a class too rare to appear in a sample this small
+        sample, _ = train_test_split(index, train_size=rows, random_state=seed)
+    return np.sort(sample)
+
+
+def progressive_estimates(task: str, model_name: str, X, y, test_percentage: float,
+                          fractions: list = PROGRESSIVE_FRACTIONS):
+    # fits on growing stratified samples of the training split the full fit
+    # will use, scoring each on (a sample of) its test split; returns the
+    # per-sample estimates and the model from the largest sample
+    spec = TASKS[task]
+    X_train, X_test, y_train, y_test = spec["split"](X, y, test_percentage)
+    y_train, y_test = np.asarray(y_train), np.asarray(y_test)
+    n_train = len(y_train)
+
+    if len(y_test) > PROGRESSIVE_MAX_TEST_ROWS:
+        test_index = sample_index(task, y_test, PROGRESSIVE_MAX_TEST_ROWS)
+        X_test, y_test = take_rows(X_test, test_index), y_test[test_index]
+
+    estimates = []
+    model = None
+    for fraction in sorted(fractions):
+        rows = max(PROGRESSIVE_MIN_ROWS, int(n_train * fraction))
+        if rows >= n_train:
+            break
+
+        index = sample_index(task, y_train, rows)
+        started = time.perf_counter()
+        model, metrics, _ = spec["evaluate"](
+            model_name, take_rows(X_train, index), X_test, y_train[index], y_test
+        )
+        estimates.append({
+            "fraction": fraction,
+            "rows": rows,
+            "train_rows": n_train,
+            "test_rows": len(y_test),
+            "seconds": time.perf_counter() - started,
+            "metrics": metrics,
+        })
+
+    return estimates, model
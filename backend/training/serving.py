@@ -0,0 +1,202 @@
+# serving.py
+import asyncio
+import os
+import threading
+from collections import OrderedDict, deque
+import numpy as np
+import pandas as pd
+from training.features import FEATURE_CONVERSIONS, dense_feature_matrix
+from training.jobs import summarize_times
+from telemetry import span
+
+MODEL_CACHE_MB = int(os.getenv("MODEL_CACHE_MB", "1024"))
+PREDICT_MAX_BATCH_ROWS = int(os.getenv("PREDICT_MAX_BATCH_ROWS", "2048"))
+PREDICT_MAX_WAIT_MS = float(os.getenv("PREDICT_MAX_WAIT_MS", "5"))
+
+
+class LoadedModel:
+    def __init__(self, model, task: str, feature_columns: list, label_encoder=None, nbytes: int = 0,
+                 file_id=None, preliminary: bool = False, feature_conversion: dict | None = None):
+        self.model = model
+        self.task = task
+        self.feature_columns = feature_columns
+        # dense_feature_matrix arguments the model was trained with
+        self.feature_conversion = feature_conversion or FEATURE_CONVERSIONS[task]
+        self.label_encoder = label_encoder
+        self.nbytes = nbytes
+        # a preliminary model is replaced in place by its full fit, the file
+        # id tells whether the cached copy is still the current one
+        self.file_id = file_id
+        self.preliminary = preliminary
+
+
+class ModelCache:
+    # deserialized models, evicted least-recently-used once their stored
+    # artifact sizes add up to more than the budget
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    def get_or_load(self, model_id: str, loader) -> LoadedModel:
+        with self._lock:
+            entry = self._models.get(model_id)
+            if entry is not None:
+                self._models.move_to_end(model_id)
+                self.hits += 1
+                return entry
+            key_lock = self._loading.setdefault(model_id, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._models.get(model_id)
+                if entry is not None:
+                    self.hits += 1
+                    return entry
+                self.misses += 1
+
+            try:
+                entry = loader()
+            finally:
+                with self._lock:
+                    self._loading.pop(model_id, None)
+
+            with self._lock:
+                if entry.nbytes <= self.max_bytes:
+                    self._models[model_id] = entry
+                    self.current_bytes += entry.nbytes
+                    while self.current_bytes > self.max_bytes:
+                        _, evicted = self._models.popitem(last=False)
+                        self.current_bytes -= evicted.nbytes
+                        self.evictions += 1
+
+        return entry
+
+    def invalidate(self, model_id: str):
+        with self._lock:
+            entry = self._models.pop(model_id, None)
+            if entry is not None:
+                self.current_bytes -= entry.nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._models),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def rows_to_frame(rows: list, feature_columns: list) -> pd.DataFrame:
+    if rows and isinstance(rows[0], dict):
+        return pd.DataFrame.from_records(rows, columns=feature_columns)
+    return pd.DataFrame(rows, columns=feature_columns)
+
+
+def prepare_features(conversion: dict, X: pd.DataFrame):
+    # the conversion recorded on the model when it was trained
+    return dense_feature_matrix(X, **conversion)
+
+
+def request_features(entry: LoadedModel, rows: list) -> np.ndarray:
+    # converted per request before batching, so a bad value fails the
+    # request it came in with and not the ones batched next to it
+    return prepare_features(entry.feature_conversion, rows_to_frame(rows, entry.feature_columns))
+
+
+def predict_features(entry: LoadedModel, blocks: list):
+    X = blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+    with span("model_predict", rows=len(X), batch=len(blocks)):
+        preds = entry.model.predict(X)
+
+    if entry.label_encoder is not None:
+        preds = entry.label_encoder.inverse_transform(np.asarray(preds).astype(int))
+
+    return [p.item() if hasattr(p, "item") else p for p in preds]
+
+
+class MicroBatcher:
+    # requests for the same model arriving within a few milliseconds share a
+    # single predict call; everything here runs on the event loop thread
+    def __init__(self, predict, max_rows: int = PREDICT_MAX_BATCH_ROWS, max_wait_ms: float = PREDICT_MAX_WAIT_MS):
+        self.predict = predict
+        self.max_rows = max_rows
+        self.max_wait = max_wait_ms / 1000
+        self._pending = {}
+        self._timers = {}
+        self.batches = 0
+        self.batched_requests = 0
+
+    async def submit(self, model_id: str, entry: LoadedModel, X: np.ndarray):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        # a batch runs against one loaded artifact; a request that already
+        # reloaded a replaced (preliminary) model starts a batch of its own
+        key = (model_id, entry.file_id)
+        pending = self._pending.setdefault(key, [])
+        pending.append((X, future))
+
+        if sum(len(block) for block, _ in pending) >= self.max_rows:
+            self._flush(key, entry)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.max_wait, self._flush, key, entry)
+
+        return await future
+
+    def _flush(self, key: tuple, entry: LoadedModel):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        batch = self._pending.pop(key, [])
+        if batch:
+            asyncio.ensure_future(self._run(entry, batch))
+
+    async def _run(self, entry: LoadedModel, batch: list):
+        self.batches += 1
+        self.batched_requests += len(batch)
+        try:
+            preds = await self.predict(entry, [X for X, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                if not batch[0][1].done():
+                    batch[0][1].set_exception(e)
+                return
+            # one request's rows broke the batch, each one is retried on
+            # its own so only that request gets the error
+            await asyncio.gather(*(self._run(entry, [item]) for item in batch))
+            return
+
+        offset = 0
+        for X, future in batch:
+            if not future.done():
+                future.set_result(preds[offset:offset + len(X)])
+            offset += len(X)
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 500):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, model_id: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(model_id, deque(maxlen=self.window)).append(seconds * 1000)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                model_id: summarize_times(list(samples))
+                for model_id, samples in self._samples.items()
+            }
+
@@ -0,0 +1,251 @@
+# streaming.py
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.linear_model import SGDClassifier, SGDRegressor
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from xgboost import XGBClassifier, XGBRegressor
+from storage.columnar import ARROW_CHUNK_ROWS, iter_dataframe_chunks
+from training.features import FEATURE_CONVERSIONS, dense_feature_matrix
+
+# out-of-core training: the stored version is read from GridFS a chunk at a
+# time on every pass, so memory is bounded by the chunk size, not the rows
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", str(ARROW_CHUNK_ROWS)))
+STREAM_EPOCHS = int(os.getenv("STREAM_EPOCHS", "3"))
+# each epoch is a full pass over the stored version
+STREAM_MAX_EPOCHS = int(os.getenv("STREAM_MAX_EPOCHS", "50"))
+STREAM_BOOST_ROUNDS = int(os.getenv("STREAM_BOOST_ROUNDS", "100"))
+
+STREAMING_MODELS = {
+    "classification": ["SGD Classifier", "XGBoost Classifier"],
+    "regression": ["SGD Regressor", "XGBoost Regression"],
+}
+
+HASH_MULTIPLIER = np.uint64(2654435761)
+HASH_RANGE = 2 ** 32
+
+
+def holdout_mask(start: int, n: int, test_percentage: float) -> np.ndarray:
+    # multiplicative hash of the row position: the same rows land in the
+    # holdout on every pass without keeping a list of them
+    index = np.arange(start, start + n, dtype=np.uint64)
+    hashed = (index * HASH_MULTIPLIER) % np.uint64(HASH_RANGE)
+    return hashed < np.uint64(int(test_percentage / 100 * HASH_RANGE))
+
+
+class ChunkStream:
+    def __init__(self, fs, file_id, target_variable: str, feature_columns: list,
+                 test_percentage: float, chunk_rows: int = STREAM_CHUNK_ROWS):
+        self.fs = fs
+        self.file_id = file_id
+        self.target_variable = target_variable
+        self.feature_columns = feature_columns
+        self.test_percentage = test_percentage
+        self.chunk_rows = chunk_rows
+
+    def __iter__(self):
+        # yields (X, y, holdout) per chunk, rows without a target are skipped
+        start = 0
+        columns = self.feature_columns + [self.target_variable]
+        for chunk in iter_dataframe_chunks(self.fs, self.file_id, self.chunk_rows, columns):
+            X = dense_feature_matrix(chunk[self.feature_columns], **FEATURE_CONVERSIONS["streaming"])
+            y = pd.to_numeric(chunk[self.target_variable], errors="coerce").to_numpy(dtype=np.float64)
+            holdout = holdout_mask(start, len(chunk), self.test_percentage)
+            start += len(chunk)
+
+            labelled = ~np.isnan(y)
+            yield X[labelled], y[labelled], holdout[labelled]
+
+
+class ClassificationMetrics:
+    # accumulates a confusion matrix, everything else is derived from it
+    def __init__(self, classes: np.ndarray):
+        self.classes = classes
+        self.matrix = np.zeros((len(classes), len(classes)), dtype=np.int64)
+
+    def update(self, y_true, y_pred):
+        true_idx = np.searchsorted(self.classes, y_true)
+        pred_idx = np.searchsorted(self.classes, y_pred)
+        np.add.at(self.matrix, (true_idx, pred_idx), 1)
+
+    def result(self) -> dict:
+        m = self.matrix
+        total = m.sum()
+        support = m.sum(axis=1)
+        predicted = m.sum(axis=0)
+        correct = np.diag(m)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            precision = np.where(predicted > 0, correct / predicted, 0.0)
+            recall = np.where(support > 0, correct / support, 0.0)
+            f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+        weights = support / total if total else support
+        return {
+            "accuracy": float(correct.sum() / total) if total else 0.0,
+            "precision": float((precision * weights).sum()),
+            "recall": float((recall * weights).sum()),
+            "f1_score": float((f1 * weights).sum()),
+            "confusion_matrix": m.tolist(),
+        }
+
+
+class RegressionMetrics:
+    def __init__(self):
+        self.n = 0
+        self.sse = 0.0
+        self.sae = 0.0
+        self.sum_y = 0.0
+        self.sum_y2 = 0.0
+
+    def update(self, y_true, y_pred):
+        error = y_true - y_pred
+        self.n += len(y_true)
+        self.sse += float(np.dot(error, error))
+        self.sae += float(np.abs(error).sum())
+        self.sum_y += float(y_true.sum())
+        self.sum_y2 += float(np.dot(y_true, y_true))
+
+    def result(self) -> dict:
+        if not self.n:
+            return {"mse": 0.0, "mae": 0.0, "r2_score": 0.0}
+        sst = self.sum_y2 - self.sum_y ** 2 / self.n
+        return {
+            "mse": self.sse / self.n,
+            "mae": self.sae / self.n,
+            "r2_score": 1 - self.sse / sst if sst > 0 else 0.0,
+        }
+
+
+def scan(stream: ChunkStream, task: str):
+    # first pass: feature scaling statistics, class labels and row counts
+    scaler = StandardScaler()
+    classes = np.array([])
+    train_rows = holdout_rows = chunks = 0
+
+    for X, y, holdout in stream:
+        train = ~holdout
+        if train.any():
+            scaler.partial_fit(X[train])
+        if task == "classification":
+            classes = np.union1d(classes, np.unique(y))
+        train_rows += int(train.sum())
+        holdout_rows += int(holdout.sum())
+        chunks += 1
+
+    if not train_rows:
+        raise ValueError("No training rows with a numeric target, encode the dataset first")
+
+    return scaler, classes, {"train_rows": train_rows, "holdout_rows": holdout_rows, "chunks": chunks}
+
+
+def train_sgd(stream: ChunkStream, task: str, scaler, classes, epochs: int, on_pass):
+    if task == "classification":
+        model = SGDClassifier(loss="log_loss", random_state=42)
+    else:
+        model = SGDRegressor(random_state=42)
+
+    for epoch in range(epochs):
+        for X, y, holdout in stream:
+            train = ~holdout
+            if not train.any():
+                continue
+            X_train = scaler.transform(X[train])
+            if task == "classification":
+                model.partial_fit(X_train, y[train], classes=classes)
+            else:
+                model.partial_fit(X_train, y[train])
+        on_pass("fitting", (epoch + 1) / epochs)
+
+    return make_pipeline(scaler, model)
+
+
+class TrainingIter(xgb.DataIter):
+    # hands XGBoost the training rows chunk by chunk, it pages them through
+    # its external-memory cache instead of holding them in RAM
+    def __init__(self, stream: ChunkStream, cache_prefix: str):
+        self._stream = stream
+        self._chunks = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data):
+        if self._chunks is None:
+            self._chunks = iter(self._stream)
+        for X, y, holdout in self._chunks:
+            train = ~holdout
+            if train.any():
+                input_data(data=X[train], label=y[train])
+                return 1
+        return 0
+
+    def reset(self):
+        self._chunks = None
+
+
+def train_xgboost(stream: ChunkStream, task: str, classes, rounds: int, on_pass):
+    params = {"tree_method": "hist"}
+    if task == "classification":
+        if not np.array_equal(classes, np.arange(len(classes))):
+            raise ValueError("XGBoost needs classes encoded as 0..k-1, encode the dataset first")
+        if len(classes) > 2:
+            params.update({"objective": "multi:softprob", "num_class": len(classes)})
+        else:
+            params["objective"] = "binary:logistic"
+    else:
+        params["objective"] = "reg:squarederror"
+
+    with tempfile.TemporaryDirectory(prefix="xgb_stream_") as cache_dir:
+        dtrain = xgb.DMatrix(TrainingIter(stream, os.path.join(cache_dir, "cache")))
+        booster = xgb.train(params, dtrain, num_boost_round=rounds)
+        # release the page cache before its directory goes away
+        del dtrain
+        on_pass("fitting", 1.0)
+
+        # round-trip through the native format to get the sklearn wrapper
+        # the rest of the app (artifacts, serving) works with
+        path = os.path.join(cache_dir, "model.ubj")
+        booster.save_model(path)
+        model = XGBClassifier() if task == "classification" else XGBRegressor()
+        model.load_model(path)
+
+    return model
+
+
+def evaluate_streaming(stream: ChunkStream, task: str, model, classes) -> dict:
+    metrics = ClassificationMetrics(classes) if task == "classification" else RegressionMetrics()
+    for X, y, holdout in stream:
+        if holdout.any():
+            metrics.update(y[holdout], np.asarray(model.predict(X[holdout]), dtype=np.float64))
+    return metrics.result()
+
+
+def train_streaming_model(fs, file_id, task: str, model_name: str, target_variable: str,
+                          feature_columns: list, test_percentage: float,
+                          epochs: int = STREAM_EPOCHS, on_pass=lambda stage, progress: None):
+    stream = ChunkStream(fs, file_id, target_variable, feature_columns, test_percentage)
+
+    started = time.perf_counter()
+    on_pass("scanning", 0.0)
+    scaler, classes, counts = scan(stream, task)
+
+    if model_name.startswith("XGBoost"):
+        model = train_xgboost(stream, task, classes, STREAM_BOOST_ROUNDS, on_pass)
+        passes = 3
+    else:
+        model = train_sgd(stream, task, scaler, classes, epochs, on_pass)
+        passes = 2 + epochs
+
+    on_pass("evaluating", 1.0)
+    metrics = evaluate_streaming(stream, task, model, classes)
+
+    model_info = {
+        **counts,
+        "chunk_rows": stream.chunk_rows,
+        "passes": passes,
+        "train_seconds": time.perf_counter() - started,
+    }
+    return model, metrics, model_info
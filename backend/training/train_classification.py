@@ -8,6 +8,9 @@ from sklearn.svm import SVC
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.naive_bayes import GaussianNB
 from xgboost import XGBClassifier
+from storage.columnar import sparse_columns
+from training.features import FEATURE_CONVERSIONS, class_labels, dense_feature_matrix, sparse_feature_matrix
+from telemetry import span
 
 from sklearn.metrics import (
     accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
@@ -29,33 +32,59 @@ def get_classifier(model_name: str):
     return models.get(model_name, None)
 
 
-def train_classifier_model(df: pd.DataFrame, model_name: str, target_variable: str, test_percentage: float):
+CLASSIFIER_NAMES = [
+    "Logistic Regression",
+    "Decision Tree Classifier",
+    "Random Forest Classifier",
+    "Support Vector Machine (SVM)",
+    "K-Nearest Neighbors (KNN) Classifier",
+    "Naive Bayes",
+    "Gradient Boosting Classifier (GBC)",
+    "XGBoost Classifier",
+    "Ridge Classifier",
+]
+
 
+def prepare_classification_data(df: pd.DataFrame, target_variable: str):
     if target_variable not in df.columns:
         raise ValueError("Target variable not found in dataset")
 
     X = df.drop(columns=[target_variable])
     y = df[target_variable]
 
-    X = X.apply(pd.to_numeric, errors="coerce").fillna(0)
-    y = pd.to_numeric(y, errors="coerce")
+    if sparse_columns(X):
+        X = sparse_feature_matrix(X, fill_value=0)
+    else:
+        X = dense_feature_matrix(X, **FEATURE_CONVERSIONS["classification"])
+    y = class_labels(y)
+
+    return X, y
 
-    stratify = y if len(y.unique()) <= 20 else None
+
+def split_classification_data(X, y, test_percentage: float):
+    stratify = y if len(pd.unique(y)) <= 20 else None
     test_size = test_percentage / 100
 
-    X_train, X_test, y_train, y_test = train_test_split(
+    return train_test_split(
         X, y,
         test_size=test_size,
         random_state=42,
         stratify=stratify
     )
 
+
+def evaluate_classifier(model_name: str, X_train, X_test, y_train, y_test, params: dict | None = None):
     model = get_classifier(model_name)
     if model is None:
         raise ValueError("Invalid model name")
 
-    model.fit(X_train, y_train)
-    preds = model.predict(X_test)
+    if params:
+        model.set_params(**params)
+
+    with span("model_fit", model=model_name, rows=X_train.shape[0], columns=X_train.shape[1]):
+        model.fit(X_train, y_train)
+    with span("model_predict", model=model_name, rows=X_test.shape[0]):
+        preds = model.predict(X_test)
 
     metrics = {
         "accuracy": float(accuracy_score(y_test, preds)),
@@ -70,3 +99,12 @@ def train_classifier_model(df: pd.DataFrame, model_name: str, target_variable: s
         model_info["feature_importances"] = model.feature_importances_.tolist()
 
     return model, metrics, model_info
+
+
+def train_classifier_model(df: pd.DataFrame, model_name: str, target_variable: str, test_percentage: float):
+
+    X, y = prepare_classification_data(df, target_variable)
+
+    X_train, X_test, y_train, y_test = split_classification_data(X, y, test_percentage)
+
+    return evaluate_classifier(model_name, X_train, X_test, y_train, y_test)
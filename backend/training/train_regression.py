@@ -11,21 +11,27 @@ from sklearn.neighbors import KNeighborsRegressor
 from sklearn.preprocessing import PolynomialFeatures
 from sklearn.pipeline import make_pipeline
 from xgboost import XGBRegressor
+from storage.columnar import sparse_columns
+from training.features import FEATURE_CONVERSIONS, dense_feature_matrix, regression_target, sparse_feature_matrix
+from telemetry import span
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 
 
-def train_regression_model(df: pd.DataFrame, model_name: str, target: str, test_pct: float):
-
-    if target not in df.columns:
-        raise ValueError("Target column not found")
+REGRESSOR_NAMES = [
+    "Linear Regression",
+    "Polynomial Regression",
+    "Decision Tree Regression",
+    "Random Forest Regression",
+    "Support Vector Regression (SVR)",
+    "Ridge Regression",
+    "Lasso Regression",
+    "K-Nearest Neighbors (KNN) Regression",
+    "Gradient Boosting Regression (GBR)",
+    "XGBoost Regression",
+]
 
-    X = df.drop(columns=[target]).values
-    y = df[target].values
-
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=test_pct / 100, random_state=42
-    )
 
+def get_regressor(model_name: str):
     if model_name == "Linear Regression":
         model = LinearRegression()
     elif model_name == "Decision Tree Regression":
@@ -47,11 +53,40 @@ def train_regression_model(df: pd.DataFrame, model_name: str, target: str, test_
     elif model_name == "XGBoost Regression":
         model = XGBRegressor()
     else:
+        model = None
+    return model
+
+
+def prepare_regression_data(df: pd.DataFrame, target: str):
+    if target not in df.columns:
+        raise ValueError("Target column not found")
+
+    X = df.drop(columns=[target])
+    X = sparse_feature_matrix(X) if sparse_columns(X) else dense_feature_matrix(X, **FEATURE_CONVERSIONS["regression"])
+    y = regression_target(df[target])
+
+    return X, y
+
+
+def split_regression_data(X, y, test_pct: float):
+    return train_test_split(
+        X, y, test_size=test_pct / 100, random_state=42
+    )
+
+
+def evaluate_regressor(model_name: str, X_train, X_test, y_train, y_test, params: dict | None = None):
+    model = get_regressor(model_name)
+    if model is None:
         raise ValueError("Unsupported regression model")
 
-    model.fit(X_train, y_train)
+    if params:
+        model.set_params(**params)
+
+    with span("model_fit", model=model_name, rows=X_train.shape[0], columns=X_train.shape[1]):
+        model.fit(X_train, y_train)
 
-    preds = model.predict(X_test)
+    with span("model_predict", model=model_name, rows=X_test.shape[0]):
+        preds = model.predict(X_test)
 
     metrics = {
         "mse": float(mean_squared_error(y_test, preds)),
@@ -70,3 +105,12 @@ def train_regression_model(df: pd.DataFrame, model_name: str, target: str, test_
         )
 
     return model, metrics, model_info
+
+
+def train_regression_model(df: pd.DataFrame, model_name: str, target: str, test_pct: float):
+
+    X, y = prepare_regression_data(df, target)
+
+    X_train, X_test, y_train, y_test = split_regression_data(X, y, test_pct)
+
+    return evaluate_regressor(model_name, X_train, X_test, y_train, y_test)
@@ -0,0 +1,156 @@
+# tuning.py
+import math
+import os
+import time
+from sklearn.model_selection import ParameterSampler
+from training.compare import TASKS, load_shared_split
+
+TUNE_WORKERS = int(os.getenv("TUNE_WORKERS", str(os.cpu_count() or 1)))
+TUNE_VALIDATION_FRACTION = float(os.getenv("TUNE_VALIDATION_FRACTION", "0.2"))
+TUNE_MIN_SAMPLES = int(os.getenv("TUNE_MIN_SAMPLES", "50"))
+
+SEARCH_SPACES = {
+    # classification
+    "Logistic Regression": {
+        "C": [0.001, 0.01, 0.1, 1.0, 10.0, 100.0],
+    },
+    "Decision Tree Classifier": {
+        "max_depth": [None, 3, 5, 8, 12, 20],
+        "min_samples_leaf": [1, 2, 5, 10, 20],
+        "criterion": ["gini", "entropy"],
+    },
+    "Random Forest Classifier": {
+        "n_estimators": [50, 100, 200, 400],
+        "max_depth": [None, 5, 10, 20],
+        "min_samples_leaf": [1, 2, 4],
+        "max_features": ["sqrt", "log2", None],
+    },
+    "Support Vector Machine (SVM)": {
+        "C": [0.1, 1.0, 10.0, 100.0],
+        "gamma": ["scale", 0.001, 0.01, 0.1],
+        "kernel": ["rbf", "linear"],
+    },
+    "K-Nearest Neighbors (KNN) Classifier": {
+        "n_neighbors": [3, 5, 7, 11, 15, 25],
+        "weights": ["uniform", "distance"],
+    },
+    "Naive Bayes": {
+        "var_smoothing": [1e-11, 1e-10, 1e-9, 1e-8, 1e-7],
+    },
+    "Gradient Boosting Classifier (GBC)": {
+        "n_estimators": [50, 100, 200],
+        "learning_rate": [0.01, 0.05, 0.1, 0.2],
+        "max_depth": [2, 3, 5],
+        "subsample": [0.7, 1.0],
+    },
+    "XGBoost Classifier": {
+        "n_estimators": [100, 200, 400],
+        "learning_rate": [0.03, 0.1, 0.3],
+        "max_depth": [3, 6, 9],
+        "subsample": [0.7, 1.0],
+        "colsample_bytree": [0.7, 1.0],
+    },
+    "Ridge Classifier": {
+        "alpha": [0.01, 0.1, 1.0, 10.0, 100.0],
+    },
+    # regression
+    "Polynomial Regression": {
+        "polynomialfeatures__degree": [2, 3],
+    },
+    "Decision Tree Regression": {
+        "max_depth": [None, 3, 5, 8, 12, 20],
+        "min_samples_leaf": [1, 2, 5, 10, 20],
+    },
+    "Random Forest Regression": {
+        "n_estimators": [50, 100, 200, 400],
+        "max_depth": [None, 5, 10, 20],
+        "min_samples_leaf": [1, 2, 4],
+        "max_features": [1.0, "sqrt", "log2"],
+    },
+    "Support Vector Regression (SVR)": {
+        "C": [0.1, 1.0, 10.0, 100.0],
+        "epsilon": [0.01, 0.1, 0.5],
+        "gamma": ["scale", 0.001, 0.01, 0.1],
+    },
+    "Ridge Regression": {
+        "alpha": [0.01, 0.1, 1.0, 10.0, 100.0],
+    },
+    "Lasso Regression": {
+        "alpha": [0.0001, 0.001, 0.01, 0.1, 1.0],
+    },
+    "K-Nearest Neighbors (KNN) Regression": {
+        "n_neighbors": [3, 5, 7, 11, 15, 25],
+        "weights": ["uniform", "distance"],
+    },
+    "Gradient Boosting Regression (GBR)": {
+        "n_estimators": [50, 100, 200],
+        "learning_rate": [0.01, 0.05, 0.1, 0.2],
+        "max_depth": [2, 3, 5],
+        "subsample": [0.7, 1.0],
+    },
+    "XGBoost Regression": {
+        "n_estimators": [100, 200, 400],
+        "learning_rate": [0.03, 0.1, 0.3],
+        "max_depth": [3, 6, 9],
+        "subsample": [0.7, 1.0],
+        "colsample_bytree": [0.7, 1.0],
+    },
+}
+
+
+def sample_candidates(model_name: str, n_candidates: int, seed: int = 42) -> list:
+    space = SEARCH_SPACES[model_name]
+    size = math.prod(len(values) for values in space.values())
+    return list(ParameterSampler(space, n_iter=min(n_candidates, size), random_state=seed))
+
+
+def halving_schedule(n_candidates: int, n_samples: int, factor: int, min_samples: int = TUNE_MIN_SAMPLES) -> list:
+    # [(candidates kept, training rows)] per rung: every rung keeps 1/factor
+    # of the candidates and gives the survivors factor times the rows
+    # one rung per power of factor up to n_candidates, counted in integers
+    # since float logs land just under exact powers
+    rungs = 1
+    while factor ** rungs <= n_candidates:
+        rungs += 1
+    schedule = []
+    for rung in range(rungs):
+        keep = max(1, math.ceil(n_candidates / factor ** rung))
+        rows = n_samples // factor ** (rungs - 1 - rung)
+        schedule.append((keep, min(n_samples, max(min_samples, rows))))
+    return schedule
+
+
+def fit_size(n_train: int) -> int:
+    return n_train - max(1, int(n_train * TUNE_VALIDATION_FRACTION))
+
+
+def validation_split(data_dir: str):
+    # the tail of the (already shuffled) training split scores the trials,
+    # the test split stays untouched for the final model
+    X_train, _, y_train, _ = load_shared_split(data_dir)
+    n_fit = fit_size(X_train.shape[0])
+    return X_train[:n_fit], X_train[n_fit:], y_train[:n_fit], y_train[n_fit:]
+
+
+def fit_trial(task: str, model_name: str, params: dict, data_dir: str, rows: int) -> dict:
+    spec = TASKS[task]
+    X_fit, X_val, y_fit, y_val = validation_split(data_dir)
+
+    started = time.perf_counter()
+    try:
+        _, metrics, _ = spec["evaluate"](model_name, X_fit[:rows], X_val, y_fit[:rows], y_val, params)
+    except Exception as e:
+        return {"params": params, "rows": rows, "error": str(e)}
+
+    return {
+        "params": params,
+        "rows": rows,
+        "score": metrics[spec["rank_by"]],
+        "fit_seconds": time.perf_counter() - started,
+    }
+
+
+def select_survivors(task: str, trials: list, keep: int) -> list:
+    scored = [t for t in trials if "score" in t]
+    scored.sort(key=lambda t: t["score"], reverse=TASKS[task]["higher_is_better"])
+    return [t["params"] for t in scored[:keep]]